@@ -0,0 +1,817 @@
+"""
+Benchmarks for the FEC analysis pipeline (src/dexter/fec).
+
+Builds synthetic FECs with a realistic account mix and times the parts of
+the pipeline under study. Run from the repo root:
+
+    uv run python scripts/bench_fec.py sniff --lines 500000
+    uv run python scripts/bench_fec.py concentration
+    uv run python scripts/bench_fec.py amounts --values 2000000
+    uv run python scripts/bench_fec.py incremental --lines 2000000
+    uv run python scripts/bench_fec.py batch --entities 3 --years 4
+    uv run python scripts/bench_fec.py memory --lines 2000000
+    uv run python scripts/bench_fec.py store --lines 1000000
+    uv run python scripts/bench_fec.py daily --lines 2000000
+    uv run python scripts/bench_fec.py lettrage --invoices 200000
+    uv run python scripts/bench_fec.py recurring --clients 50000
+    uv run python scripts/bench_fec.py forensic --lines 2000000
+    uv run python scripts/bench_fec.py leases --leases 20000
+    uv run python scripts/bench_fec.py overlap --companies 20 --counterparties 3000
+    uv run python scripts/bench_fec.py variance --lines 2000000
+    uv run python scripts/bench_fec.py sampling --lines 2000000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from dexter.fec.aggregates import AGGREGATE_COLUMNS, LedgerAggregates
+from dexter.fec.batch import analyze_fec_batch
+from dexter.fec.accounts import AccountIndex
+from dexter.fec.concentration import counterparty_profiles
+from dexter.fec.daily import DAILY_ACCOUNTS, daily_balance_report, daily_movements
+from dexter.fec.forensic import BENFORD_FREQUENCIES, FORENSIC_COLUMNS, scan_ledger
+from dexter.fec.incremental import ingest_incremental
+from dexter.fec.leases import LEASE_TYPES, restate_leases
+from dexter.fec.overlap import JACCARD_THRESHOLD, CounterpartyIndex, normalize_name, overlap_report
+from dexter.fec.lettrage import ledger_lines, match_invoices, payment_report
+from dexter.fec.recurring import PERIODICITIES, REGULARITY_THRESHOLD, STABILITY_MAX_CV, recurring_report
+from dexter.fec.analysis import analyze_fec
+from dexter.fec.reader import MISSING_DAY, MIN_FEC_COLUMNS, candidate_separators, load_fec, normalize_fec_frame, parse_amount_cents
+from dexter.fec.sampling import SAMPLING_COLUMNS, read_sample, sample_report
+from dexter.fec.store import LedgerStore
+from dexter.fec.variance import VARIANCE_COLUMNS, variance_report
+
+FEC_COLUMNS = [
+    "JournalCode", "JournalLib", "EcritureNum", "EcritureDate",
+    "CompteNum", "CompteLib", "CompAuxNum", "CompAuxLib",
+    "PieceRef", "PieceDate", "EcritureLib",
+    "Debit", "Credit", "EcritureLet", "DateLet", "ValidDate", "Montantdevise", "Idevise",
+]
+
+# Counterpart accounts of the synthetic entries (revenue, expenses, treasury)
+SYNTHETIC_ACCOUNTS = [
+    "706000", "701000", "607000", "606100", "644000", "641000", "681100", "681500",
+    "612000", "613200", "671000", "771000", "512000", "164000", "661100",
+]
+
+SEPARATOR_NAMES = {"|": "pipe", ";": "semicolon", "\t": "tab"}
+
+
+def build_synthetic_fec(
+    path: str,
+    n_lines: int,
+    separator: str = "|",
+    encoding: str = "latin-1",
+    n_clients: int = 500,
+    n_suppliers: int = 100,
+    start: datetime.date = datetime.date(2023, 1, 1),
+    n_days: int = 365,
+    seed: int = 42,
+):
+    """Writes a balanced FEC of about `n_lines` lines (two lines per entry)."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(separator.join(FEC_COLUMNS) + "\n")
+        for num in range(n_lines // 2):
+            date = (start + datetime.timedelta(days=rng.randrange(n_days))).strftime("%Y%m%d")
+            amount = f"{rng.randrange(1, 10**7) / 100:.2f}".replace(".", ",")
+            account = rng.choice(SYNTHETIC_ACCOUNTS)
+            if account.startswith("7"):
+                client = f"411{rng.randrange(n_clients):05d}"
+                journal = "VT"
+                lines = [(client, amount, "0,00", f"C{client}", "Client"), (account, "0,00", amount, "", "")]
+            elif account.startswith("6"):
+                supplier = f"401{rng.randrange(n_suppliers):05d}"
+                journal = "AC"
+                lines = [(account, amount, "0,00", "", ""), (supplier, "0,00", amount, f"F{supplier}", "Fournisseur")]
+            else:
+                journal = "BQ"
+                lines = [(account, amount, "0,00", "", ""), ("512000", "0,00", amount, "", "")]
+            for compte, debit, credit, aux, aux_lib in lines:
+                f.write(separator.join([
+                    journal, f"Journal {journal}", str(num), date, compte, f"Compte {compte}",
+                    aux, aux_lib, f"P{num}", date, "Écriture générée", debit, credit,
+                    "", "", date, "", "",
+                ]) + "\n")
+
+
+def legacy_load_fec(fec_path: str, encoding: str = "latin-1", separator: str = "|") -> pd.DataFrame:
+    """Pre-sniffing behaviour: a full read_csv per candidate separator."""
+    df = None
+    for sep in [separator, "|", ";", "\t"]:
+        try:
+            df = pd.read_csv(fec_path, sep=sep, encoding=encoding, dtype=str, low_memory=False)
+            if len(df.columns) >= MIN_FEC_COLUMNS:
+                break
+        except Exception:
+            continue
+    return normalize_fec_frame(df)
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_sniff(args):
+    """Total parse time per separator, with the tool's default '|' hint."""
+    print(f"{'separator':<10} {'legacy (s)':>11} {'sniffed (s)':>12} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for sep in candidate_separators("|"):
+            path = os.path.join(tmp, f"fec_{SEPARATOR_NAMES[sep]}.txt")
+            build_synthetic_fec(path, args.lines, separator=sep)
+            legacy = timed(legacy_load_fec, path)
+            sniffed = timed(load_fec, path)
+            print(f"{SEPARATOR_NAMES[sep]:<10} {legacy:>11.2f} {sniffed:>12.2f} {legacy / sniffed:>7.1f}x")
+
+
+def synthetic_client_ledger(n_clients: int, lines_per_client: int = 10, seed: int = 42) -> pd.DataFrame:
+    """In-memory normalized ledger (amounts in cents) of client invoices (411 + CompAuxNum) and their 706 revenue lines."""
+    rng = np.random.default_rng(seed)
+    n = n_clients * lines_per_client
+    client = rng.integers(0, n_clients, n)
+    amount = rng.integers(100, 10**6, n)
+    dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+    client_ids = pd.Series(client).map("{:06d}".format)
+    zeros = np.zeros(n, dtype=np.int64)
+    return pd.DataFrame({
+        "EcritureDate": np.concatenate([dates, dates]),
+        "CompteNum": np.concatenate([("411" + client_ids).to_numpy(), np.full(n, "706000", dtype=object)]),
+        "CompAuxNum": np.concatenate([("C" + client_ids).to_numpy(), np.full(n, np.nan, dtype=object)]),
+        "CompAuxLib": np.concatenate([("Client " + client_ids).to_numpy(), np.full(n, np.nan, dtype=object)]),
+        "Debit": np.concatenate([amount, zeros]),
+        "Credit": np.concatenate([zeros, amount]),
+    })
+
+
+def legacy_concentration(df: pd.DataFrame):
+    """Pre-engine behaviour: groupby.apply lambdas for 411 balances and monthly revenue."""
+    clients = df[df['CompteNum'].str.match(r'^411\d+', na=False)]
+    client_balances = clients.groupby('CompteNum').apply(
+        lambda x: (x['Debit'].sum() - x['Credit'].sum())
+    ).sort_values(ascending=False)
+    top_5 = client_balances.head(5)
+    revenue = df[df['CompteNum'].str.startswith('7', na=False)]
+    monthly_revenue = revenue.groupby(revenue['EcritureDate'].dt.to_period('M')).apply(
+        lambda x: (x['Credit'].sum() - x['Debit'].sum())
+    )
+    return top_5, monthly_revenue.std()
+
+
+def engine_concentration(df: pd.DataFrame):
+    # The engine reads dates as day ordinals, as load_fec returns them
+    days = df["EcritureDate"].to_numpy().astype("datetime64[D]").astype(np.int32)
+    agg = LedgerAggregates.from_frame(df.assign(EcritureDate=days))
+    return counterparty_profiles(agg)
+
+
+def bench_concentration(args):
+    """Client concentration + seasonality at 1k, 10k and 100k client accounts."""
+    print(f"{'clients':>8} {'lines':>10} {'legacy (s)':>11} {'engine (s)':>11} {'speedup':>8}")
+    for n_clients in args.clients:
+        df = synthetic_client_ledger(n_clients)
+        legacy = timed(legacy_concentration, df)
+        engine = timed(engine_concentration, df)
+        print(f"{n_clients:>8} {len(df):>10} {legacy:>11.2f} {engine:>11.2f} {legacy / engine:>7.1f}x")
+
+
+def bench_amounts(args):
+    """Amount parsing of string cells: str.replace + to_numeric (float64) vs the int64 cents fallback parser."""
+    rng = np.random.default_rng(42)
+    cents = rng.integers(0, 10**8, args.values)
+    text = pd.Series([f"{c // 100},{c % 100:02d}" for c in cents], dtype=str)
+
+    legacy_time = timed(lambda: pd.to_numeric(text.str.replace(',', '.'), errors='coerce').fillna(0))
+    cents_time = timed(parse_amount_cents, text)
+    parsed = parse_amount_cents(text)
+    legacy = pd.to_numeric(text.str.replace(',', '.'), errors='coerce').fillna(0)
+
+    print(f"{'parser':<22} {'time (s)':>9} {'sum':>22}")
+    print(f"{'float64 (legacy)':<22} {legacy_time:>9.2f} {legacy.sum():>22.2f}")
+    print(f"{'int64 cents':<22} {cents_time:>9.2f} {parsed.sum() / 100:>22.2f}")
+    print(f"exact sum: {cents.sum() / 100:.2f}  cents match: {bool((parsed == cents).all())}")
+
+
+def split_extract(path: str, previous_path: str, cutoff: str, restated_month: str, encoding: str = "latin-1"):
+    """
+    Writes the previous monthly extract of `path` (entries dated before
+    `cutoff`), then restates one line of `restated_month` in `path` itself.
+    """
+    with open(path, encoding=encoding, newline="") as f:
+        header, *lines = f.read().splitlines(keepends=True)
+    with open(previous_path, "w", encoding=encoding, newline="") as f:
+        f.write(header)
+        f.writelines(line for line in lines if line.split("|")[3] < cutoff)
+    for i, line in enumerate(lines):
+        if line.split("|")[3].startswith(restated_month):
+            lines[i] = line.replace("Écriture générée", "Écriture corrigée")
+            break
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(header)
+        f.writelines(lines)
+
+
+def bench_incremental(args):
+    """Monthly close on a 5-year ledger: full re-analysis vs incremental ingestion."""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DEXTER_FEC_STATE_DIR"] = os.path.join(tmp, "state")
+        current, previous = os.path.join(tmp, "fec_m61.txt"), os.path.join(tmp, "fec_m60.txt")
+        # 61 months: the previous extract stops after month 60, month 15 gets restated
+        build_synthetic_fec(current, args.lines, start=datetime.date(2019, 1, 1), n_days=1856)
+        split_extract(current, previous, cutoff="20240101", restated_month="202003")
+
+        full = timed(lambda: LedgerAggregates.from_frame(load_fec(current)))
+        first = timed(ingest_incremental, previous, ledger_id="bench")
+        start = time.perf_counter()
+        agg, info = ingest_incremental(current, ledger_id="bench")
+        monthly = time.perf_counter() - start
+        rerun = timed(ingest_incremental, current, ledger_id="bench")
+
+        expected = LedgerAggregates.from_frame(load_fec(current)).account_balances()
+        same = expected.sort_index().equals(agg.account_balances().sort_index())
+        print(f"{'run':<28} {'time (s)':>9}")
+        print(f"{'full re-analysis':<28} {full:>9.2f}")
+        print(f"{'initial ingestion (60 m.)':<28} {first:>9.2f}")
+        print(f"{'monthly close (61 m.)':<28} {monthly:>9.2f}")
+        print(f"{'same extract again':<28} {rerun:>9.2f}")
+        print(f"rows re-aggregated: {info['rows_ingested']} / {agg.total_entries}  "
+              f"new: {info['new_months']}  restated: {info['restated_months']}  balances match: {same}")
+
+
+def bench_batch(args):
+    """Group due diligence: entities x fiscal years, serial vs one worker per core."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for e in range(args.entities):
+            for y in range(args.years):
+                year = 2020 + y
+                path = os.path.join(tmp, f"{e + 1:09d}FEC{year}1231.txt")
+                build_synthetic_fec(path, args.lines, start=datetime.date(year, 1, 1), seed=e * 100 + y)
+
+        serial = timed(analyze_fec_batch, [tmp], max_workers=1, use_cache=False)
+        start = time.perf_counter()
+        result = analyze_fec_batch([tmp], use_cache=False)
+        parallel = time.perf_counter() - start
+
+        print(f"{'mode':<22} {'time (s)':>9}")
+        print(f"{'serial':<22} {serial:>9.2f}")
+        label = f"{result['workers']} workers"
+        print(f"{label:<22} {parallel:>9.2f}")
+        print(f"speedup: {serial / parallel:.1f}x on {os.cpu_count()} cores, "
+              f"{result['n_files']} files, {len(result['year_over_year'])} entities")
+
+
+MEMORY_LOADERS = {
+    "legacy": lambda path: legacy_load_fec(path),
+    "compact": lambda path: load_fec(path, columns=AGGREGATE_COLUMNS),
+}
+
+
+def measure_load(args):
+    """Child process of the memory benchmark: one load, then peak RSS and frame size as JSON."""
+    start = time.perf_counter()
+    df = MEMORY_LOADERS[args.loader](args.path)
+    print(json.dumps({
+        "time": time.perf_counter() - start,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "frame_mb": df.memory_usage(deep=True).sum() / 2**20,
+    }))
+
+
+def bench_memory(args):
+    """Working set of the legacy all-string load vs the compact categorical load, one fresh process each."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fec.txt")
+        build_synthetic_fec(path, args.lines, start=datetime.date(2019, 1, 1), n_days=1826, n_clients=5000)
+        size_mb = os.path.getsize(path) / 2**20
+
+        results = {}
+        for loader in MEMORY_LOADERS:
+            out = subprocess.run(
+                [sys.executable, __file__, "measure-load", loader, path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results[loader] = json.loads(out)
+
+        print(f"{args.lines} lines, {size_mb:.0f} MB file")
+        print(f"{'load':<10} {'time (s)':>9} {'peak RSS (MB)':>14} {'frame (MB)':>11}")
+        for loader, r in results.items():
+            print(f"{loader:<10} {r['time']:>9.2f} {r['peak_rss_mb']:>14.0f} {r['frame_mb']:>11.0f}")
+        legacy, compact = results["legacy"], results["compact"]
+        print(f"peak RSS: {legacy['peak_rss_mb'] / compact['peak_rss_mb']:.1f}x smaller, "
+              f"frame: {legacy['frame_mb'] / compact['frame_mb']:.1f}x smaller")
+
+
+# Typical follow-up questions: (query, filters)
+STORE_QUERIES = [
+    ("balances", {"account": "6", "start_date": "2021-03-01", "end_date": "2021-03-31"}),
+    ("monthly", {"account": "512", "start_date": "2021-01-01", "end_date": "2021-12-31"}),
+    ("counterparties", {"account": "411", "start_date": "2021-01-15", "end_date": "2021-06-30"}),
+    ("entries", {"account": "6132", "start_date": "2021-03-01", "end_date": "2021-03-31", "limit": 50}),
+]
+
+
+def bench_store(args):
+    """Follow-up ledger queries: re-parsing the FEC vs the indexed SQLite store."""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DEXTER_FEC_STORE_DIR"] = os.path.join(tmp, "store")
+        path = os.path.join(tmp, "fec.txt")
+        build_synthetic_fec(path, args.lines, start=datetime.date(2019, 1, 1), n_days=1826)
+
+        reparse = timed(load_fec, path)
+        start = time.perf_counter()
+        store, info = LedgerStore.open(path)
+        ingest = time.perf_counter() - start
+        print(f"{args.lines} lines: re-parse {reparse:.2f}s per question, one-time ingestion {ingest:.2f}s")
+        print(f"{'query':<16} {'time (ms)':>10} {'rows':>6}")
+        with store:
+            for query, filters in STORE_QUERIES:
+                filters = dict(filters)
+                if query == "entries":
+                    run = lambda: store.entries(**filters)
+                elif query == "counterparties":
+                    run = lambda: store.counterparties(**filters)
+                else:
+                    run = lambda: store.balances(by="month" if query == "monthly" else "account", **filters)
+                elapsed = timed(run) * 1000
+                result = run()
+                n = result["n_matches"] if query == "entries" else len(result)
+                print(f"{query:<16} {elapsed:>10.1f} {n:>6}")
+
+
+def naive_daily_balances(df: pd.DataFrame) -> dict:
+    """Balance as of each day recomputed from the lines: one pass over the ledger per class and day."""
+    days = df["EcritureDate"].to_numpy()
+    accounts = df["CompteNum"].astype(str)
+    net = df["Debit"].to_numpy() - df["Credit"].to_numpy()
+    calendar = np.arange(days.min(), days.max() + 1)
+    return {
+        name: np.array([net[mask & (days <= day)].sum() for day in calendar])
+        for name, mask in ((name, accounts.str.startswith(spec).to_numpy()) for name, spec in DAILY_ACCOUNTS.items())
+    }
+
+
+def bench_daily(args):
+    """Daily balances of a 5-year ledger: per-day recomputation vs movements + cumulative sum."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fec.txt")
+        build_synthetic_fec(path, args.lines, start=datetime.date(2019, 1, 1), n_days=1826)
+        df = load_fec(path, columns=AGGREGATE_COLUMNS)
+
+    agg = LedgerAggregates.from_frame(df)
+    index = AccountIndex(agg.account_balances())
+    naive = timed(naive_daily_balances, df)
+    movements = timed(daily_movements, df)
+    engine = timed(daily_balance_report, agg.daily, index, agg.date_min, agg.date_max)
+    report = daily_balance_report(agg.daily, index, agg.date_min, agg.date_max)
+
+    print(f"{len(df)} lines, {report['nb_days']} days")
+    print(f"{'step':<32} {'time (s)':>9}")
+    print(f"{'per-day recomputation':<32} {naive:>9.2f}")
+    print(f"{'daily movements (aggregation)':<32} {movements:>9.3f}")
+    print(f"{'cumsum engine + metrics':<32} {engine:>9.3f}")
+    print(f"average cash: {report['cash_512']['average']:,.2f}  DSO: {report['dso_days']}  DPO: {report['dpo_days']}")
+
+
+def build_client_ledger(n_invoices: int, n_clients: int, lettered: float, seed: int = 1):
+    """Normalized 411 sub-ledger: invoices, 90% of them settled 0-120 days later, part of them lettered."""
+    rng = np.random.default_rng(seed)
+    client = np.char.add("C", rng.integers(0, n_clients, n_invoices).astype(str)).astype(object)
+    day = 19000 + rng.integers(0, 365, n_invoices)
+    amount = rng.integers(1_000, 10_000_000, n_invoices)
+    delay = rng.integers(0, 120, n_invoices)
+    paid = rng.random(n_invoices) < 0.9
+    codes = np.char.add("L", np.arange(n_invoices).astype(str)).astype(object)
+    codes[rng.random(n_invoices) >= lettered] = None
+
+    def lines(rows, days, debit, credit):
+        return pd.DataFrame({
+            "EcritureDate": days.astype("int32"),
+            "CompteNum": "411000",
+            "CompAuxNum": client[rows],
+            "CompAuxLib": "Client",
+            "Debit": debit,
+            "Credit": credit,
+            "EcritureLet": np.where(paid[rows], codes[rows], None),
+            "DateLet": np.int32(MISSING_DAY),
+        })
+
+    invoices = lines(np.arange(n_invoices), day, amount, 0)
+    settlements = lines(np.flatnonzero(paid), (day + delay)[paid], 0, amount[paid])
+    df = pd.concat([invoices, settlements], ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+    true_delay = np.average(delay[paid], weights=amount[paid])
+    return df, true_delay, int(amount[~paid].sum())
+
+
+def naive_fifo(df: pd.DataFrame) -> dict:
+    """Per-client Python loop: each settlement pays the oldest open invoices first."""
+    paid_day = {}
+    for _, group in df.sort_values("EcritureDate", kind="stable").groupby("CompAuxNum"):
+        queue = []
+        for line, day, debit, credit in zip(group.index, group["EcritureDate"], group["Debit"], group["Credit"]):
+            if debit > 0:
+                queue.append([line, debit])
+                continue
+            remaining = credit
+            while remaining > 0 and queue:
+                applied = min(remaining, queue[0][1])
+                queue[0][1] -= applied
+                remaining -= applied
+                if queue[0][1] == 0:
+                    paid_day[queue.pop(0)[0]] = day
+    return paid_day
+
+
+def bench_lettrage(args):
+    """Invoice/settlement matching of a client sub-ledger: Python FIFO loop vs vectorized three-pass engine."""
+    df, true_delay, true_open = build_client_ledger(args.invoices, args.clients, args.lettered)
+    naive = timed(naive_fifo, df)
+    lines, _ = ledger_lines(df, "clients")
+    matching = timed(match_invoices, lines)
+    total = timed(payment_report, df, "clients")
+    report = payment_report(df, "clients")
+
+    print(f"{len(df)} lines, {args.invoices} invoices, {args.clients} clients, {args.lettered:.0%} lettered")
+    print(f"{'step':<32} {'time (s)':>9}")
+    print(f"{'python FIFO loop':<32} {naive:>9.2f}")
+    print(f"{'vectorized matching':<32} {matching:>9.3f}")
+    print(f"{'full payment report':<32} {total:>9.3f}")
+    print(f"matching: {report['matching']}")
+    print(f"avg delay: {report['avg_payment_delay_days']} days (true {true_delay:.1f})  "
+          f"open: {report['open_total']:,.2f} (true {true_open / 100:,.2f})")
+
+
+def build_invoice_ledger(n_clients: int, years: int = 3, seed: int = 1) -> pd.DataFrame:
+    """411 invoices: 30% monthly, 10% quarterly and 10% annual contracts, the rest one-off purchases."""
+    rng = np.random.default_rng(seed)
+    n_months = 12 * years
+    kind = rng.choice(4, n_clients, p=[0.3, 0.1, 0.1, 0.5])
+    start = rng.integers(0, n_months, n_clients)
+    end = np.minimum(start + rng.geometric(1 / 80, n_clients), n_months)
+    step = np.array([1, 3, 12, n_months])[kind]
+    count = np.where(kind < 3, -(-(end - start) // step), rng.integers(1, 4, n_clients))
+    client = np.repeat(np.arange(n_clients), count)
+    rank = np.arange(len(client)) - np.repeat(np.cumsum(count) - count, count)
+    contract = kind[client] < 3
+    month = np.where(contract, start[client] + rank * step[client], rng.integers(0, n_months, len(client)))
+    base = rng.integers(10_000, 500_000, n_clients)[client]
+    amount = np.where(contract, base * rng.uniform(0.95, 1.05, len(client)), rng.integers(1_000, 2_000_000, len(client)))
+    days = (np.datetime64("2021-01", "M") + month).astype("datetime64[D]").astype(np.int64) + rng.integers(0, 28, len(client))
+    return pd.DataFrame({
+        "EcritureDate": days.astype("int32"),
+        "CompteNum": "411000",
+        "CompAuxNum": np.char.add("C", client.astype(str)).astype(object),
+        "CompAuxLib": "Client",
+        "Debit": amount.astype(np.int64),
+        "Credit": 0,
+    })
+
+
+def naive_recurring(df: pd.DataFrame) -> float:
+    """Per-client Python loop over monthly totals: periodicity, stability, recurring share."""
+    months = df["EcritureDate"].to_numpy().astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    monthly = df.assign(month=months).groupby(["CompAuxNum", "month"])["Debit"].sum()
+    last = months.max()
+    recurring = total = 0
+    for _, series in monthly.groupby(level=0):
+        active = series.index.get_level_values(1).to_numpy()
+        amounts = series.to_numpy().astype(float)
+        gaps = np.diff(active)
+        is_recurring = False
+        for spec in PERIODICITIES.values():
+            hits = (np.abs(gaps - spec["months"]) <= spec["tolerance"]).sum()
+            if len(active) >= spec["min_months"] and hits >= REGULARITY_THRESHOLD * max(len(gaps), 1):
+                is_recurring = amounts.std() / amounts.mean() <= STABILITY_MAX_CV
+                break
+        window = amounts[active > last - 12].sum()
+        total += window
+        recurring += window if is_recurring else 0
+    return recurring / total * 100
+
+
+def bench_recurring(args):
+    """Recurring revenue detection: per-client loop vs client x month matrix."""
+    df = build_invoice_ledger(args.clients)
+    naive = timed(naive_recurring, df)
+    engine = timed(recurring_report, df)
+    report = recurring_report(df)
+
+    print(f"{len(df)} invoices, {args.clients} clients, {report['period']['n_months']} months")
+    print(f"{'step':<32} {'time (s)':>9}")
+    print(f"{'per-client loop':<32} {naive:>9.2f}")
+    print(f"{'client x month matrix':<32} {engine:>9.3f}")
+    print(f"recurring revenue: {report['recurring_revenue_pct']}% (loop {naive_recurring(df):.1f}%)  "
+          f"retention: {report['client_retention_pct']}  score: {report['score']}/10")
+
+
+def naive_forensic(df: pd.DataFrame) -> int:
+    """Benford per journal and duplicate entries the row-wise way: string digits and per-entry tuples."""
+    amounts = (df["Debit"] - df["Credit"]).abs()
+    first = amounts[amounts >= 1_000].astype(str).str[0].astype(int)
+    for _, digits in first.groupby(df["JournalCode"], observed=True):
+        observed = digits.value_counts(normalize=True).reindex(range(1, 10), fill_value=0)
+        np.abs(observed.to_numpy() - BENFORD_FREQUENCIES).mean()
+    key = ["JournalCode", "EcritureDate", "CompteNum", "CompAuxNum", "Debit", "Credit", "EcritureLib"]
+    signatures = df.groupby(["JournalCode", "EcritureNum"], observed=True)[key].apply(
+        lambda entry: tuple(sorted(map(tuple, entry.astype(str).to_numpy())))
+    )
+    return int(signatures.duplicated().sum())
+
+
+def bench_forensic(args):
+    """Forensic scan: row-wise Benford + duplicates vs the columnar scan of every check."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fec.txt")
+        build_synthetic_fec(path, args.lines)
+        df = load_fec(path, columns=FORENSIC_COLUMNS)
+
+    sample = df.head(args.naive_lines)
+    naive = timed(naive_forensic, sample)
+    scan = timed(scan_ledger, df)
+    report = scan_ledger(df)
+
+    print(f"{len(df)} lines, {report['n_entries']} entries")
+    print(f"{'step':<40} {'time (s)':>9}")
+    print(f"{f'row-wise Benford + duplicates ({len(sample)} lines)':<40} {naive:>9.2f}")
+    print(f"{'columnar scan, all checks':<40} {scan:>9.2f}")
+    for flag in report["red_flags"]:
+        print(f"  [{flag['severity']}] {flag['description']}")
+
+
+def build_lease_ledger(n_leases: int, seed: int = 1) -> pd.DataFrame:
+    """One year of monthly 612/6132/6135 payments, each booked against its lessor's 401 account."""
+    rng = np.random.default_rng(seed)
+    account = rng.choice(np.array(["612000", "613200", "613500"], dtype=object), n_leases, p=[0.6, 0.2, 0.2])
+    payment = rng.integers(5_000, 1_000_000, n_leases)
+    first = np.where(rng.random(n_leases) < 0.7, 0, rng.integers(1, 12, n_leases))
+    lease = np.repeat(np.arange(n_leases), 12 - first)
+    month = np.arange(len(lease)) - np.repeat(np.cumsum(12 - first) - (12 - first), 12 - first) + first[lease]
+    day = (np.datetime64("2023-01", "M") + month).astype("datetime64[D]").astype(np.int64) + 4
+    entry = np.arange(len(lease)).astype(str).astype(object)
+    charge = pd.DataFrame({
+        "JournalCode": "AC", "EcritureNum": entry, "EcritureDate": day.astype("int32"), "CompteNum": account[lease],
+        "CompAuxNum": None, "EcritureLib": "Loyer", "Debit": payment[lease], "Credit": 0,
+    })
+    lessor = charge.assign(CompteNum="401000", CompAuxNum=np.char.add("F", lease.astype(str)).astype(object),
+                           Debit=0, Credit=payment[lease])
+    return pd.concat([charge, lessor], ignore_index=True)
+
+
+def naive_leases(df: pd.DataFrame, discount_rate: float = 0.05) -> float:
+    """Per-lease loop: month-by-month liability roll-forward of every lease."""
+    monthly_rate = (1 + discount_rate) ** (1 / 12) - 1
+    lessors = df[df["CompteNum"] == "401000"].set_index("EcritureNum")["CompAuxNum"]
+    charges = df[df["CompteNum"] != "401000"].assign(lessor=lambda c: c["EcritureNum"].map(lessors))
+    last = charges["EcritureDate"].max()
+    total = 0.0
+    for (account, _), payments in charges.groupby(["CompteNum", "lessor"]):
+        term = max(t["term_months"] for spec, t in LEASE_TYPES.items() if account.startswith(spec))
+        payment = payments["Debit"].iloc[-1]
+        started = payments["EcritureDate"].min() > charges["EcritureDate"].min()
+        elapsed = len(payments) if started else term // 2
+        liability = 0.0
+        for _ in range(max(term - elapsed, 0)):
+            liability = (liability + payment) / (1 + monthly_rate)
+        if payments["EcritureDate"].max() >= last - 90:
+            total += liability
+    return total
+
+
+def bench_leases(args):
+    """IFRS 16 restatement: per-lease month-by-month loop vs vectorized annuities."""
+    df = build_lease_ledger(args.leases)
+    naive = timed(naive_leases, df)
+    engine = timed(restate_leases, df)
+    report = restate_leases(df)
+
+    print(f"{len(df)} lines, {report['n_leases']} leases")
+    print(f"{'step':<32} {'time (s)':>9}")
+    print(f"{'per-lease loop':<32} {naive:>9.2f}")
+    print(f"{'vectorized restatement':<32} {engine:>9.3f}")
+    print(f"lease liability: {report['lease_liability']:,.2f} (loop {naive_leases(df) / 100:,.2f})  "
+          f"EBITDA uplift: {report['ebitda_uplift']:,.2f}")
+
+
+def build_portfolio_profiles(n_companies: int, per_company: int, seed: int = 1) -> dict:
+    """Supplier profiles of each company, drawn from a shared pool of names written with varying legal forms."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPRSTUV"))
+    words = ["".join(rng.choice(letters, rng.integers(4, 9))) for _ in range(per_company * 10)]
+    common = ["TRANSPORTS", "SERVICES", "FRANCE", "GROUPE", "BTP", "CONSEIL"]
+    pool = [
+        " ".join([words[i] for i in rng.integers(0, len(words), rng.integers(1, 3))] + list(rng.choice(common, rng.integers(0, 2))))
+        for _ in range(per_company * 5)
+    ]
+    forms = ["SAS", "SARL", "", "Sté"]
+    companies = {}
+    for c in range(n_companies):
+        picked = rng.choice(len(pool), per_company, replace=False)
+        companies[f"company_{c}"] = pd.DataFrame({
+            "side": "suppliers",
+            "id": [f"F{k}" for k in range(per_company)],
+            "label": [f"{forms[k % 4]} {pool[p].title() if k % 2 else pool[p]}".strip() for k, p in enumerate(picked)],
+            "spend": rng.integers(10_000, 10_000_000, per_company),
+            "n_invoices": rng.integers(1, 50, per_company),
+        })
+    return companies
+
+
+def naive_overlap(companies: dict) -> int:
+    """All-pairs comparison of the token sets of the distinct names: matching pairs."""
+    names = sorted({normalize_name(label) for profiles in companies.values() for label in profiles["label"]})
+    tokens = [set(t[:6] for t in name.split()) for name in names]
+    matches = 0
+    for i in range(len(tokens)):
+        for j in range(i + 1, len(tokens)):
+            shared = len(tokens[i] & tokens[j])
+            if shared and shared / len(tokens[i] | tokens[j]) >= JACCARD_THRESHOLD:
+                matches += 1
+    return matches
+
+
+def bench_overlap(args):
+    """Cross-portfolio supplier matching: blocked hashed-token index vs all-pairs comparison."""
+    companies = build_portfolio_profiles(args.companies, args.counterparties)
+
+    def engine():
+        index = CounterpartyIndex()
+        for company, profiles in companies.items():
+            index.add(company, profiles)
+        return overlap_report(index)
+
+    indexed = timed(engine)
+    sample = dict(list(companies.items())[:args.naive_companies])
+    naive = timed(naive_overlap, sample)
+    report = engine()["suppliers"]
+
+    print(f"{args.companies} companies x {args.counterparties} suppliers")
+    print(f"{'step':<40} {'time (s)':>9}")
+    print(f"{f'all pairs ({args.naive_companies} companies only)':<40} {naive:>9.2f}")
+    print(f"{'blocked index (all companies)':<40} {indexed:>9.3f}")
+    print(f"shared suppliers: {report['n_shared']} ({report['shared_spend_pct']}% of spend)")
+
+
+def naive_variance(frames: list) -> pd.DataFrame:
+    """Per-year pivot tables (account x month) merged on the account, one per ledger."""
+    tables = []
+    for y, df in enumerate(frames):
+        dates = pd.to_datetime(df["EcritureDate"].to_numpy().astype("datetime64[D]"))
+        months = dates.year * 12 + dates.month
+        net = (df["Debit"] - df["Credit"]).to_numpy()
+        table = pd.DataFrame({"account": df["CompteNum"].astype(str), "month": months - months.min(), "net": net}).pivot_table(
+            index="account", columns="month", values="net", aggfunc="sum", fill_value=0
+        )
+        tables.append(table.add_prefix(f"y{y}_"))
+    merged = tables[0].join(tables[1:], how="outer").fillna(0)
+    return merged.filter(like="y1_").sum(axis=1) - merged.filter(like="y0_").sum(axis=1)
+
+
+def bench_variance(args):
+    """Year-over-year variance: per-year pivot tables and joins vs one bincount into the cube."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for y in range(args.years):
+            path = os.path.join(tmp, f"fec_{2021 + y}.txt")
+            build_synthetic_fec(path, args.lines // args.years, start=datetime.date(2021 + y, 1, 1), seed=y)
+            paths.append(path)
+        frames = [load_fec(path, columns=VARIANCE_COLUMNS) for path in paths]
+
+    naive = timed(naive_variance, frames[-2:])
+    cube = timed(variance_report, frames, [str(2021 + y) for y in range(args.years)])
+    report = variance_report(frames, [str(2021 + y) for y in range(args.years)])
+
+    print(f"{args.years} ledgers, {sum(len(f) for f in frames)} lines")
+    print(f"{'step':<40} {'time (s)':>9}")
+    print(f"{'pivot + join (last two years only)':<40} {naive:>9.2f}")
+    print(f"{'variance cube (all years)':<40} {cube:>9.3f}")
+    print(f"EBITDA change: {report['ebitda_change']:,.2f}  top mover: {report['top_movers_pnl'][0]['account']}")
+
+
+def bench_sampling(args):
+    """First-look screening: exact read vs stratified byte samples, and the coverage of their 95% intervals."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fec.txt")
+        build_synthetic_fec(path, args.lines)
+        start = time.perf_counter()
+        exact = analyze_fec(path, use_cache=False)
+        full = time.perf_counter() - start
+        truth = {key: exact["financials"][key] for key in ("total_revenue", "total_expenses", "ebitda_proxy")}
+
+        print(f"{os.path.getsize(path) / 2**20:.0f} MB, {exact['total_entries']} lines, exact read {full:.2f}s")
+        print(f"{'sample (MB)':<12} {'time (s)':>9} {'revenue error %':>16} {'CI half-width %':>16} {'coverage':>9}")
+        for megabytes in args.sample_mb:
+            covered, runs = 0, 0
+            start = time.perf_counter()
+            df, block, design = read_sample(path, sample_bytes=megabytes * 2**20, columns=SAMPLING_COLUMNS)
+            report = sample_report(df, block, design)
+            elapsed = time.perf_counter() - start
+            # Coverage of the intervals over independent samples
+            for seed in range(args.seeds):
+                df, block, design = read_sample(path, sample_bytes=megabytes * 2**20, seed=seed, columns=SAMPLING_COLUMNS)
+                financials = sample_report(df, block, design)["financials"]
+                for key, value in truth.items():
+                    covered += financials[key]["ci_low"] <= value <= financials[key]["ci_high"]
+                    runs += 1
+            revenue = report["financials"]["total_revenue"]
+            error = (revenue["estimate"] - truth["total_revenue"]) / truth["total_revenue"] * 100
+            half_width = (revenue["ci_high"] - revenue["ci_low"]) / 2 / abs(revenue["estimate"]) * 100
+            print(f"{megabytes:<12} {elapsed:>9.3f} {error:>16.2f} {half_width:>16.2f} {covered / runs:>9.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    sniff = sub.add_parser("sniff", help="Separator/encoding sniffing vs trying every separator")
+    sniff.add_argument("--lines", type=int, default=500_000)
+    sniff.set_defaults(func=bench_sniff)
+
+    concentration = sub.add_parser("concentration", help="Vectorized concentration engine vs groupby.apply")
+    concentration.add_argument("--clients", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    concentration.set_defaults(func=bench_concentration)
+
+    amounts = sub.add_parser("amounts", help="int64 cents amount parser vs float64 conversion")
+    amounts.add_argument("--values", type=int, default=2_000_000)
+    amounts.set_defaults(func=bench_amounts)
+
+    incremental = sub.add_parser("incremental", help="Monthly close: incremental ingestion vs full re-analysis")
+    incremental.add_argument("--lines", type=int, default=2_000_000)
+    incremental.set_defaults(func=bench_incremental)
+
+    batch = sub.add_parser("batch", help="Parallel multi-entity, multi-year batch vs serial read_fec")
+    batch.add_argument("--entities", type=int, default=3)
+    batch.add_argument("--years", type=int, default=4)
+    batch.add_argument("--lines", type=int, default=200_000)
+    batch.set_defaults(func=bench_batch)
+
+    memory = sub.add_parser("memory", help="Peak RSS: all-string load vs compact categorical columns")
+    memory.add_argument("--lines", type=int, default=2_000_000)
+    memory.set_defaults(func=bench_memory)
+
+    store = sub.add_parser("store", help="Indexed SQLite ledger queries vs re-parsing the FEC")
+    store.add_argument("--lines", type=int, default=1_000_000)
+    store.set_defaults(func=bench_store)
+
+    daily = sub.add_parser("daily", help="Daily balance engine vs per-day recomputation")
+    daily.add_argument("--lines", type=int, default=2_000_000)
+    daily.set_defaults(func=bench_daily)
+
+    lettrage = sub.add_parser("lettrage", help="Vectorized invoice/settlement matching vs Python FIFO loop")
+    lettrage.add_argument("--invoices", type=int, default=200_000)
+    lettrage.add_argument("--clients", type=int, default=5_000)
+    lettrage.add_argument("--lettered", type=float, default=0.7)
+    lettrage.set_defaults(func=bench_lettrage)
+
+    recurring = sub.add_parser("recurring", help="Client x month recurring revenue detector vs per-client loop")
+    recurring.add_argument("--clients", type=int, default=50_000)
+    recurring.set_defaults(func=bench_recurring)
+
+    forensic = sub.add_parser("forensic", help="Columnar forensic scan vs row-wise Benford and duplicate checks")
+    forensic.add_argument("--lines", type=int, default=2_000_000)
+    forensic.add_argument("--naive-lines", type=int, default=50_000)
+    forensic.set_defaults(func=bench_forensic)
+
+    leases = sub.add_parser("leases", help="Vectorized IFRS 16 lease restatement vs per-lease loop")
+    leases.add_argument("--leases", type=int, default=20_000)
+    leases.set_defaults(func=bench_leases)
+
+    overlap = sub.add_parser("overlap", help="Blocked supplier index vs all-pairs name comparison")
+    overlap.add_argument("--companies", type=int, default=20)
+    overlap.add_argument("--counterparties", type=int, default=3_000)
+    overlap.add_argument("--naive-companies", type=int, default=2)
+    overlap.set_defaults(func=bench_overlap)
+
+    variance = sub.add_parser("variance", help="Account x month x year variance cube vs per-year pivot tables")
+    variance.add_argument("--lines", type=int, default=2_000_000)
+    variance.add_argument("--years", type=int, default=3)
+    variance.set_defaults(func=bench_variance)
+
+    sampling = sub.add_parser("sampling", help="Stratified byte sample estimates vs exact read")
+    sampling.add_argument("--lines", type=int, default=2_000_000)
+    sampling.add_argument("--sample-mb", type=int, nargs="+", default=[4, 16, 32])
+    sampling.add_argument("--seeds", type=int, default=20)
+    sampling.set_defaults(func=bench_sampling)
+
+    measure = sub.add_parser("measure-load")  # child process of the memory benchmark
+    measure.add_argument("loader", choices=list(MEMORY_LOADERS))
+    measure.add_argument("path")
+    measure.set_defaults(func=measure_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from typing import List
 
 from langchain_core.messages import AIMessage
 
+from dexter.llm_resilience import LLMUnavailableError
 from dexter.model import call_llm
 from dexter.prompts import (
     ACTION_SYSTEM_PROMPT,
@@ -34,6 +35,8 @@ class Agent:
         try:
             response = call_llm(prompt, system_prompt=system_prompt, output_schema=TaskList)
             tasks = response.tasks
+        except LLMUnavailableError:
+            raise  # Provider down: stop rather than run a degraded one-task plan
         except Exception as e:
             self.logger._log(f"Planning failed: {e}")
             tasks = [Task(id=1, description=query, done=False)]
@@ -54,6 +57,8 @@ class Agent:
         """
         try:
             return call_llm(prompt, system_prompt=ACTION_SYSTEM_PROMPT, tools=TOOLS)
+        except LLMUnavailableError:
+            raise
         except Exception as e:
             self.logger._log(f"ask_for_actions failed: {e}")
             return AIMessage(content="Failed to get actions.")
@@ -70,6 +75,8 @@ class Agent:
         try:
             resp = call_llm(prompt, system_prompt=VALIDATION_SYSTEM_PROMPT, output_schema=IsDone)
             return resp.done
+        except LLMUnavailableError:
+            raise
         except:
             return False
 
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from dexter.agent import Agent
+from dexter.llm_resilience import LLMUnavailableError
 from dexter.utils.intro import print_intro
 from prompt_toolkit import PromptSession
 from prompt_toolkit.history import InMemoryHistory
@@ -23,6 +24,8 @@ def main():
                 break
             if query:
                 agent.run(query)
+        except LLMUnavailableError as e:
+            print(f"\n{e}. Try again in a moment.")
         except (KeyboardInterrupt, EOFError):
             print("\nGoodbye!")
             break
@@ -0,0 +1,144 @@
+"""
+Plan Comptable Général (PCG) account map and prefix index.
+
+AccountIndex sorts the distinct account numbers of a ledger once and
+answers prefix ("644") or range ("601-607", "4110-4119999") queries by
+binary search over the pre-aggregated balances. The cost of a query, and
+of adding more account categories, depends on the number of distinct
+accounts, never on the number of ledger lines.
+"""
+
+from typing import Dict, Tuple
+import pandas as pd
+
+from dexter.fec.reader import to_euros
+
+# ========== French Plan Comptable Général (PCG) ==========
+# Key account ranges for EBITDA normalization and red flag detection
+
+PCG_ACCOUNTS = {
+    # Revenue accounts (Class 7)
+    "revenue": {
+        "701": "Ventes de produits finis",
+        "703": "Ventes de marchandises",
+        "706": "Prestations de services",
+        "708": "Produits des activités annexes",
+    },
+
+    # Operating expenses (Class 6) - for EBITDA adjustments
+    "operating_expenses": {
+        "601-607": "Achats",
+        "611": "Sous-traitance générale",
+        "612": "Redevances de crédit-bail",  # Key for lease normalization
+        "613-614": "Locations et charges locatives",
+        "615-616": "Entretien, réparations",
+        "621-628": "Personnel",
+        "631-637": "Impôts et taxes",
+        "641": "Rémunérations du personnel",
+        "644": "Rémunération du travail de l'exploitant",  # KEY: Owner compensation
+        "645": "Charges de sécurité sociale et de prévoyance",
+        "681": "Dotations aux amortissements",  # Add back for EBITDA
+        "6815": "Dotations aux provisions d'exploitation",  # Add back for EBITDA
+    },
+
+    # Financial accounts
+    "financial": {
+        "661": "Charges d'intérêts",
+        "761": "Produits financiers",
+    },
+
+    # Exceptional items (Class 67/77) - for normalization
+    "exceptional": {
+        "671": "Charges exceptionnelles sur opérations de gestion",
+        "771": "Produits exceptionnels sur opérations de gestion",
+    },
+
+    # Balance sheet - Assets (Class 2)
+    "fixed_assets": {
+        "20": "Immobilisations incorporelles",
+        "21": "Immobilisations corporelles",
+        "23": "Immobilisations en cours",
+    },
+
+    # Balance sheet - Liabilities (Class 1, 4)
+    "equity_debt": {
+        "101": "Capital",
+        "106": "Réserves",
+        "12": "Résultat de l'exercice",
+        "16": "Emprunts et dettes",
+        "164": "Emprunts auprès des établissements de crédit",
+    },
+
+    # Client accounts (Class 411) - for concentration analysis
+    "clients": {
+        "411": "Clients",
+        "4110-4119999": "Comptes clients individuels",
+    },
+
+    # Supplier accounts (Class 401) - for concentration analysis
+    "suppliers": {
+        "401": "Fournisseurs",
+        "4010-4019999": "Comptes fournisseurs individuels",
+    },
+}
+
+# Sorts after any character that can follow a prefix in an account number
+_PREFIX_END = "\uffff"
+
+
+def parse_account_spec(spec: str) -> Tuple[str, str]:
+    """
+    "644" -> ("644", "644"); "601-607" -> ("601", "607").
+
+    A range matches every account whose number starts with a prefix between
+    the two bounds, compared as text: "4110-4119999" matches 4110, 41100013
+    and 4119999 but not the collective 411 account.
+    """
+    low, _, high = spec.partition("-")
+    low, high = low.strip(), (high or low).strip()
+    return low, high
+
+
+def account_range(spec: str) -> Tuple[str, str]:
+    """Half-open text interval [start, end) of the account numbers matching a spec."""
+    low, high = parse_account_spec(spec)
+    return low, high + _PREFIX_END
+
+
+class AccountIndex:
+    """Sorted index over per-account Debit/Credit balances."""
+
+    def __init__(self, balances: pd.DataFrame):
+        self.balances = balances.sort_index()
+        self.accounts = self.balances.index
+
+    def _bounds(self, spec: str) -> Tuple[int, int]:
+        low, high = account_range(spec)
+        start = self.accounts.searchsorted(low, side="left")
+        end = self.accounts.searchsorted(high, side="left")
+        return start, end
+
+    def select(self, spec: str) -> pd.DataFrame:
+        """Balances of the accounts matching a prefix or range spec."""
+        start, end = self._bounds(spec)
+        return self.balances.iloc[start:end]
+
+    def net_debit(self, spec: str) -> int:
+        """Debit minus Credit (cents) over the matching accounts."""
+        rows = self.select(spec)
+        return rows['Debit'].sum() - rows['Credit'].sum()
+
+    def net_credit(self, spec: str) -> int:
+        """Credit minus Debit (cents) over the matching accounts."""
+        rows = self.select(spec)
+        return rows['Credit'].sum() - rows['Debit'].sum()
+
+    def pcg_balances(self, pcg_accounts: Dict[str, Dict[str, str]] = PCG_ACCOUNTS) -> Dict[str, Dict]:
+        """Net debit balance (EUR) of every spec of a PCG-style map, by category."""
+        return {
+            category: {
+                spec: {"label": label, "net_debit": round(to_euros(self.net_debit(spec)), 2)}
+                for spec, label in specs.items()
+            }
+            for category, specs in pcg_accounts.items()
+        }
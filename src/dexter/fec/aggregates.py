@@ -0,0 +1,152 @@
+"""
+Running ledger aggregates.
+
+A LedgerAggregates folds FEC batches into Debit/Credit sums (int64 cents) per
+(CompteNum, month) and per (CompteNum, CompAuxNum) auxiliary account, the
+daily net movements of the bank/debt/trade accounts (see daily.py), plus
+the few scalars the FEC report needs. Its size depends on the number of
+accounts and months, not on the number of lines, so it can be built from a
+streamed file in constant memory.
+"""
+
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+from dexter.fec.daily import empty_movements, daily_movements
+from dexter.fec.reader import MISSING_DAY, day_range
+
+# Month key for entries without a parseable EcritureDate
+UNDATED_MONTH = 0
+
+# Auxiliary balances keep the first non-empty label seen for each CompAuxNum
+AUX_AGGREGATIONS = {'Debit': 'sum', 'Credit': 'sum', 'CompAuxLib': 'first'}
+
+# The only FEC columns the aggregates read: loaders skip everything else
+AGGREGATE_COLUMNS = ['EcritureDate', 'CompteNum', 'CompAuxNum', 'CompAuxLib', 'Debit', 'Credit']
+
+
+def month_keys(days: pd.Series) -> pd.Series:
+    """YYYYMM integer month keys of day ordinals, UNDATED_MONTH for missing dates."""
+    values = days.to_numpy()
+    months = values.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    keys = (months // 12 + 1970) * 100 + months % 12 + 1
+    return pd.Series(np.where(values != MISSING_DAY, keys, UNDATED_MONTH), index=days.index, name=days.name)
+
+
+def plain_index(index: pd.Index) -> pd.Index:
+    """Group keys of categorical columns back to plain values, so batches with different categories fold together."""
+    if isinstance(index, pd.MultiIndex):
+        return pd.MultiIndex.from_arrays(
+            [plain_index(index.get_level_values(i)) for i in range(index.nlevels)], names=index.names
+        )
+    return index.astype(object) if isinstance(index.dtype, pd.CategoricalDtype) else index
+
+
+def _empty_balances(level: str, level_dtype: str, with_label: bool = False) -> pd.DataFrame:
+    columns = {'Debit': pd.Series(dtype='int64'), 'Credit': pd.Series(dtype='int64')}
+    if with_label:
+        columns['CompAuxLib'] = pd.Series(dtype=object)
+    return pd.DataFrame(
+        columns,
+        index=pd.MultiIndex.from_arrays(
+            [pd.Series(dtype=object), pd.Series(dtype=level_dtype)],
+            names=['CompteNum', level],
+        ),
+    )
+
+
+class LedgerAggregates:
+    """Per-account, per-month and per-auxiliary-account Debit/Credit balances of a FEC."""
+
+    def __init__(self):
+        self.total_entries = 0
+        self.date_min: Optional[pd.Timestamp] = None
+        self.date_max: Optional[pd.Timestamp] = None
+        self.balances = _empty_balances('month', 'int64')
+        # Sub-ledger detail (411/401 collective accounts split by CompAuxNum)
+        self.aux_balances = _empty_balances('CompAuxNum', 'object', with_label=True)
+        # Net movements per (class, day ordinal) of the DAILY_ACCOUNTS classes
+        self.daily = empty_movements()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "LedgerAggregates":
+        agg = cls()
+        agg.update(df)
+        return agg
+
+    def update(self, df: pd.DataFrame) -> "LedgerAggregates":
+        """Folds one normalized FEC batch into the running aggregates."""
+        self.total_entries += len(df)
+
+        batch_min, batch_max = day_range(df['EcritureDate'].to_numpy())
+        if batch_min is not None:
+            self._extend_date_range(batch_min, batch_max)
+
+        # Rows without CompteNum never match an account prefix: drop them here.
+        # Categorical CompteNum groups on its integer codes.
+        batch = df[['Debit', 'Credit']].groupby(
+            [df['CompteNum'], month_keys(df['EcritureDate'])], sort=False, observed=True
+        ).sum()
+        batch.index = plain_index(batch.index)
+        batch.index.names = ['CompteNum', 'month']
+        self.balances = self._fold(self.balances, batch)
+
+        if 'CompAuxNum' in df.columns:
+            aux = df[df['CompAuxNum'].notna()]
+            label = aux['CompAuxLib'] if 'CompAuxLib' in aux.columns else pd.Series(pd.NA, index=aux.index, dtype=object)
+            aux_batch = pd.DataFrame({'Debit': aux['Debit'], 'Credit': aux['Credit'], 'CompAuxLib': label}).groupby(
+                [aux['CompteNum'], aux['CompAuxNum']], sort=False, observed=True
+            ).agg(AUX_AGGREGATIONS)
+            aux_batch.index = plain_index(aux_batch.index)
+            aux_batch['CompAuxLib'] = aux_batch['CompAuxLib'].astype(object)
+            self.aux_balances = self._fold(self.aux_balances, aux_batch)
+
+        self.daily = self._fold(self.daily, daily_movements(df))
+        return self
+
+    def merge(self, other: "LedgerAggregates") -> "LedgerAggregates":
+        """Folds another set of aggregates (e.g. from a parallel worker) into this one."""
+        self.total_entries += other.total_entries
+        if other.date_min is not None:
+            self._extend_date_range(other.date_min, other.date_max)
+        self.balances = self._fold(self.balances, other.balances)
+        self.aux_balances = self._fold(self.aux_balances, other.aux_balances)
+        self.daily = self._fold(self.daily, other.daily)
+        return self
+
+    def _extend_date_range(self, start: pd.Timestamp, end: pd.Timestamp):
+        self.date_min = start if self.date_min is None else min(self.date_min, start)
+        self.date_max = end if self.date_max is None else max(self.date_max, end)
+
+    @staticmethod
+    def _fold(current, batch):
+        if current.empty:
+            return batch
+        if batch.empty:
+            return current
+        combined = pd.concat([current, batch]).groupby(level=[0, 1], sort=False)
+        if isinstance(current, pd.DataFrame) and 'CompAuxLib' in current.columns:
+            return combined.agg(AUX_AGGREGATIONS)
+        return combined.sum()
+
+    # ---------- views ----------
+    def account_balances(self) -> pd.DataFrame:
+        """Debit/Credit totals per CompteNum over the whole period."""
+        return self.balances.groupby(level='CompteNum', sort=False).sum()
+
+    def monthly_balances(self, accounts: pd.Index) -> pd.DataFrame:
+        """Debit/Credit totals per dated month for the given accounts."""
+        rows = self.balances[self.balances.index.get_level_values('CompteNum').isin(accounts)]
+        rows = rows[rows.index.get_level_values('month') != UNDATED_MONTH]
+        return rows.groupby(level='month').sum()
+
+    def auxiliary_balances(self, collective_prefix: str) -> pd.DataFrame:
+        """Debit/Credit totals and label per CompAuxNum under accounts starting with `collective_prefix`."""
+        aux = self.aux_balances
+        rows = aux[aux.index.get_level_values('CompteNum').str.startswith(collective_prefix)]
+        return rows.groupby(level='CompAuxNum', sort=False).agg(AUX_AGGREGATIONS)
+
+    @property
+    def unique_accounts(self) -> int:
+        return self.balances.index.get_level_values('CompteNum').nunique()
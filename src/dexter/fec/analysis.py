@@ -0,0 +1,269 @@
+"""
+FEC analysis entry point.
+
+Loads a FEC through the requested path (full load, streaming, cache or
+incremental state), aggregates it and builds the due diligence report.
+Shared by the read_fec tool and the parallel batch workers; the sampling
+mode estimates the headline figures of a huge file from a byte sample.
+
+The other entry points each load only the columns of one analysis (payments,
+recurring revenue, forensic checks, EBITDA normalization, leases,
+consolidation, counterparties, account variance). All of them return an
+error dict instead of raising.
+"""
+
+from typing import Callable, Dict, List, Optional
+import functools
+import inspect
+import os
+import pandas as pd
+
+from dexter.fec.aggregates import AGGREGATE_COLUMNS, LedgerAggregates
+from dexter.fec.consolidation import CONSOLIDATION_COLUMNS, entity_flows
+from dexter.fec.cache import iter_fec_chunks_cached, load_fec_cached
+from dexter.fec.forensic import FORENSIC_COLUMNS, scan_ledger
+from dexter.fec.incremental import ingest_incremental
+from dexter.fec.accounts import AccountIndex
+from dexter.fec.leases import DEFAULT_DISCOUNT_RATE, LEASE_COLUMNS, restate_leases
+from dexter.fec.lettrage import DEFAULT_PAYMENT_TERMS_DAYS, LETTRAGE_COLUMNS, payment_report
+from dexter.fec.normalization import normalize_ebitda_from_ledger
+from dexter.fec.overlap import OVERLAP_COLUMNS, counterparty_spend
+from dexter.fec.reader import FECParseError, day_range, iter_fec_chunks, load_fec
+from dexter.fec.recurring import RECURRING_COLUMNS, recurring_report
+from dexter.fec.report import build_fec_report
+from dexter.fec.sampling import DEFAULT_SAMPLE_BYTES, SAMPLING_COLUMNS, read_sample, sample_report
+from dexter.fec.variance import VARIANCE_COLUMNS, variance_report
+
+
+def _error_dict(action: str, *context: str) -> Callable:
+    """
+    Returns the exceptions of an entry point as its error dict: the parse
+    details of a FECParseError, else "Failed to <action>" with the input
+    file(s) and the `context` arguments.
+    """
+    def decorate(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Dict:
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            try:
+                return func(*args, **kwargs)
+            except FECParseError as e:
+                return {
+                    "error": str(e),
+                    "tried_separators": e.tried_separators,
+                    "encoding": e.encoding
+                }
+            except Exception as e:
+                inputs = arguments.arguments
+                error = {"error": f"Failed to {action}: {str(e)}"}
+                if "fec_path" in inputs:
+                    error["file_path"] = inputs["fec_path"]
+                else:
+                    error["fec_paths"] = inputs["fec_paths"]
+                error.update({name: inputs[name] for name in context})
+                return error
+        return wrapper
+    return decorate
+
+
+@_error_dict("read FEC", "encoding", "separator")
+def analyze_fec(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    chunksize: Optional[int] = None,
+    use_cache: bool = True,
+    incremental: bool = False,
+    ledger_id: Optional[str] = None,
+    sample: bool = False,
+    sample_bytes: int = DEFAULT_SAMPLE_BYTES,
+) -> Dict:
+    """The read_fec report for one file, or an error dict (never raises)."""
+    if sample and os.path.getsize(fec_path) > sample_bytes:
+        # First-look screening: estimates from a stratified byte sample, exact path otherwise
+        df, block, design = read_sample(
+            fec_path, encoding=encoding, separator=separator, sample_bytes=sample_bytes, columns=SAMPLING_COLUMNS
+        )
+        return {"success": True, "file_path": fec_path, **sample_report(df, block, design)}
+
+    cache_info = {"hit": False, "key": None}
+    incremental_info = None
+    if incremental:
+        agg, incremental_info = ingest_incremental(fec_path, ledger_id=ledger_id, encoding=encoding, separator=separator)
+    elif chunksize:
+        # Streaming mode: fold fixed-size batches into running aggregates
+        if use_cache:
+            chunks, cache_info = iter_fec_chunks_cached(
+                fec_path, encoding=encoding, separator=separator, chunksize=chunksize, columns=AGGREGATE_COLUMNS
+            )
+        else:
+            chunks = iter_fec_chunks(
+                fec_path, encoding=encoding, separator=separator, chunksize=chunksize, columns=AGGREGATE_COLUMNS
+            )
+        agg = LedgerAggregates()
+        for chunk in chunks:
+            agg.update(chunk)
+    else:
+        if use_cache:
+            df, cache_info = load_fec_cached(fec_path, encoding=encoding, separator=separator, columns=AGGREGATE_COLUMNS)
+        else:
+            df = load_fec(fec_path, encoding=encoding, separator=separator, columns=AGGREGATE_COLUMNS)
+        agg = LedgerAggregates.from_frame(df)
+
+    report = build_fec_report(agg, fec_path)
+    report["cache"] = cache_info
+    if incremental_info is not None:
+        report["incremental"] = incremental_info
+    return report
+
+
+def _load_columns(fec_path: str, columns: List[str], encoding: str, separator: str, use_cache: bool) -> pd.DataFrame:
+    if use_cache:
+        df, _ = load_fec_cached(fec_path, encoding=encoding, separator=separator, columns=columns)
+        return df
+    return load_fec(fec_path, encoding=encoding, separator=separator, columns=columns)
+
+
+@_error_dict("analyze payments", "side")
+def analyze_payments(
+    fec_path: str,
+    side: str = "clients",
+    payment_terms_days: int = DEFAULT_PAYMENT_TERMS_DAYS,
+    as_of: Optional[str] = None,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """Payment delays, aging and overdue exposure of the clients or suppliers of a FEC, or an error dict."""
+    df = _load_columns(fec_path, LETTRAGE_COLUMNS, encoding, separator, use_cache)
+    report = payment_report(
+        df, side=side, payment_terms_days=payment_terms_days, as_of=pd.Timestamp(as_of) if as_of else None
+    )
+    return {"success": True, "file_path": fec_path, **report}
+
+
+@_error_dict("analyze recurring revenue")
+def analyze_recurring_revenue(
+    fec_paths: List[str],
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """
+    Recurring revenue share, client retention and cohorts over one or more
+    fiscal years of the same entity, or an error dict.
+    """
+    frames = [_load_columns(path, RECURRING_COLUMNS, encoding, separator, use_cache) for path in fec_paths]
+    # Categories differ between years: concatenate the codes as plain values
+    df = pd.concat(
+        [f.astype({c: object for c in f.columns if isinstance(f[c].dtype, pd.CategoricalDtype)}) for f in frames],
+        ignore_index=True,
+    ) if len(frames) > 1 else frames[0]
+    return {"success": True, "fec_paths": fec_paths, **recurring_report(df)}
+
+
+@_error_dict("scan FEC")
+def scan_fec_anomalies(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+    top_n: Optional[int] = None,
+) -> Dict:
+    """Forensic checks of a FEC as ranked red flags, or an error dict."""
+    df = _load_columns(fec_path, FORENSIC_COLUMNS, encoding, separator, use_cache)
+    return {"success": True, "file_path": fec_path, **scan_ledger(df, top_n=top_n)}
+
+
+@_error_dict("normalize EBITDA")
+def normalize_fec_ebitda(
+    fec_path: str,
+    cost_index: float = 1.0,
+    market_manager_cost: Optional[float] = None,
+    add_back_credit_bail: bool = True,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """Reported and normalized EBITDA of a FEC with the ledger-driven adjustments, or an error dict."""
+    df = _load_columns(fec_path, AGGREGATE_COLUMNS, encoding, separator, use_cache)
+    index = AccountIndex(LedgerAggregates.from_frame(df).account_balances())
+    return {
+        "success": True,
+        "file_path": fec_path,
+        **normalize_ebitda_from_ledger(
+            index,
+            cost_index=cost_index,
+            market_manager_cost=market_manager_cost,
+            add_back_credit_bail=add_back_credit_bail,
+        ),
+    }
+
+
+@_error_dict("restate leases")
+def restate_fec_leases(
+    fec_path: str,
+    discount_rate: float = DEFAULT_DISCOUNT_RATE,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """IFRS 16 restatement of the 612/613 leases of a FEC, or an error dict."""
+    df = _load_columns(fec_path, LEASE_COLUMNS, encoding, separator, use_cache)
+    return {"success": True, "file_path": fec_path, **restate_leases(df, discount_rate=discount_rate)}
+
+
+@_error_dict("consolidate FEC")
+def consolidation_flows(
+    fec_path: str,
+    entity: str,
+    identifiers: Dict[str, str],
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """One entity's balances and intercompany eliminations for the consolidation, or an error dict."""
+    df = _load_columns(fec_path, CONSOLIDATION_COLUMNS, encoding, separator, use_cache)
+    balances, eliminations, mixed = entity_flows(df, entity, identifiers)
+    return {
+        "success": True,
+        "file_path": fec_path,
+        "entity": entity,
+        "n_lines": len(df),
+        "balances": balances,
+        "eliminations": eliminations,
+        "mixed_entries": mixed,
+    }
+
+
+@_error_dict("read counterparties")
+def fec_counterparties(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """Supplier and client profiles of a FEC for the overlap index, or an error dict."""
+    df = _load_columns(fec_path, OVERLAP_COLUMNS, encoding, separator, use_cache)
+    return {"success": True, "file_path": fec_path, "profiles": counterparty_spend(df)}
+
+
+@_error_dict("analyze account variance")
+def analyze_account_variance(
+    fec_paths: List[str],
+    top_n: int = 20,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True,
+) -> Dict:
+    """Account variances between the fiscal years of one company's FECs, or an error dict."""
+    frames = [_load_columns(path, VARIANCE_COLUMNS, encoding, separator, use_cache) for path in fec_paths]
+    # A fiscal year is named after the year its ledger ends
+    labels = []
+    for path, df in zip(fec_paths, frames):
+        end = day_range(df["EcritureDate"].to_numpy())[1]
+        labels.append(str(end.year) if end is not None else os.path.basename(path))
+    return {"success": True, "fec_paths": fec_paths, **variance_report(frames, labels, top_n=top_n)}
@@ -0,0 +1,277 @@
+"""
+Parallel analysis of a group's FECs (several entities x fiscal years).
+
+Every file goes through analyze_fec in its own worker process, largest
+files first so that the pool stays busy until the end. The reports are then
+lined up per entity and fiscal year into a year-over-year table.
+consolidate_fec_batch reduces the FECs of one fiscal year (one per entity)
+the same way and folds the reductions into consolidated group figures;
+portfolio_overlap_batch feeds the supplier and client profiles of every
+company into the overlap index.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import os
+import re
+import pandas as pd
+
+from dexter.fec.analysis import analyze_fec, consolidation_flows, fec_counterparties
+from dexter.fec.consolidation import consolidated_report, fold, normalize_identifier
+from dexter.fec.overlap import PURCHASING_SAVINGS_RATE, CounterpartyIndex, overlap_report
+from dexter.fec.reader import parse_fec_filename
+
+FEC_EXTENSIONS = (".txt", ".csv")
+
+# A year (or a YYYYMMDD closing date) in a non-official file name
+FILENAME_YEAR = re.compile(r"(?<!\d)((?:19|20)\d{2})(?:\d{4})?(?!\d)")
+
+# Year-over-year metrics: output name -> path in the read_fec report
+YOY_METRICS = {
+    "revenue": ("financials", "total_revenue"),
+    "ebitda_proxy": ("financials", "ebitda_proxy"),
+    "ebitda_margin_pct": ("financials", "ebitda_margin_pct"),
+    "owner_compensation_644": ("financials", "owner_compensation_644"),
+    "top_client_concentration_pct": ("concentration", "top_client_concentration_pct"),
+    "top_supplier_concentration_pct": ("concentration", "top_supplier_concentration_pct"),
+}
+
+# Metrics whose relative change is reported (the others are already ratios)
+YOY_GROWTH = ["revenue", "ebitda_proxy", "owner_compensation_644"]
+
+
+def discover_fec_files(paths: List[str]) -> List[str]:
+    """Files as given plus the .txt/.csv files of the given directories (not recursive)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(FEC_EXTENSIONS) and os.path.isfile(os.path.join(path, name))
+            )
+        else:
+            files.append(path)
+    # Same file listed twice (directory + explicit path): analyze it once
+    seen = set()
+    return [f for f in files if not (os.path.abspath(f) in seen or seen.add(os.path.abspath(f)))]
+
+
+def _pool_size(max_workers: Optional[int], files: List[str]) -> int:
+    return max(1, min(max_workers or os.cpu_count() or 1, len(files)))
+
+
+def _run_pool(
+    func: Callable[..., Dict],
+    files: List[str],
+    workers: int,
+    args: Callable[[str], tuple] = lambda path: (),
+    **kwargs,
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    (path, func(path, *args(path), **kwargs)) for every file, in a pool of
+    `workers` processes (in this process for a single worker), as the
+    results come in.
+    """
+    # Longest jobs first: the last worker to finish is not stuck on a big file
+    order = sorted(files, key=lambda f: os.path.getsize(f) if os.path.exists(f) else 0, reverse=True)
+    if workers == 1:
+        for path in order:
+            yield path, func(path, *args(path), **kwargs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(func, path, *args(path), **kwargs): path for path in order}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def entity_and_year(fec_path: str, report: Dict) -> Tuple[str, Optional[int]]:
+    """
+    Entity and fiscal year of a FEC: SIREN and closing year from an official
+    file name, otherwise the file name without its year (e.g. acme_2022.txt)
+    and that year, or the year the ledger ends.
+    """
+    official = parse_fec_filename(fec_path)
+    if official and official["closing_date"] is not None:
+        return official["siren"], official["closing_date"].year
+
+    stem = os.path.splitext(os.path.basename(fec_path))[0]
+    years = FILENAME_YEAR.findall(stem)
+    entity = FILENAME_YEAR.sub("", stem).strip(" _-.") or stem
+    if official:
+        entity = official["siren"]
+    if years:
+        return entity, int(years[-1])
+    end = (report.get("date_range") or {}).get("end")
+    return entity, int(end[:4]) if end else None
+
+
+def _growth_pct(current: float, previous: Optional[float]) -> Optional[float]:
+    if previous is None or previous == 0:
+        return None
+    return round((current - previous) / abs(previous) * 100, 2)
+
+
+def year_over_year(entries: List[Dict]) -> Dict[str, List[Dict]]:
+    """Per entity, one row per fiscal year with the key metrics and their change vs the prior year."""
+    table: Dict[str, List[Dict]] = {}
+    for entry in sorted(entries, key=lambda e: (e["entity"], e["fiscal_year"] or 0)):
+        report = entry["report"]
+        row = {"fiscal_year": entry["fiscal_year"], "file_path": entry["file_path"]}
+        for name, (section, key) in YOY_METRICS.items():
+            row[name] = report[section][key]
+
+        rows = table.setdefault(entry["entity"], [])
+        previous = rows[-1] if rows else {}
+        for name in YOY_GROWTH:
+            row[f"{name}_growth_pct"] = _growth_pct(row[name], previous.get(name))
+        rows.append(row)
+    return table
+
+
+def analyze_fec_batch(paths: List[str], max_workers: Optional[int] = None, **read_options) -> Dict:
+    """
+    Analyzes every FEC of `paths` (files or directories) in a process pool.
+
+    `read_options` are passed to analyze_fec (encoding, separator,
+    chunksize, use_cache). Returns the per-file reports, the files that
+    failed and the year-over-year table per entity.
+    """
+    files = discover_fec_files(paths)
+    if not files:
+        return {"error": "No FEC file found", "paths": paths}
+
+    workers = _pool_size(max_workers, files)
+    reports = dict(_run_pool(analyze_fec, files, workers, **read_options))
+
+    entries, errors = [], []
+    for path in files:
+        report = reports[path]
+        if "error" in report:
+            errors.append({"file_path": path, **report})
+            continue
+        entity, fiscal_year = entity_and_year(path, report)
+        entries.append({"file_path": path, "entity": entity, "fiscal_year": fiscal_year, "report": report})
+
+    return {
+        "success": bool(entries),
+        "n_files": len(files),
+        "workers": workers,
+        "files": entries,
+        "errors": errors,
+        "year_over_year": year_over_year(entries),
+    }
+
+
+def group_identifiers(entities: Dict[str, str], aliases: Optional[Dict[str, List[str]]] = None) -> Dict[str, str]:
+    """
+    Normalized identifier -> entity, from each entity's name, the SIREN of
+    its official file name and the aliases given for it (SIREN, CompAuxNum
+    codes or names the other entities use for it).
+    """
+    identifiers = {}
+    for path, entity in entities.items():
+        official = parse_fec_filename(path)
+        for value in [entity, official["siren"] if official else None, *(aliases or {}).get(entity, [])]:
+            if value:
+                identifiers[normalize_identifier(value)] = entity
+    return identifiers
+
+
+def consolidate_fec_batch(
+    paths: List[str],
+    aliases: Optional[Dict[str, List[str]]] = None,
+    max_workers: Optional[int] = None,
+    **read_options,
+) -> Dict:
+    """
+    Consolidates the FECs of `paths` (files or directories, one fiscal year
+    per entity) in a process pool.
+
+    `read_options` are passed to consolidation_flows (encoding, separator,
+    use_cache). Each worker returns its entity's per-account and month sums
+    only; they are folded as they come in, so the parent holds a handful of
+    small frames whatever the number of entities.
+    """
+    files = discover_fec_files(paths)
+    if not files:
+        return {"error": "No FEC file found", "paths": paths}
+
+    entities = {path: entity_and_year(path, {})[0] for path in files}
+    duplicates = sorted({e for e in entities.values() if list(entities.values()).count(e) > 1})
+    if duplicates:
+        return {
+            "error": "Several FECs for the same entity: consolidate one fiscal year per entity",
+            "entities": duplicates,
+        }
+    identifiers = group_identifiers(entities, aliases)
+
+    workers = _pool_size(max_workers, files)
+    balances, eliminations = None, None
+    entity_balances, entity_eliminations, entity_mixed, errors, n_lines = {}, {}, {}, [], 0
+    flows = _run_pool(consolidation_flows, files, workers, args=lambda path: (entities[path], identifiers), **read_options)
+    for path, result in flows:
+        if "error" in result:
+            errors.append({"file_path": path, **result})
+            continue
+        entity = result["entity"]
+        # Per entity, accounts only: the contributions do not need the months
+        entity_balances[entity] = result["balances"].groupby(level="CompteNum", sort=False).sum()
+        entity_eliminations[entity] = result["eliminations"]
+        entity_mixed[entity] = result["mixed_entries"]
+        balances = fold(balances, result["balances"])
+        eliminations = fold(eliminations, result["eliminations"])
+        n_lines += result["n_lines"]
+
+    if balances is None:
+        return {"success": False, "n_files": len(files), "errors": errors}
+    return {
+        "success": True,
+        "n_files": len(files),
+        "workers": workers,
+        "n_lines": n_lines,
+        "entities_in_scope": sorted(entity_balances),
+        "errors": errors,
+        **consolidated_report(balances, eliminations, entity_balances, entity_eliminations, entity_mixed),
+    }
+
+
+def portfolio_overlap_batch(
+    paths: List[str],
+    max_workers: Optional[int] = None,
+    top_n: int = 20,
+    savings_rate: float = PURCHASING_SAVINGS_RATE,
+    **read_options,
+) -> Dict:
+    """
+    Suppliers and clients shared by the companies of `paths` (files or
+    directories). Profiles are read in a process pool; the fiscal years of
+    one company are pooled under its entity name.
+    """
+    files = discover_fec_files(paths)
+    if not files:
+        return {"error": "No FEC file found", "paths": paths}
+
+    results = dict(_run_pool(fec_counterparties, files, _pool_size(max_workers, files), **read_options))
+
+    companies: Dict[str, List] = {}
+    errors = []
+    for path in files:
+        result = results[path]
+        if "error" in result:
+            errors.append({"file_path": path, **result})
+            continue
+        companies.setdefault(entity_and_year(path, {})[0], []).append(result["profiles"])
+
+    index = CounterpartyIndex()
+    for company, profiles in companies.items():
+        pooled = pd.concat(profiles, ignore_index=True).groupby(["side", "id"], sort=False).agg(
+            label=("label", "first"), spend=("spend", "sum"), n_invoices=("n_invoices", "sum")
+        ).reset_index()
+        index.add(company, pooled)
+    return {
+        "success": bool(companies),
+        "n_files": len(files),
+        "companies": sorted(companies),
+        "errors": errors,
+        **overlap_report(index, top_n=top_n, savings_rate=savings_rate),
+    }
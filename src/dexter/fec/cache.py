@@ -0,0 +1,306 @@
+"""
+On-disk columnar cache of parsed FECs.
+
+Each entry is a directory holding one .npy file per column of the
+normalized ledger (int64 cents Debit/Credit, int32 day ordinals, stripped
+column names). Categorical and string columns are dictionary-encoded:
+int32 codes in a .npy file plus the distinct values in a JSON file; the
+categoricals come back as categoricals. Entries are keyed by the file
+content hash, encoding and separator, so any edit to the FEC invalidates
+them. Numeric arrays are memory-mapped on load instead of re-tokenizing
+the text file.
+
+An entry only holds the columns that were asked for. A later read that
+needs more parses just the missing columns and appends them to the entry.
+
+Total size is bounded (DEXTER_FEC_CACHE_MAX_MB, default 2048): the least
+recently used entries are evicted first.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+from dexter.fec.reader import iter_fec_chunks, load_fec, sniff_fec_format
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dexter", "fec")
+DEFAULT_MAX_MB = 2048
+
+# Bump when the on-disk layout or the normalization rules change
+CACHE_FORMAT_VERSION = 4
+
+META_FILE = "meta.json"
+HASH_BLOCK_SIZE = 1 << 20
+
+# (path, size, mtime_ns) -> content digest, to avoid rehashing within a session
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+def cache_dir() -> str:
+    return os.getenv("DEXTER_FEC_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+def max_cache_bytes() -> int:
+    return int(float(os.getenv("DEXTER_FEC_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def file_digest(path: str) -> str:
+    """Content hash of a file (blake2b), memoized on path, size and mtime."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digest_memo:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                h.update(block)
+        _digest_memo[memo_key] = h.hexdigest()
+    return _digest_memo[memo_key]
+
+
+def cache_key(fec_path: str, encoding: str, separator: str) -> str:
+    raw = f"v{CACHE_FORMAT_VERSION}|{file_digest(fec_path)}|{encoding}|{separator}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CachedLedger:
+    """A cache entry: column metadata plus lazily memory-mapped column files."""
+
+    def __init__(self, path: str, meta: Dict):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def n_rows(self) -> int:
+        return self.meta["n_rows"]
+
+    @property
+    def columns(self) -> List[str]:
+        return [col["name"] for col in self.meta["columns"]]
+
+    def missing(self, columns: Optional[List[str]]) -> List[str]:
+        """Columns of the source file asked for but not stored yet (all of them if `columns` is None)."""
+        available = self.meta.get("available", self.columns)
+        stored = set(self.columns)
+        return [c for c in (available if columns is None else columns) if c in available and c not in stored]
+
+    def _load_column(self, col: Dict, rows: slice):
+        if col["kind"] in ("category", "categorical"):
+            with open(os.path.join(self.path, col["file"] + ".cats.json"), encoding="utf-8") as f:
+                categories = json.load(f)
+            codes = np.load(os.path.join(self.path, col["file"] + ".codes.npy"), mmap_mode="r")
+            if col["kind"] == "categorical":
+                return pd.Categorical.from_codes(np.asarray(codes[rows]), categories=categories)
+            # Plain strings; trailing NaN so that code -1 (missing) decodes to NaN
+            return np.array(categories + [np.nan], dtype=object)[codes[rows]]
+        return np.load(os.path.join(self.path, col["file"] + ".npy"), mmap_mode="r")[rows]
+
+    def frame(self, rows: slice = slice(None), columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rebuilds the normalized ledger (or a row slice / a subset of its columns)."""
+        stored = {col["name"]: col for col in self.meta["columns"]}
+        # Source file order, whatever order the columns were added to the entry in
+        order = [c for c in self.meta.get("available", stored) if c in stored and (columns is None or c in columns)]
+        return pd.DataFrame({name: self._load_column(stored[name], rows) for name in order}, copy=False)
+
+    def iter_chunks(self, chunksize: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        for start in range(0, self.n_rows, chunksize):
+            yield self.frame(slice(start, start + chunksize), columns)
+
+
+def lookup(key: str) -> Optional[CachedLedger]:
+    """Returns the cache entry for `key` and marks it as recently used, or None."""
+    path = os.path.join(cache_dir(), key)
+    try:
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        os.utime(path)  # LRU bookkeeping
+    except (OSError, ValueError):
+        # Missing, unreadable, or evicted by another process since meta.json was read
+        return None
+    return CachedLedger(path, meta)
+
+
+def write_columns(path: str, df: pd.DataFrame, prefix: str = "col") -> List[Dict]:
+    """Writes each column of `df` to `path` in the cache layout; returns their metadata."""
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        file = f"{prefix}{i}"
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, categories, kind = series.cat.codes.to_numpy(), series.cat.categories, "categorical"
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            np.save(os.path.join(path, file + ".npy"), series.to_numpy())
+            columns.append({"name": name, "kind": str(series.dtype), "file": file})
+            continue
+        else:
+            codes, categories = pd.factorize(series, use_na_sentinel=True)
+            kind = "category"
+        np.save(os.path.join(path, file + ".codes.npy"), codes.astype(np.int32))
+        with open(os.path.join(path, file + ".cats.json"), "w", encoding="utf-8") as f:
+            json.dump([str(c) for c in categories], f, ensure_ascii=False)
+        columns.append({"name": name, "kind": kind, "file": file})
+    return columns
+
+
+def _write_meta(path: str, meta: Dict):
+    """Replaces meta.json atomically: readers see either the old or the new column list."""
+    tmp = os.path.join(path, f".{META_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, META_FILE))
+
+
+def save_frame(path: str, df: pd.DataFrame):
+    """Writes a plain DataFrame (no index) to its own directory in the cache layout."""
+    os.makedirs(path, exist_ok=True)
+    meta = {"n_rows": len(df), "columns": write_columns(path, df)}
+    with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    """Reads back a DataFrame written by save_frame (numeric columns are copied out of the mmap)."""
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    return CachedLedger(path, meta).frame().copy()
+
+
+def store(key: str, df: pd.DataFrame, source: str, available: Optional[List[str]] = None) -> CachedLedger:
+    """
+    Writes a normalized ledger as a new cache entry, then enforces the size
+    bound. `available` lists every column of the source file, when `df`
+    only holds some of them.
+    """
+    root = cache_dir()
+    os.makedirs(root, exist_ok=True)
+    final_path = os.path.join(root, key)
+    tmp_path = os.path.join(root, f".{key}.{os.getpid()}.tmp")
+    os.makedirs(tmp_path, exist_ok=True)
+
+    columns = write_columns(tmp_path, df)
+
+    meta = {
+        "version": CACHE_FORMAT_VERSION,
+        "source": os.path.abspath(source),
+        "n_rows": len(df),
+        "columns": columns,
+        "available": list(available if available is not None else df.columns),
+        "created": time.time(),
+    }
+    _write_meta(tmp_path, meta)
+
+    try:
+        os.replace(tmp_path, final_path)
+    except OSError:
+        # Another process stored the same entry concurrently: keep theirs
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    evict(max_cache_bytes(), keep=key)
+    return CachedLedger(final_path, meta)
+
+
+def extend(cached: CachedLedger, fec_path: str, encoding: str, separator: str, columns: List[str]) -> CachedLedger:
+    """Parses only `columns` from the source file and appends them to the entry."""
+    df = load_fec(fec_path, encoding=encoding, separator=separator, columns=columns)
+    if len(df) != cached.n_rows:
+        raise OSError(f"cache entry {cached.path} does not match {fec_path}")
+    # Per-process file names: concurrent extensions never write the same file
+    added = write_columns(cached.path, df, prefix=f"col{len(cached.meta['columns'])}_{os.getpid()}_")
+    meta = dict(cached.meta, columns=cached.meta["columns"] + added)
+    _write_meta(cached.path, meta)
+    evict(max_cache_bytes(), keep=os.path.basename(cached.path))
+    return CachedLedger(cached.path, meta)
+
+
+def _dir_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict(max_bytes: int, keep: Optional[str] = None) -> List[str]:
+    """Deletes least recently used entries until the cache fits in `max_bytes`."""
+    root = cache_dir()
+    if not os.path.isdir(root):
+        return []
+
+    entries = []
+    for entry in os.scandir(root):
+        if entry.is_dir() and not entry.name.startswith("."):
+            entries.append((entry.stat().st_mtime, entry.name, _dir_size(entry.path)))
+
+    total = sum(size for _, _, size in entries)
+    evicted = []
+    for _, name, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        total -= size
+        evicted.append(name)
+    return evicted
+
+
+# ---------- read-through helpers ----------
+
+def load_fec_cached(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    columns: Optional[List[str]] = None,
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    load_fec through the cache. Returns the ledger and a cache info dict
+    ({"hit": bool, "key": str}). A cache miss parses the file and stores it;
+    a hit missing some of `columns` parses and stores only those.
+    """
+    key = cache_key(fec_path, encoding, separator)
+    cached = lookup(key)
+    if cached is not None:
+        missing = cached.missing(columns)
+        if missing:
+            try:
+                cached = extend(cached, fec_path, encoding, separator, missing)
+            except OSError:
+                cached = None
+        if cached is not None:
+            try:
+                df = cached.frame(columns=columns)
+            except OSError:
+                cached = None  # Evicted by another process while loading: parse the file
+        if cached is not None:
+            info = {"hit": True, "key": key}
+            if missing:
+                info["added_columns"] = missing
+            return df, info
+
+    df = load_fec(fec_path, encoding=encoding, separator=separator, columns=columns)
+    try:
+        available = [col.strip() for col in sniff_fec_format(fec_path, encoding, separator).columns]
+        store(key, df, fec_path, available=available)
+    except OSError:
+        pass  # A read-only or full cache dir must not break the analysis
+    return df, {"hit": False, "key": key}
+
+
+def iter_fec_chunks_cached(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    chunksize: int = 500_000,
+    columns: Optional[List[str]] = None,
+) -> Tuple[Iterator[pd.DataFrame], Dict]:
+    """
+    iter_fec_chunks through the cache. Streaming reads use an existing entry
+    holding `columns` but never populate or extend one, so that memory stays
+    bounded on a miss.
+    """
+    key = cache_key(fec_path, encoding, separator)
+    cached = lookup(key)
+    if cached is not None and not cached.missing(columns):
+        return cached.iter_chunks(chunksize, columns), {"hit": True, "key": key}
+    chunks = iter_fec_chunks(fec_path, encoding=encoding, separator=separator, chunksize=chunksize, columns=columns)
+    return chunks, {"hit": False, "key": key}
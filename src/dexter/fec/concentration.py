@@ -0,0 +1,86 @@
+"""
+Client/supplier concentration engine.
+
+Works on net balances per counterparty, taken either from individual
+CompteNum accounts (4110-4119999, 4010-4019999) or from the CompAuxNum
+sub-ledger of the collective 411/401 accounts. Top-N lists, concentration
+curves and Herfindahl indices all come from one sort and one cumulative
+sum over the balances, without calling back into Python per counterparty.
+"""
+
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import AccountIndex
+from dexter.fec.aggregates import LedgerAggregates
+from dexter.fec.reader import to_euros
+
+# Points of the concentration curve: share of exposure held by the top N
+CURVE_POINTS = [1, 5, 10, 20, 50]
+
+# Client ranges are debit-balance accounts, supplier ranges credit-balance ones
+COUNTERPARTY_LEDGERS = {
+    "clients": {"accounts": "4110-4119999", "collective": "411", "sign": 1},
+    "suppliers": {"accounts": "4010-4019999", "collective": "401", "sign": -1},
+}
+
+
+def concentration_profile(balances: pd.Series, labels: Optional[pd.Series] = None, top_n: int = 10) -> Dict:
+    """
+    Concentration statistics for net exposures (int64 cents) per counterparty.
+
+    Shares are computed on positive exposures only: a client with a credit
+    balance (prepayment, credit note) carries no concentration risk.
+    """
+    exposures = balances[balances > 0]
+    values = exposures.to_numpy(dtype='int64')
+    order = np.argsort(-values, kind='stable')
+    values = values[order]
+    ids = exposures.index.to_numpy()[order]
+
+    total = values.sum()
+    shares = values / total if total > 0 else np.zeros(len(values))
+    cumulative = np.cumsum(shares)
+    hhi = float(np.square(shares).sum())
+
+    top = []
+    for i in range(min(top_n, len(values))):
+        entry = {"id": ids[i], "balance": round(float(to_euros(values[i])), 2), "share_pct": round(float(shares[i]) * 100, 2)}
+        if labels is not None and pd.notna(labels.get(ids[i])):
+            entry["label"] = labels.get(ids[i])
+        top.append(entry)
+
+    return {
+        "n_counterparties": int(len(balances)),
+        "n_with_exposure": int(len(values)),
+        "total_exposure": round(float(to_euros(total)), 2),
+        "top": top,
+        "curve_pct": {
+            f"top_{n}": round(float(cumulative[min(n, len(values)) - 1]) * 100, 2) if len(values) else 0.0
+            for n in CURVE_POINTS
+        },
+        # Smallest number of counterparties holding 50% / 80% of the exposure
+        "n_for_50_pct": int(np.searchsorted(cumulative, 0.5 - 1e-12) + 1) if len(values) else 0,
+        "n_for_80_pct": int(np.searchsorted(cumulative, 0.8 - 1e-12) + 1) if len(values) else 0,
+        "herfindahl_index": round(hhi, 4),
+        "effective_counterparties": round(1 / hhi, 1) if hhi > 0 else 0.0,
+    }
+
+
+def counterparty_profiles(agg: LedgerAggregates, index: Optional[AccountIndex] = None, top_n: int = 10) -> Dict:
+    """Client and supplier profiles on both the CompteNum and CompAuxNum sub-ledgers."""
+    index = index or AccountIndex(agg.account_balances())
+    profiles = {}
+    for name, ledger in COUNTERPARTY_LEDGERS.items():
+        accounts = index.select(ledger["accounts"])
+        aux = agg.auxiliary_balances(ledger["collective"])
+        profiles[name] = {
+            "by_account": concentration_profile(
+                ledger["sign"] * (accounts['Debit'] - accounts['Credit']), top_n=top_n
+            ),
+            "by_auxiliary": concentration_profile(
+                ledger["sign"] * (aux['Debit'] - aux['Credit']), labels=aux['CompAuxLib'], top_n=top_n
+            ),
+        }
+    return profiles
@@ -0,0 +1,401 @@
+"""
+Consolidation of the FECs of a group with intercompany elimination.
+
+Each entity's ledger is reduced, in its own worker, to Debit/Credit sums per
+(account, month) on a common chart: account numbers cut or padded to the six
+digits of the PCG, so that 6061, 606100 and 60610000 roll up together and
+the PCG_ACCOUNTS specs apply to every entity alike. The lines to eliminate
+are summed the same way, per counterparty entity:
+
+- third-party lines (40x, 41x, 45x) whose CompAuxNum, CompAuxLib or account
+  number names another entity of the group (its SIREN, or an alias);
+- the class 6 and 7 lines of the entries whose third-party lines all name
+  one other entity (intercompany sales and purchases; the VAT stays, it is
+  owed to the State);
+- every group current account line (451), counterparty known or not.
+
+An entry mixing intercompany and outside third-party lines (a centralised
+sales or purchase journal posting several invoices under one EcritureNum)
+keeps its P&L lines: it is listed as mixed for manual review instead.
+
+Only these reductions cross process boundaries, so memory stays bounded by
+the largest single FEC whatever the size of the group. The consolidated
+figures are the sum of the entity sums minus the eliminations; each pair of
+entities is reconciled (seller's sales vs buyer's purchases, receivable vs
+payable) and the gaps are reported.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import re
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import PCG_ACCOUNTS, AccountIndex, account_range
+from dexter.fec.aggregates import UNDATED_MONTH, month_keys
+from dexter.fec.normalization import reported_ebitda
+from dexter.fec.reader import to_euros
+
+# FEC columns the consolidation reads
+CONSOLIDATION_COLUMNS = [
+    "JournalCode", "EcritureNum", "EcritureDate", "CompteNum", "CompAuxNum", "CompAuxLib", "Debit", "Credit",
+]
+
+# Digits of the common chart of accounts
+ROLLUP_DIGITS = 6
+
+# Third-party accounts whose counterparty can be another group entity
+THIRD_PARTY_ACCOUNTS = ["40", "41", "45"]
+
+# Group current accounts: eliminated even when the counterparty is not identified
+GROUP_ACCOUNTS = "451"
+
+# Counterparty of the 451 lines that name no group entity
+UNIDENTIFIED = "(non identifié)"
+
+# Intercompany gaps below this amount (EUR) count as reconciled
+RECONCILIATION_TOLERANCE = 1.0
+
+# Mixed entries listed in the report, largest P&L amounts first
+MIXED_ENTRIES_LISTED = 50
+
+# PCG_ACCOUNTS categories reported in the consolidated P&L and balance sheet
+PNL_CATEGORIES = ["revenue", "operating_expenses", "financial", "exceptional"]
+BALANCE_CATEGORIES = ["fixed_assets", "equity_debt", "clients", "suppliers"]
+
+# SIREN (9 digits) or SIRET (SIREN + 5 digits) in a code or a label, spaces removed
+_SIREN = re.compile(r"(?<!\d)(\d{9})(?:\d{5})?(?!\d)")
+
+
+def find_siren(value: str) -> Optional[str]:
+    """SIREN written in a code or a label (alone or as the head of a SIRET), if any."""
+    found = _SIREN.search(str(value).replace(" ", ""))
+    return found.group(1) if found else None
+
+
+def normalize_identifier(value: str) -> str:
+    """Upper case alphanumerics only: 'Filiale B SAS' and 'FILIALE-B-SAS' match."""
+    return re.sub(r"[^0-9A-Z]", "", str(value).upper())
+
+
+def rollup_account(accounts: np.ndarray) -> np.ndarray:
+    """Account numbers cut or right-padded with zeros to ROLLUP_DIGITS."""
+    return np.array([a[:ROLLUP_DIGITS].ljust(ROLLUP_DIGITS, "0") for a in accounts.astype(str)], dtype=object)
+
+
+def _match_entities(values: pd.Index, identifiers: Dict[str, str]) -> np.ndarray:
+    """
+    Group entity of each distinct code or label (object array, None when it
+    names none): an identifier exactly, else a SIREN found in it.
+    """
+    matched = np.full(len(values), None, dtype=object)
+    for i, value in enumerate(values.astype(str)):
+        key = normalize_identifier(value)
+        if key in identifiers:
+            matched[i] = identifiers[key]
+            continue
+        siren = find_siren(value)
+        if siren in identifiers:
+            matched[i] = identifiers[siren]
+    return matched
+
+
+def _line_entities(column: pd.Series, identifiers: Dict[str, str]) -> np.ndarray:
+    """Group entity named by each line of a code/label column, matched once per distinct value."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype("category")
+    matched = np.append(_match_entities(column.cat.categories, identifiers), None)  # last slot: code -1
+    return matched[column.cat.codes.to_numpy()]
+
+
+def _in_specs(categories: np.ndarray, specs: List[str]) -> np.ndarray:
+    inside = np.zeros(len(categories), dtype=bool)
+    for spec in specs:
+        low, high = account_range(spec)
+        inside |= (categories >= low) & (categories < high)
+    return inside
+
+
+def _sums(keys: List[np.ndarray], names: List[str], debit: np.ndarray, credit: np.ndarray) -> pd.DataFrame:
+    frame = pd.DataFrame({**dict(zip(names, keys)), "Debit": debit, "Credit": credit})
+    return frame.groupby(names, sort=False).sum()
+
+
+def entity_flows(
+    df: pd.DataFrame, entity: str, identifiers: Dict[str, str]
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Debit/Credit sums (cents) of one entity's normalized ledger per (rolled-up
+    account, month), the intercompany part of them per (account, month,
+    counterparty entity) and the mixed entries left to review (one row per
+    entry, net debits in cents). `identifiers` maps normalized SIRENs and
+    aliases to group entities; the entity's own identifiers are ignored.
+    """
+    accounts = df["CompteNum"]
+    if not isinstance(accounts.dtype, pd.CategoricalDtype):
+        accounts = accounts.astype("category")
+    # Classify the distinct account numbers once, then map every line by its code
+    categories = np.asarray(accounts.cat.categories.astype(str), dtype=object)
+    codes = accounts.cat.codes.to_numpy()
+    booked = codes >= 0
+    rolled = np.append(rollup_account(categories), None)[codes]
+    third_party = np.append(_in_specs(categories, THIRD_PARTY_ACCOUNTS), False)[codes]
+    group_account = np.append(_in_specs(categories, [GROUP_ACCOUNTS]), False)[codes]
+    profit_and_loss = np.append(_in_specs(categories, ["6", "7"]), False)[codes]
+    months = month_keys(df["EcritureDate"]).to_numpy()
+    debit, credit = df["Debit"].to_numpy(), df["Credit"].to_numpy()
+
+    balances = _sums([rolled[booked], months[booked]], ["CompteNum", "month"], debit[booked], credit[booked])
+
+    identifiers = {key: name for key, name in identifiers.items() if name != entity}
+    counterparty = np.full(len(df), None, dtype=object)
+    for column in ["CompteNum", "CompAuxLib", "CompAuxNum"]:  # last one found wins
+        if column in df.columns:
+            found = _line_entities(df[column], identifiers)
+            counterparty = np.where(pd.notna(found), found, counterparty)
+    counterparty = np.where(third_party | group_account, counterparty, None)
+    intercompany = pd.notna(counterparty)
+
+    # Sales and purchases: the P&L lines of the entries whose third-party
+    # lines all name the same group entity
+    journals = pd.factorize(df["JournalCode"])[0]
+    numbers, distinct = pd.factorize(df["EcritureNum"])
+    entry = (journals + 1) * (len(distinct) + 1) + numbers
+    tiers = third_party | group_account
+    parties = pd.Series(counterparty[tiers], index=entry[tiers]).groupby(level=0).agg(
+        ["count", "size", "nunique", "first"]
+    )
+    parties = parties[parties["count"] > 0]
+    pure = (parties["count"] == parties["size"]) & (parties["nunique"] == 1)
+    entry_party = parties.loc[pure, "first"]
+    flows = profit_and_loss & np.isin(entry, entry_party.index.to_numpy())
+    counterparty[flows] = entry_party.reindex(entry[flows]).to_numpy(dtype=object)
+    mixed = _mixed_entries(df, entry, parties.index[~pure].to_numpy(), counterparty, profit_and_loss, months)
+
+    counterparty[group_account & ~intercompany] = UNIDENTIFIED
+    eliminated = intercompany | flows | group_account
+    eliminations = _sums(
+        [rolled[eliminated], months[eliminated], counterparty[eliminated]],
+        ["CompteNum", "month", "counterparty"],
+        debit[eliminated],
+        credit[eliminated],
+    )
+    return balances, eliminations, mixed
+
+
+def _mixed_entries(
+    df: pd.DataFrame,
+    entry: np.ndarray,
+    mixed: np.ndarray,
+    counterparty: np.ndarray,
+    profit_and_loss: np.ndarray,
+    months: np.ndarray,
+) -> pd.DataFrame:
+    """
+    One row per mixed entry: journal, number, month, group entities named,
+    net debit of the intercompany lines (eliminated) and of the P&L lines
+    (kept in the consolidation).
+    """
+    lines = np.isin(entry, mixed)
+    net = df["Debit"].to_numpy()[lines] - df["Credit"].to_numpy()[lines]
+    party = counterparty[lines]
+    frame = pd.DataFrame({
+        "entry": entry[lines],
+        "JournalCode": df["JournalCode"].to_numpy()[lines].astype(str),
+        "EcritureNum": df["EcritureNum"].to_numpy()[lines].astype(str),
+        "month": months[lines],
+        "counterparties": party,
+        "intercompany": np.where(pd.notna(party), net, 0),
+        "pnl": np.where(profit_and_loss[lines], net, 0),
+    })
+    return frame.groupby("entry", sort=False).agg(
+        JournalCode=("JournalCode", "first"),
+        EcritureNum=("EcritureNum", "first"),
+        month=("month", "min"),
+        counterparties=("counterparties", lambda values: ", ".join(sorted(set(values.dropna())))),
+        intercompany_net_debit=("intercompany", "sum"),
+        pnl_net_debit=("pnl", "sum"),
+    ).reset_index(drop=True)
+
+
+def fold(current: Optional[pd.DataFrame], batch: pd.DataFrame) -> pd.DataFrame:
+    """Adds the Debit/Credit sums of `batch` into `current` (same index levels)."""
+    if current is None or current.empty:
+        return batch
+    if batch.empty:
+        return current
+    return pd.concat([current, batch]).groupby(level=list(range(current.index.nlevels)), sort=False).sum()
+
+
+def _net_debit(frame: pd.DataFrame) -> pd.Series:
+    return frame["Debit"] - frame["Credit"]
+
+
+def _pcg_section(index: AccountIndex, categories: List[str]) -> Dict:
+    return index.pcg_balances({category: PCG_ACCOUNTS[category] for category in categories})
+
+
+def _month_label(month: int) -> str:
+    return f"{month // 100}-{month % 100:02d}"
+
+
+def intercompany_pairs(eliminations: Dict[str, pd.DataFrame]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Reconciliation of every pair of entities: sales vs purchases and
+    receivable vs payable per (seller, buyer), group current accounts per
+    pair (the two 451 balances should cancel out).
+    """
+    def by_spec(entity: str, specs: List[str]) -> pd.Series:
+        frame = eliminations.get(entity)
+        if frame is None or frame.empty:
+            return pd.Series(dtype=np.int64)
+        accounts = frame.index.get_level_values("CompteNum").to_numpy(dtype=object).astype(str)
+        rows = frame[_in_specs(accounts, specs)]
+        return _net_debit(rows).groupby(level="counterparty").sum()
+
+    sales = {e: -by_spec(e, ["7"]) for e in eliminations}
+    purchases = {e: by_spec(e, ["6"]) for e in eliminations}
+    receivables = {e: by_spec(e, ["41"]) for e in eliminations}
+    payables = {e: -by_spec(e, ["40"]) for e in eliminations}
+    current_accounts = {e: by_spec(e, [GROUP_ACCOUNTS]) for e in eliminations}
+
+    def amount(table: Dict[str, pd.Series], entity: str, counterparty: str) -> float:
+        return round(to_euros(int(table[entity].get(counterparty, 0))), 2)
+
+    pairs, group = [], []
+    entities = sorted(eliminations)
+    for seller in entities:
+        for buyer in entities:
+            if seller == buyer:
+                continue
+            row = {
+                "seller": seller,
+                "buyer": buyer,
+                "sales": amount(sales, seller, buyer),
+                "purchases": amount(purchases, buyer, seller),
+                "receivable": amount(receivables, seller, buyer),
+                "payable": amount(payables, buyer, seller),
+            }
+            if not any(row[k] for k in ("sales", "purchases", "receivable", "payable")):
+                continue
+            row["sales_gap"] = round(row["sales"] - row["purchases"], 2)
+            row["balance_gap"] = round(row["receivable"] - row["payable"], 2)
+            row["reconciled"] = max(abs(row["sales_gap"]), abs(row["balance_gap"])) <= RECONCILIATION_TOLERANCE
+            pairs.append(row)
+        for other in entities:
+            if other <= seller:
+                continue
+            first, second = amount(current_accounts, seller, other), amount(current_accounts, other, seller)
+            if first or second:
+                gap = round(first + second, 2)
+                group.append({
+                    "entities": [seller, other],
+                    "net_debit": {seller: first, other: second},
+                    "gap": gap,
+                    "reconciled": abs(gap) <= RECONCILIATION_TOLERANCE,
+                })
+    return pairs, group
+
+
+def consolidated_report(
+    balances: pd.DataFrame,
+    eliminations: pd.DataFrame,
+    entity_balances: Dict[str, pd.DataFrame],
+    entity_eliminations: Dict[str, pd.DataFrame],
+    entity_mixed: Optional[Dict[str, pd.DataFrame]] = None,
+) -> Dict:
+    """
+    Consolidated P&L, balance sheet and monthly series once the eliminations
+    are taken out of the summed balances, with each entity's contribution,
+    the intercompany reconciliation and the mixed entries to review.
+    """
+    eliminated = eliminations.groupby(level=["CompteNum", "month"], sort=False).sum()
+    net = balances.sub(eliminated.reindex(balances.index, fill_value=0), fill_value=0).astype(np.int64)
+    index = AccountIndex(net.groupby(level="CompteNum").sum())
+    ebitda, bridge = reported_ebitda(index)
+    revenue = int(index.net_credit("70"))
+    result = int(index.net_credit("7")) - int(index.net_debit("6"))
+    cash = int(index.net_debit("50-53")) - int(index.net_credit("519"))
+    debt = int(index.net_credit("16"))
+
+    monthly = []
+    months = net.index.get_level_values("month")
+    for month in sorted(m for m in months.unique() if m != UNDATED_MONTH):
+        month_index = AccountIndex(net[months == month].groupby(level="CompteNum").sum())
+        month_revenue = int(month_index.net_credit("70"))
+        monthly.append({
+            "month": _month_label(month),
+            "revenue": round(to_euros(month_revenue), 2),
+            "ebitda": round(to_euros(reported_ebitda(month_index)[0]), 2),
+        })
+
+    entities = []
+    for entity in sorted(entity_balances):
+        own = AccountIndex(entity_balances[entity].groupby(level="CompteNum").sum())
+        removed = entity_eliminations[entity]
+        removed_index = AccountIndex(removed.groupby(level="CompteNum").sum()) if not removed.empty else None
+        entities.append({
+            "entity": entity,
+            "revenue": round(to_euros(int(own.net_credit("70"))), 2),
+            "ebitda": round(to_euros(reported_ebitda(own)[0]), 2),
+            "intercompany_revenue": round(to_euros(int(removed_index.net_credit("7"))), 2) if removed_index else 0.0,
+            "intercompany_expenses": round(to_euros(int(removed_index.net_debit("6"))), 2) if removed_index else 0.0,
+            "unidentified_group_accounts": round(to_euros(int(_net_debit(
+                removed[removed.index.get_level_values("counterparty") == UNIDENTIFIED]
+            ).sum())), 2),
+        })
+
+    pairs, group = intercompany_pairs(entity_eliminations)
+    mixed = [frame.assign(entity=entity) for entity, frame in sorted((entity_mixed or {}).items()) if not frame.empty]
+    mixed = pd.concat(mixed, ignore_index=True) if mixed else None
+    totals = AccountIndex(eliminated.groupby(level="CompteNum").sum()) if not eliminated.empty else None
+    return {
+        "pnl": {
+            "revenue": round(to_euros(revenue), 2),
+            "ebitda": round(to_euros(ebitda), 2),
+            "ebitda_margin_pct": round(ebitda / revenue * 100, 2) if revenue > 0 else None,
+            "net_result": round(to_euros(result), 2),
+            "ebitda_bridge": bridge,
+            "pcg": _pcg_section(index, PNL_CATEGORIES),
+        },
+        "balance_sheet": {
+            "cash": round(to_euros(cash), 2),
+            "financial_debt": round(to_euros(debt), 2),
+            "net_debt": round(to_euros(debt - cash), 2),
+            "receivables_411": round(to_euros(int(index.net_debit("411"))), 2),
+            "payables_401": round(to_euros(int(index.net_credit("401"))), 2),
+            "pcg": _pcg_section(index, BALANCE_CATEGORIES),
+        },
+        "monthly": monthly,
+        "entities": entities,
+        "intercompany": {
+            "eliminated_revenue": round(to_euros(int(totals.net_credit("7"))), 2) if totals else 0.0,
+            "eliminated_expenses": round(to_euros(int(totals.net_debit("6"))), 2) if totals else 0.0,
+            "pairs": pairs,
+            "group_current_accounts": group,
+            "unreconciled": [p for p in pairs + group if not p["reconciled"]],
+            "mixed_entries": _mixed_section(mixed),
+        },
+    }
+
+
+def _mixed_section(mixed: Optional[pd.DataFrame]) -> Dict:
+    """Count and P&L total of the mixed entries, the largest ones listed."""
+    if mixed is None:
+        return {"count": 0, "pnl_net_debit": 0.0, "entries": []}
+    listed = mixed.loc[mixed["pnl_net_debit"].abs().sort_values(ascending=False).index[:MIXED_ENTRIES_LISTED]]
+    return {
+        "count": len(mixed),
+        "pnl_net_debit": round(to_euros(int(mixed["pnl_net_debit"].sum())), 2),
+        "entries": [
+            {
+                "entity": row.entity,
+                "journal": row.JournalCode,
+                "entry": row.EcritureNum,
+                "month": _month_label(row.month) if row.month != UNDATED_MONTH else None,
+                "counterparties": row.counterparties,
+                "intercompany_net_debit": round(to_euros(int(row.intercompany_net_debit)), 2),
+                "pnl_net_debit": round(to_euros(int(row.pnl_net_debit)), 2),
+            }
+            for row in listed.itertuples()
+        ],
+    }
@@ -0,0 +1,403 @@
+"""
+Forensic scan of a FEC: ledger anomalies as ranked red flags.
+
+Every check is a columnar computation over the whole ledger (bincount,
+duplicated, sorted neighbours, isin), all run on one loaded frame:
+
+- Benford: first-digit distribution of the amounts of each journal vs
+  Benford's law, as the mean absolute deviation (Nigrini thresholds);
+- duplicates: entries whose lines (journal, date, account, third party,
+  amount, label) all repeat another entry, and near duplicates, i.e. the
+  same third-party amount booked twice within a few days;
+- non-working days: entries validated (ValidDate, else EcritureDate) on a
+  weekend or a French public holiday;
+- round amounts: charge/revenue accounts with many amounts in whole
+  hundreds of euros (estimates, manual adjustments);
+- posting after close: entries dated before the closing day but validated
+  after it;
+- manual journal spikes: months where the OD journals move far more than
+  usual (robust z-score).
+
+Findings become RedFlag records ranked by severity then amount at stake.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import account_range
+from dexter.fec.reader import MISSING_DAY, to_euros, to_timestamp
+from dexter.schemas import RedFlag
+
+# FEC columns the scan reads
+FORENSIC_COLUMNS = [
+    "JournalCode", "EcritureNum", "EcritureDate", "CompteNum", "CompAuxNum", "EcritureLib", "Debit", "Credit", "ValidDate",
+]
+
+# Benford's first-digit probabilities, digits 1 to 9
+BENFORD_FREQUENCIES = np.log10(1 + 1 / np.arange(1, 10))
+# Amounts below 10 EUR and journals with fewer lines are not tested
+BENFORD_MIN_CENTS = 1_000
+BENFORD_MIN_LINES = 300
+# Mean absolute deviation above which the first digits do not conform (Nigrini)
+BENFORD_NONCONFORMITY_MAD = 0.015
+BENFORD_HIGH_MAD = 0.025
+
+# Near duplicates: third-party lines of the same amount within this many days
+NEAR_DUPLICATE_ACCOUNTS = ("401", "411")
+NEAR_DUPLICATE_DAYS = 7
+NEAR_DUPLICATE_MIN_CENTS = 10_000
+
+# Share of the entries validated on weekends/holidays that is worth a flag
+NON_WORKING_DAY_SHARE = 0.05
+
+# Round amounts: whole hundreds of euros from 1,000 EUR on charge/revenue accounts
+ROUND_AMOUNT_ACCOUNTS = "6-7"
+ROUND_AMOUNT_MIN_CENTS = 100_000
+ROUND_AMOUNT_UNIT_CENTS = 10_000
+ROUND_AMOUNT_MIN_LINES = 20
+ROUND_AMOUNT_SHARE = 0.30
+
+# Manual journals (opérations diverses) and the robust z-score of a spike month
+MANUAL_JOURNAL_PREFIXES = ("OD",)
+MANUAL_SPIKE_Z = 3.5
+MANUAL_SPIKE_MIN_MONTHS = 6
+
+SEVERITY_RANK = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3}
+
+# Label of the lines without a JournalCode
+NO_JOURNAL = "sans journal"
+
+
+def easter_days(years: np.ndarray) -> np.ndarray:
+    """Day ordinals of Easter Sunday (anonymous Gregorian algorithm), vectorized over years."""
+    a, b, c = years % 19, years // 100, years % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    dates = (years - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (month - 1)
+    return (dates.astype("datetime64[D]") + (day - 1)).astype(np.int64)
+
+
+def french_holidays(years: np.ndarray) -> np.ndarray:
+    """Day ordinals of the French public holidays of the given years."""
+    fixed = ["01-01", "05-01", "05-08", "07-14", "08-15", "11-01", "11-11", "12-25"]
+    days = [
+        np.array([np.datetime64(f"{year}-{md}", "D").astype(np.int64) for year in years for md in fixed], dtype=np.int64)
+    ]
+    easter = easter_days(np.asarray(years, dtype=np.int64))
+    # Easter Monday, Ascension, Whit Monday
+    days.extend([easter + 1, easter + 39, easter + 50])
+    return np.concatenate(days)
+
+
+def _first_digits(cents: np.ndarray) -> np.ndarray:
+    """Leading digit (1-9) of positive integer amounts."""
+    power = (10 ** np.floor(np.log10(cents.astype(np.float64)))).astype(np.int64)
+    # log10 rounding near powers of ten can be off by one order of magnitude
+    power = np.where(power > cents, power // 10, power)
+    power = np.where(cents >= power * 10, power * 10, power)
+    return cents // power
+
+
+def _codes(values: pd.Series):
+    """Integer codes and distinct values of a column (categorical or not)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy().astype(np.int64), values.cat.categories.astype(str)
+    codes, uniques = pd.factorize(values)
+    return codes.astype(np.int64), pd.Index(uniques).astype(str)
+
+
+def _in_accounts(categories: pd.Index, codes: np.ndarray, specs) -> np.ndarray:
+    """Lines whose account matches any of the prefix/range specs."""
+    matching = np.zeros(len(categories) + 1, dtype=bool)  # last slot: code -1 (no account)
+    for spec in specs:
+        low, high = account_range(spec)
+        matching[:-1] |= (categories >= low) & (categories < high)
+    return matching[codes]
+
+
+def _finding(check: str, severity: str, amount: int, description: str, **details) -> Dict:
+    return {"check": check, "severity": severity, "amount": int(amount), "description": description, **details}
+
+
+def benford_findings(journals: np.ndarray, journal_names: pd.Index, amounts: np.ndarray) -> Tuple[List[Dict], List[Dict]]:
+    """First-digit mean absolute deviation of every journal, and the nonconforming journals."""
+    # Lines without a journal (code -1) belong to no journal's distribution
+    rows = (amounts >= BENFORD_MIN_CENTS) & (journals >= 0)
+    n_journals = len(journal_names)
+    digits = _first_digits(amounts[rows])
+    counts = np.bincount(journals[rows] * 9 + digits - 1, minlength=n_journals * 9).reshape(n_journals, 9)
+    totals = counts.sum(axis=1)
+    observed = counts / np.maximum(totals, 1)[:, None]
+    mad = np.abs(observed - BENFORD_FREQUENCIES).mean(axis=1)
+
+    table, findings = [], []
+    for j in np.flatnonzero(totals >= BENFORD_MIN_LINES):
+        excess = int(np.argmax(observed[j] - BENFORD_FREQUENCIES)) + 1
+        table.append({"journal": journal_names[j], "lines": int(totals[j]), "mad": round(float(mad[j]), 4)})
+        if mad[j] > BENFORD_NONCONFORMITY_MAD:
+            findings.append(_finding(
+                "benford",
+                "High" if mad[j] > BENFORD_HIGH_MAD else "Medium",
+                amounts[rows][journals[rows] == j].sum(),
+                f"Journal {journal_names[j]} : premiers chiffres non conformes à la loi de Benford "
+                f"(MAD {mad[j]:.3f} sur {totals[j]} lignes, excès de {excess})",
+                journal=journal_names[j], mad=round(float(mad[j]), 4),
+            ))
+    return table, findings
+
+
+def duplicate_findings(df: pd.DataFrame, entries: np.ndarray) -> Tuple[Dict, List[Dict]]:
+    """
+    Entries whose lines all repeat another entry: same journal, date,
+    accounts, third parties, amounts and labels.
+    """
+    key = ["JournalCode", "EcritureDate", "CompteNum", "CompAuxNum", "Debit", "Credit", "EcritureLib"]
+    line_hash = pd.util.hash_pandas_object(df[[c for c in key if c in df.columns]], index=False).to_numpy()
+    # Order-independent signature of an entry: wrapping sum of its line hashes, plus its line count
+    order = np.argsort(entries, kind="stable")
+    starts = np.flatnonzero(np.r_[True, entries[order][1:] != entries[order][:-1]])
+    signature = pd.DataFrame({
+        "hash": np.add.reduceat(line_hash[order], starts),
+        "lines": np.diff(np.r_[starts, len(order)]),
+        "debit": np.add.reduceat(df["Debit"].to_numpy()[order], starts),
+    })
+    repeated = signature.duplicated(subset=["hash", "lines"], keep="first") & (signature["debit"] > 0)
+    n_entries = int(repeated.sum())
+    at_stake = int(signature["debit"][repeated].sum())
+    summary = {"entries": n_entries, "amount": round(to_euros(at_stake), 2)}
+    if n_entries == 0:
+        return summary, []
+    return summary, [_finding(
+        "duplicates",
+        "High" if n_entries >= 10 else "Medium",
+        at_stake,
+        f"{n_entries} écritures en double (mêmes journal, date, comptes, tiers, montants et libellés) "
+        f"pour {to_euros(at_stake):,.2f} €",
+        entries=n_entries,
+    )]
+
+
+def near_duplicate_findings(
+    df: pd.DataFrame, accounts: np.ndarray, account_names: pd.Index, entries: np.ndarray, days: np.ndarray
+) -> Tuple[Dict, List[Dict]]:
+    """Third-party lines of the same amount and side booked within NEAR_DUPLICATE_DAYS in different entries."""
+    signed = df["Debit"].to_numpy() - df["Credit"].to_numpy()
+    rows = (
+        _in_accounts(account_names, accounts, NEAR_DUPLICATE_ACCOUNTS)
+        & (np.abs(signed) >= NEAR_DUPLICATE_MIN_CENTS) & (days != MISSING_DAY)
+    )
+    party = accounts[rows]
+    if "CompAuxNum" in df.columns:
+        aux, _ = _codes(df["CompAuxNum"][rows])
+        party = np.where(aux >= 0, aux + len(account_names), party)
+    signed, day, entry = signed[rows], days[rows], entries[rows]
+
+    order = np.lexsort((day, signed, party))
+    party, signed, day, entry = party[order], signed[order], day[order], entry[order]
+    pairs = (
+        (party[1:] == party[:-1]) & (signed[1:] == signed[:-1])
+        & (day[1:] - day[:-1] <= NEAR_DUPLICATE_DAYS) & (entry[1:] != entry[:-1])
+    )
+    n_pairs = int(pairs.sum())
+    at_stake = int(np.abs(signed[1:][pairs]).sum())
+    summary = {"pairs": n_pairs, "amount": round(to_euros(at_stake), 2)}
+    if n_pairs == 0:
+        return summary, []
+    return summary, [_finding(
+        "near_duplicates",
+        "Medium" if n_pairs >= 10 else "Low",
+        at_stake,
+        f"{n_pairs} montants identiques passés deux fois sur le même tiers (401/411) à moins de "
+        f"{NEAR_DUPLICATE_DAYS} jours d'intervalle pour {to_euros(at_stake):,.2f} € (doublons de factures ?)",
+        pairs=n_pairs,
+    )]
+
+
+def non_working_day_findings(
+    journals: np.ndarray, journal_names: pd.Index, entries: np.ndarray, days: np.ndarray, amounts: np.ndarray
+) -> Tuple[Dict, List[Dict]]:
+    """Entries validated on a weekend or a public holiday."""
+    dated = days != MISSING_DAY
+    per_entry = pd.DataFrame({"entry": entries[dated], "journal": journals[dated], "day": days[dated], "amount": amounts[dated]})
+    per_entry = per_entry.groupby("entry").agg(journal=("journal", "first"), day=("day", "first"), amount=("amount", "sum"))
+    if per_entry.empty:
+        return {"entries": 0}, []
+    day = per_entry["day"].to_numpy()
+    years = np.unique(day.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970)
+    weekday = (day + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    off = (weekday >= 5) | np.isin(day, french_holidays(years))
+
+    n_off, share = int(off.sum()), float(off.mean())
+    # Debit + Credit of an entry: twice the amount moved
+    at_stake = int(per_entry["amount"].to_numpy()[off].sum()) // 2
+    by_journal = pd.Series(off).groupby(per_entry["journal"].to_numpy()).sum()
+    by_journal = {
+        journal_names[j] if j >= 0 else NO_JOURNAL: int(n)
+        for j, n in by_journal[by_journal > 0].sort_values(ascending=False).items()
+    }
+    summary = {"entries": n_off, "share_pct": round(share * 100, 1), "by_journal": by_journal}
+    if share <= NON_WORKING_DAY_SHARE:
+        return summary, []
+    return summary, [_finding(
+        "non_working_days",
+        "Medium" if share > 3 * NON_WORKING_DAY_SHARE else "Low",
+        at_stake,
+        f"{n_off} écritures ({share * 100:.1f} %) validées un week-end ou un jour férié "
+        f"pour {to_euros(at_stake):,.2f} € (journaux : {', '.join(list(by_journal)[:3])})",
+    )]
+
+
+def round_amount_findings(accounts: np.ndarray, account_names: pd.Index, amounts: np.ndarray) -> Tuple[List[Dict], List[Dict]]:
+    """Charge/revenue accounts whose large amounts cluster on whole hundreds of euros."""
+    rows = _in_accounts(account_names, accounts, [ROUND_AMOUNT_ACCOUNTS]) & (amounts >= ROUND_AMOUNT_MIN_CENTS)
+    n_accounts = len(account_names)
+    large = np.bincount(accounts[rows], minlength=n_accounts)
+    round_rows = rows & (amounts % ROUND_AMOUNT_UNIT_CENTS == 0)
+    rounded = np.bincount(accounts[round_rows], minlength=n_accounts)
+    rounded_amount = np.bincount(accounts[round_rows], weights=amounts[round_rows], minlength=n_accounts)
+
+    share = rounded / np.maximum(large, 1)
+    flagged = np.flatnonzero((large >= ROUND_AMOUNT_MIN_LINES) & (share >= ROUND_AMOUNT_SHARE))
+    flagged = flagged[np.argsort(-rounded_amount[flagged], kind="stable")]
+    table = [
+        {"account": account_names[a], "round_lines": int(rounded[a]), "share_pct": round(float(share[a]) * 100, 1),
+         "amount": round(to_euros(float(rounded_amount[a])), 2)}
+        for a in flagged
+    ]
+    findings = [
+        _finding(
+            "round_amounts",
+            "Low",
+            rounded_amount[a],
+            f"Compte {account_names[a]} : {rounded[a]} montants ronds (centaines d'euros) sur {large[a]} lignes "
+            f"≥ 1 000 € ({share[a] * 100:.0f} %), {to_euros(float(rounded_amount[a])):,.2f} € (estimations ?)",
+            account=account_names[a],
+        )
+        for a in flagged
+    ]
+    return table, findings
+
+
+def post_close_findings(df: pd.DataFrame, entries: np.ndarray, days: np.ndarray, amounts: np.ndarray) -> Tuple[Dict, List[Dict]]:
+    """Entries dated before the closing day but validated after it."""
+    if "ValidDate" not in df.columns:
+        return {"available": False}, []
+    valid = df["ValidDate"].to_numpy()
+    dated = days != MISSING_DAY
+    if not dated.any():
+        return {"available": False}, []
+    close = int(days[dated].max())
+    # Closing entries are dated on the closing day itself and validated later
+    late = dated & (valid != MISSING_DAY) & (valid > close) & (days < close)
+    n_entries = int(pd.unique(entries[late]).size)
+    at_stake = int(amounts[late].sum()) // 2
+    lag = int((valid[late] - days[late]).max()) if late.any() else 0
+    summary = {"available": True, "closing_date": to_timestamp(close).strftime("%Y-%m-%d"), "entries": n_entries,
+               "amount": round(to_euros(at_stake), 2), "max_lag_days": lag}
+    if n_entries == 0:
+        return summary, []
+    total = int(amounts[dated].sum()) // 2
+    return summary, [_finding(
+        "post_close",
+        "Medium" if total and at_stake / total > 0.01 else "Low",
+        at_stake,
+        f"{n_entries} écritures datées avant la clôture du {summary['closing_date']} mais validées après "
+        f"pour {to_euros(at_stake):,.2f} € (jusqu'à {lag} jours d'écart)",
+        entries=n_entries,
+    )]
+
+
+def manual_spike_findings(
+    journals: np.ndarray, journal_names: pd.Index, days: np.ndarray, debits: np.ndarray
+) -> Tuple[Dict, List[Dict]]:
+    """Months where the manual (OD) journals move far above their median month."""
+    manual = np.array([name.upper().startswith(MANUAL_JOURNAL_PREFIXES) for name in journal_names] + [False])
+    rows = manual[journals] & (days != MISSING_DAY)
+    if not rows.any():
+        return {"journals": [], "months": 0}, []
+    months = days[rows].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    first = int(months.min())
+    monthly = np.bincount(months - first, weights=debits[rows])
+    summary = {"journals": [n for n, m in zip(journal_names, manual) if m], "months": len(monthly)}
+    if len(monthly) < MANUAL_SPIKE_MIN_MONTHS:
+        return summary, []
+
+    median = np.median(monthly)
+    spread = 1.4826 * np.median(np.abs(monthly - median))
+    z = (monthly - median) / spread if spread > 0 else np.where(monthly > median, np.inf, 0.0)
+    spikes = np.flatnonzero((z > MANUAL_SPIKE_Z) & (monthly > 2 * median))
+    summary["median_month"] = round(to_euros(float(median)), 2)
+    findings = []
+    for m in spikes:
+        month = np.datetime64(first + int(m), "M")
+        findings.append(_finding(
+            "manual_spike",
+            "Medium",
+            monthly[m],
+            f"Pic d'écritures manuelles (OD) en {month} : {to_euros(float(monthly[m])):,.2f} € "
+            f"contre {to_euros(float(median)):,.2f} € un mois médian",
+            month=str(month),
+        ))
+    return summary, findings
+
+
+def scan_ledger(df: pd.DataFrame, top_n: Optional[int] = None) -> Dict:
+    """
+    Runs every check over a normalized ledger. Returns the ranked RedFlag
+    records (most severe, then largest amount first) and the per-check
+    results.
+    """
+    journals, journal_names = _codes(df["JournalCode"])
+    accounts, account_names = _codes(df["CompteNum"])
+    # One id per entry: EcritureNum is only unique within its journal
+    numbers, distinct = pd.factorize(df["EcritureNum"])
+    entries = pd.factorize((journals + 1) * (len(distinct) + 1) + numbers)[0]
+    days = df["EcritureDate"].to_numpy()
+    debits, credits = df["Debit"].to_numpy(), df["Credit"].to_numpy()
+    amounts = np.abs(debits - credits)
+    posted = df["ValidDate"].to_numpy() if "ValidDate" in df.columns else days
+    posted = np.where(posted != MISSING_DAY, posted, days)
+
+    benford, findings = benford_findings(journals, journal_names, amounts)
+    duplicates, found = duplicate_findings(df, entries)
+    findings += found
+    near_duplicates, found = near_duplicate_findings(df, accounts, account_names, entries, days)
+    findings += found
+    non_working, found = non_working_day_findings(journals, journal_names, entries, posted, debits + credits)
+    findings += found
+    round_amounts, found = round_amount_findings(accounts, account_names, amounts)
+    findings += found
+    post_close, found = post_close_findings(df, entries, days, debits + credits)
+    findings += found
+    manual, found = manual_spike_findings(journals, journal_names, days, debits)
+    findings += found
+
+    findings.sort(key=lambda f: (SEVERITY_RANK[f["severity"]], -f["amount"]))
+    if top_n:
+        findings = findings[:top_n]
+    red_flags = [
+        RedFlag(category="Anomalie comptable", severity=f["severity"], description=f["description"], is_deal_breaker=False)
+        for f in findings
+    ]
+    return {
+        "n_lines": len(df),
+        "n_entries": int(entries.max()) + 1 if len(entries) else 0,
+        "red_flags": [flag.model_dump() for flag in red_flags],
+        "findings": [{**f, "amount": round(to_euros(f["amount"]), 2)} for f in findings],
+        "checks": {
+            "benford": benford,
+            "duplicates": duplicates,
+            "near_duplicates": near_duplicates,
+            "non_working_days": non_working,
+            "round_amounts": round_amounts,
+            "post_close": post_close,
+            "manual_journals": manual,
+        },
+    }
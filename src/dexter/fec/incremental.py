@@ -0,0 +1,565 @@
+"""
+Incremental FEC ingestion for monthly closes.
+
+Portfolio companies send a new FEC extract every month that repeats every
+prior entry plus the new month. Instead of re-aggregating the whole ledger,
+the state of the previous run is kept on disk:
+
+- Debit/Credit balances partitioned by EcritureDate month, for accounts and
+  for the auxiliary sub-ledgers, and the daily movements of the
+  bank/debt/trade accounts;
+- per month, a fingerprint of its entries (row count plus the wrapping sum
+  of a hash of every line), so that a restated month is detected even when
+  its totals still balance;
+- the watermark: the latest EcritureDate or ValidDate seen.
+
+A new extract is first scanned by blocks of bytes, in constant memory: the
+dates and a hash of every line are read without tokenizing the other
+fields and folded into the per-month fingerprints. Only the lines of the
+month partitions whose fingerprint changed are then parsed, re-aggregated
+and replaced. State lives under DEXTER_FEC_STATE_DIR (default
+~/.cache/dexter/fec_state), one directory per ledger.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+import io
+import json
+import os
+import re
+import shutil
+import numpy as np
+import pandas as pd
+
+from dexter.fec.aggregates import AGGREGATE_COLUMNS, AUX_AGGREGATIONS, LedgerAggregates, UNDATED_MONTH, month_keys, plain_index
+from dexter.fec.cache import file_digest, load_frame, save_frame
+from dexter.fec.daily import daily_movements, empty_movements
+from dexter.fec.reader import (
+    FECFormat, day_range, load_fec, parse_fec_bytes, parse_fec_filename, sniff_fec_format, to_timestamp,
+)
+
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dexter", "fec_state")
+
+# Bump when the state layout or the fingerprint definition changes
+STATE_FORMAT_VERSION = 3
+
+# Bytes of whole lines scanned at once (bounds the per-block work arrays)
+SCAN_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def state_dir() -> str:
+    return os.getenv("DEXTER_FEC_STATE_DIR", DEFAULT_STATE_DIR)
+
+
+def default_ledger_id(fec_path: str) -> str:
+    """SIREN from an official FEC file name, so that successive extracts share state; else the file path."""
+    official = parse_fec_filename(fec_path)
+    return official["siren"] if official else os.path.abspath(fec_path)
+
+
+def _state_path(ledger_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", ledger_id).strip("._")[-100:]
+    return os.path.join(state_dir(), safe or "ledger")
+
+
+class IncrementalState:
+    """Month-partitioned aggregates and fingerprints of the last ingested extract."""
+
+    def __init__(self, ledger_id: str):
+        self.ledger_id = ledger_id
+        self.digest: Optional[str] = None
+        self.watermark: Optional[pd.Timestamp] = None
+        # month (YYYYMM) -> {"n_rows", "fingerprint", "date_min", "date_max"}
+        self.months: Dict[int, Dict] = {}
+        # Columns: CompteNum, month, Debit, Credit
+        self.balances = pd.DataFrame(columns=["CompteNum", "month", "Debit", "Credit"])
+        # Columns: month, CompteNum, CompAuxNum, Debit, Credit, CompAuxLib
+        self.aux_balances = pd.DataFrame(columns=["month", "CompteNum", "CompAuxNum", "Debit", "Credit", "CompAuxLib"])
+        # Columns: month, class, day, net
+        self.daily = pd.DataFrame(columns=["month", "class", "day", "net"])
+
+    # ---------- persistence ----------
+    @classmethod
+    def load(cls, ledger_id: str) -> Optional["IncrementalState"]:
+        path = _state_path(ledger_id)
+        try:
+            with open(os.path.join(path, "state.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != STATE_FORMAT_VERSION:
+                return None
+            state = cls(ledger_id)
+            state.balances = load_frame(os.path.join(path, "balances"))
+            state.aux_balances = load_frame(os.path.join(path, "aux_balances"))
+            state.daily = load_frame(os.path.join(path, "daily"))
+        except (OSError, ValueError, KeyError):
+            return None
+        state.digest = meta["digest"]
+        state.watermark = pd.Timestamp(meta["watermark"]) if meta["watermark"] else None
+        state.months = {
+            int(month): {
+                **info,
+                "date_min": pd.Timestamp(info["date_min"]) if info["date_min"] else None,
+                "date_max": pd.Timestamp(info["date_max"]) if info["date_max"] else None,
+            }
+            for month, info in meta["months"].items()
+        }
+        return state
+
+    def save(self, source: str):
+        """Writes the state next to the previous one, then swaps directories."""
+        path = _state_path(self.ledger_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        save_frame(os.path.join(tmp_path, "balances"), self.balances)
+        save_frame(os.path.join(tmp_path, "aux_balances"), self.aux_balances)
+        save_frame(os.path.join(tmp_path, "daily"), self.daily)
+        meta = {
+            "version": STATE_FORMAT_VERSION,
+            "ledger_id": self.ledger_id,
+            "source": os.path.abspath(source),
+            "digest": self.digest,
+            "watermark": self.watermark.isoformat() if self.watermark is not None else None,
+            "months": {
+                str(month): {
+                    **info,
+                    "date_min": info["date_min"].isoformat() if info["date_min"] is not None else None,
+                    "date_max": info["date_max"].isoformat() if info["date_max"] is not None else None,
+                }
+                for month, info in self.months.items()
+            },
+        }
+        with open(os.path.join(tmp_path, "state.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        old_path = f"{path}.{os.getpid()}.old"
+        if os.path.isdir(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    # ---------- views ----------
+    def aggregates(self) -> LedgerAggregates:
+        """LedgerAggregates equivalent to a full run over the ingested extract."""
+        agg = LedgerAggregates()
+        agg.total_entries = sum(info["n_rows"] for info in self.months.values())
+        dated = [info for info in self.months.values() if info["date_min"] is not None]
+        if dated:
+            agg.date_min = min(info["date_min"] for info in dated)
+            agg.date_max = max(info["date_max"] for info in dated)
+        if len(self.balances):
+            agg.balances = self.balances.set_index(["CompteNum", "month"])
+        if len(self.aux_balances):
+            agg.aux_balances = self.aux_balances.sort_values("month", kind="stable").groupby(
+                ["CompteNum", "CompAuxNum"], sort=False
+            ).agg(AUX_AGGREGATIONS)
+        if len(self.daily):
+            daily = self.daily.astype({"day": "int32"}).set_index(["class", "day"])["net"]
+            agg.daily = daily.groupby(level=[0, 1], sort=False).sum()
+        else:
+            agg.daily = empty_movements()
+        return agg
+
+
+class ExtractScan:
+    """
+    Per-month summary of a FEC extract, read by blocks without tokenizing
+    the fields: row count, date range and content fingerprint, lines
+    recorded after a watermark, and the latest EcritureDate or ValidDate
+    (YYYYMMDD integer, 0 if none). `blocks` keeps the byte span of each
+    block and the months it holds, for a second pass over the file.
+    """
+
+    def __init__(self, fec_path: str, fmt: FECFormat, header: bytes, months: pd.DataFrame, latest: int, blocks: List[Tuple[int, int, set]]):
+        self.fec_path = fec_path
+        self.fmt = fmt
+        self.header = header
+        self.months = months
+        self.latest = latest
+        self.blocks = blocks
+
+    def month_summary(self) -> pd.DataFrame:
+        """
+        Row count, date range and content fingerprint per month.
+
+        A fingerprint combines the row count with the sums (modulo 2**64) of
+        the line hashes and of their squares: reordering the extract or
+        changing its line endings leaves it unchanged, while editing, adding
+        or removing any line changes it.
+        """
+        return self.months[["n_rows", "fingerprint", "date_min", "date_max"]]
+
+    def text(self, months: List[int]) -> bytes:
+        """The header plus the lines of the given months, ready for parse_fec_bytes (only their blocks are read again)."""
+        wanted = set(months)
+        parts = [self.header]
+        with open(self.fec_path, "rb") as f:
+            for offset, size, block_months in self.blocks:
+                if not wanted & block_months:
+                    continue
+                f.seek(offset)
+                buf, starts, ends = _split_lines(f.read(size))
+                dates = _block_dates(buf, starts, ends, self.fmt, columns=("EcritureDate",))
+                selected = np.isin(dates["EcritureDate"] // 100, months)
+                if not selected.any():
+                    continue
+                # Byte positions of the selected lines, each with the byte after it turned into a LF
+                line_starts, line_ends = starts[selected], ends[selected]
+                sizes = line_ends - line_starts + 1
+                first = np.r_[0, np.cumsum(sizes)[:-1]]
+                positions = np.arange(int(sizes.sum())) + np.repeat(line_starts - first, sizes)
+                out = np.r_[buf, np.uint8(ord("\n"))]
+                out[line_ends] = ord("\n")
+                parts.append(out[positions].tobytes())
+        return b"".join(parts)
+
+
+def _to_timestamps(values: np.ndarray) -> pd.Series:
+    return pd.to_datetime(pd.Series(values).astype(str), format="%Y%m%d", errors="coerce")
+
+
+def _parse_digits8(words: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Value and validity of 8 ASCII digits packed in little-endian uint64
+    words, with three multiply-shift steps (SWAR) instead of a digit loop.
+    """
+    x = words - np.uint64(0x3030303030303030)
+    # Every byte is a digit iff no byte went negative and none exceeds 9
+    valid = ((words & np.uint64(0xF0F0F0F0F0F0F0F0)) == np.uint64(0x3030303030303030)) & (
+        ((x + np.uint64(0x0606060606060606)) & np.uint64(0xF0F0F0F0F0F0F0F0)) == 0
+    )
+    x = (x * np.uint64(10) + (x >> np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    x = (x * np.uint64(100) + (x >> np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    x = (x * np.uint64(10000) + (x >> np.uint64(32))) & np.uint64(0x00000000FFFFFFFF)
+    return x.astype(np.int64), valid
+
+
+def _date_fields(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray, sep: int, fields: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """
+    YYYYMMDD integer of the given field numbers of each line (0 if absent or
+    not 8 digits). Field offsets are looked up in the sorted positions of the
+    separators.
+    """
+    values = {name: np.zeros(len(starts), dtype=np.int64) for name in fields}
+    if len(buf) < 8 or not len(starts):
+        return values
+    # Every 8-byte window of the block, without copying it
+    windows = np.lib.stride_tricks.as_strided(buf, shape=(len(buf) - 7, 8), strides=(1, 1), writeable=False)
+    separators = np.r_[np.flatnonzero(buf == sep), len(buf)]
+    first = np.searchsorted(separators, starts)
+    for name, field in fields.items():
+        # The field starts after the field-th separator of the line
+        begin = starts if field == 0 else separators[np.minimum(first + field - 1, len(separators) - 1)] + 1
+        date, ok = _parse_digits8(np.ascontiguousarray(windows[np.minimum(begin, len(windows) - 1)]).view("<u8").ravel())
+        # The date must fill the whole field
+        after = buf[np.minimum(begin + 8, len(buf) - 1)]
+        ok &= (begin + 8 <= ends) & ((begin + 8 == ends) | (after == sep))
+        values[name] = np.where(ok, date, 0)
+    return values
+
+
+def _valid_dates(values: np.ndarray) -> np.ndarray:
+    """Zeroes YYYYMMDD integers that normalize_fec_frame would not parse (e.g. 20230231)."""
+    codes, unique = pd.factorize(values)
+    parsed = _to_timestamps(unique)
+    return np.where(parsed.notna().to_numpy()[codes], values, 0)
+
+
+def _line_blocks(fec_path: str) -> Iterator[Tuple[int, bytes]]:
+    """File offset and bytes of successive blocks of whole data lines (about SCAN_BLOCK_BYTES each)."""
+    with open(fec_path, "rb") as f:
+        offset = len(f.readline())
+        rest = b""
+        while True:
+            data = f.read(SCAN_BLOCK_BYTES)
+            chunk = rest + data
+            if data:
+                cut = chunk.rfind(b"\n") + 1
+                chunk, rest = chunk[:cut], chunk[cut:]
+            if chunk:
+                yield offset, chunk
+                offset += len(chunk)
+            if not data:
+                return
+
+
+def _split_lines(chunk: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bytes of a block, and start and end offsets of its non-blank lines, line ending (LF or CRLF) excluded."""
+    buf = np.frombuffer(chunk, dtype=np.uint8)
+    newlines = np.flatnonzero(buf == ord("\n"))
+    ends = newlines if chunk.endswith(b"\n") else np.r_[newlines, len(buf)]
+    starts = np.r_[0, newlines + 1][:len(ends)]
+    ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == ord("\r")))
+    kept = ends > starts  # read_csv skips empty lines
+    return buf, starts[kept], ends[kept]
+
+
+class _UnmappedLines(Exception):
+    """Lines of a block that do not map to rows (quoted fields spanning several lines)."""
+
+
+def _block_dates(
+    buf: np.ndarray, starts: np.ndarray, ends: np.ndarray, fmt: FECFormat, columns: Tuple[str, ...] = ("EcritureDate", "ValidDate"),
+) -> Dict[str, np.ndarray]:
+    """Date columns of every line of a block (YYYYMMDD integers, 0 when missing or invalid)."""
+    names = [col.strip() for col in fmt.columns]
+    wanted = {col: names.index(col) for col in columns if col in names}
+    if (buf == ord('"')).any():
+        # Quoted fields may hide separators: let the CSV parser find the dates
+        header = fmt.separator.join(fmt.columns).encode(fmt.encoding) + b"\n"
+        tokenized = pd.read_csv(
+            io.BytesIO(header + buf.tobytes()), sep=fmt.separator, encoding=fmt.encoding, dtype=str,
+            usecols=[fmt.columns[index] for index in wanted.values()],
+        )
+        if len(tokenized) != len(starts):
+            raise _UnmappedLines()
+        fields = {
+            col: pd.to_numeric(tokenized[fmt.columns[index]], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+            for col, index in wanted.items()
+        }
+    else:
+        fields = _date_fields(buf, starts, ends, ord(fmt.separator), wanted)
+    missing = np.zeros(len(starts), dtype=np.int64)
+    return {col: _valid_dates(fields.get(col, missing)) for col in columns}
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer of uint64 values."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# Low `n` bytes of a little-endian word, n = 0..8
+_WORD_MASKS = np.array([(1 << (8 * n)) - 1 for n in range(9)], dtype=np.uint64)
+
+
+def _line_hashes(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    64-bit hash of each line buf[start:end]: its 8-byte words, each mixed
+    with its rank in the line, summed, then mixed with the line length. Each
+    step is one array operation over the words of the whole block.
+    """
+    if not len(starts):
+        return np.zeros(0, dtype=np.uint64)
+    padded = np.zeros(len(buf) + 8, dtype=np.uint8)
+    padded[:len(buf)] = buf
+    # The 8-byte word at every offset of the block (unaligned view, no copy)
+    words_at = np.ndarray((len(buf),), dtype="<u8", buffer=padded, strides=(1,))
+    lengths = (ends - starts).astype(np.int32)
+    n_words = (lengths + 7) // 8
+    first_word = np.r_[0, np.cumsum(n_words)[:-1]].astype(np.int32)
+    rank = np.arange(int(n_words.sum()), dtype=np.int32) - np.repeat(first_word, n_words)
+    words = words_at[np.repeat(starts.astype(np.int32), n_words) + 8 * rank]
+    # Bytes of the last word past the end of its line
+    words[first_word + n_words - 1] &= _WORD_MASKS[lengths - 8 * (n_words - 1)]
+    words += (rank.astype(np.uint64) + np.uint64(1)) * np.uint64(0x9E3779B97F4A7C15)
+    words ^= words >> np.uint64(32)
+    words *= np.uint64(0xBF58476D1CE4E5B9)
+    return _mix64(np.add.reduceat(words, first_word) ^ lengths.astype(np.uint64))
+
+
+def scan_extract(fec_path: str, fmt: FECFormat, watermark: Optional[int] = None) -> Optional[ExtractScan]:
+    """
+    Reads the month, dates and content hash of every line of a FEC extract,
+    block by block, into per-month figures; `watermark` (YYYYMMDD) counts
+    the lines recorded after it. Returns None when lines cannot be mapped to
+    rows (quoted fields spanning several lines).
+    """
+    with open(fec_path, "rb") as f:
+        header = f.readline().rstrip(b"\r\n") + b"\n"
+    # Running sums per month: rows, hash sums (mod 2**64), first and last date, late lines
+    totals: Dict[int, List] = {}
+    blocks = []
+    latest = 0
+    try:
+        for offset, chunk in _line_blocks(fec_path):
+            buf, starts, ends = _split_lines(chunk)
+            if not len(starts):
+                continue
+            dates = _block_dates(buf, starts, ends, fmt)
+            ecriture, valid = dates["EcritureDate"], dates["ValidDate"]
+            latest = max(latest, int(ecriture.max()), int(valid.max()))
+            hashes = _line_hashes(buf, starts, ends)
+            late = (ecriture > watermark) | (valid > watermark) if watermark else np.zeros(len(starts), dtype=bool)
+            # A few hundred distinct months: small codes sort in linear time
+            codes, keys = pd.factorize(ecriture // 100)
+            order = np.argsort(codes.astype(np.int16 if len(keys) < 2**15 else np.int64), kind="stable")
+            sorted_codes = codes[order]
+            first = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+            block = zip(
+                keys[sorted_codes[first]],
+                np.diff(np.r_[first, len(order)]),
+                np.add.reduceat(hashes[order], first),
+                np.add.reduceat(hashes[order] * hashes[order], first),
+                np.minimum.reduceat(ecriture[order], first),
+                np.maximum.reduceat(ecriture[order], first),
+                np.add.reduceat(late[order].astype(np.int64), first),
+            )
+            blocks.append((offset, len(chunk), set(keys.tolist())))
+            for month, n, sums, squares, date_min, date_max, n_late in block:
+                current = totals.setdefault(int(month), [0, 0, 0, date_min, date_max, 0])
+                current[0] += int(n)
+                current[1] = (current[1] + int(sums)) % 2**64
+                current[2] = (current[2] + int(squares)) % 2**64
+                current[3], current[4] = min(current[3], date_min), max(current[4], date_max)
+                current[5] += int(n_late)
+    except _UnmappedLines:
+        return None
+
+    months = pd.DataFrame(
+        [
+            (n, f"{n}-{sums:x}-{squares:x}", date_min, date_max, n_late)
+            for n, sums, squares, date_min, date_max, n_late in totals.values()
+        ],
+        columns=["n_rows", "fingerprint", "date_min", "date_max", "late_postings"],
+        index=pd.Index(list(totals), name="month", dtype=np.int64),
+    )
+    for col in ("date_min", "date_max"):
+        months[col] = _to_timestamps(months[col].to_numpy()).to_numpy()
+    return ExtractScan(fec_path, fmt, header, months, latest, blocks)
+
+
+def _partition_balances(df: pd.DataFrame, months: pd.Series) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Account and auxiliary balances and daily movements per month of the given rows."""
+    balances = df[["Debit", "Credit"]].groupby([df["CompteNum"], months.rename("month")], sort=False, observed=True).sum()
+    balances.index = plain_index(balances.index)
+
+    aux_rows = df["CompAuxNum"].notna() if "CompAuxNum" in df.columns else pd.Series(False, index=df.index)
+    aux = df[aux_rows]
+    label = aux["CompAuxLib"] if "CompAuxLib" in aux.columns else pd.Series(pd.NA, index=aux.index, dtype=object)
+    aux_balances = pd.DataFrame({"Debit": aux["Debit"], "Credit": aux["Credit"], "CompAuxLib": label}).groupby(
+        [months[aux_rows].rename("month"), aux["CompteNum"], aux["CompAuxNum"]], sort=False, observed=True
+    ).agg(AUX_AGGREGATIONS)
+    aux_balances.index = plain_index(aux_balances.index)
+    aux_balances["CompAuxLib"] = aux_balances["CompAuxLib"].astype(object)
+
+    daily = daily_movements(df).rename("net").reset_index()
+    daily.insert(0, "month", month_keys(daily["day"]))
+    return balances.reset_index(), aux_balances.reset_index(), daily
+
+
+def _month_label(month: int) -> str:
+    return "sans date" if month == UNDATED_MONTH else f"{month // 100:04d}-{month % 100:02d}"
+
+
+def ingest_incremental(
+    fec_path: str,
+    ledger_id: Optional[str] = None,
+    encoding: str = "latin-1",
+    separator: str = "|",
+) -> Tuple[LedgerAggregates, Dict]:
+    """
+    Updates the stored state of `ledger_id` with a new FEC extract.
+
+    Returns the aggregates of the whole extract and a summary of what was
+    ingested: new months, restated months (recomputed), late postings
+    (entries dated in an earlier month but recorded or validated after the
+    previous watermark).
+    """
+    ledger_id = ledger_id or default_ledger_id(fec_path)
+    digest = file_digest(fec_path)
+    state = IncrementalState.load(ledger_id)
+    first_run = state is None
+    previous_watermark = None if first_run else state.watermark
+
+    if not first_run and state.digest == digest:
+        # Same extract as last run: nothing to ingest
+        return state.aggregates(), _summary(ledger_id, "unchanged", state, previous_watermark, 0, [], [], 0)
+
+    fmt = sniff_fec_format(fec_path, encoding=encoding, separator=separator)
+    mark = int(previous_watermark.strftime("%Y%m%d")) if previous_watermark is not None else None
+    scan = scan_extract(fec_path, fmt, mark)
+    if scan is None:
+        # Lines do not map to rows: rebuild every partition from a full parse
+        df = load_fec(fec_path, encoding=encoding, separator=separator, columns=AGGREGATE_COLUMNS)
+        months = df["EcritureDate"].groupby(month_keys(df["EcritureDate"]).rename("month")).agg(["size", "min", "max"])
+        months.columns = ["n_rows", "date_min", "date_max"]
+        for col in ("date_min", "date_max"):
+            months[col] = months[col].map(to_timestamp)  # undated month: None
+        months["fingerprint"] = None  # never matches: next run rebuilds too
+        previous_months = set() if first_run else set(state.months)
+        new_months = sorted(set(months.index) - previous_months)
+        restated = sorted(previous_months)  # cannot tell which ones changed
+        recompute = set(months.index) | set(restated)
+        late_postings, rows_ingested = 0, len(df)
+        watermark = day_range(df["EcritureDate"].to_numpy())[1]
+    else:
+        months = scan.month_summary()
+        if first_run:
+            new_months, restated = sorted(months.index), []
+        else:
+            current = dict(zip(months.index, months["fingerprint"]))
+            changed = {m for m, fingerprint in current.items() if state.months.get(m, {}).get("fingerprint") != fingerprint}
+            new_months = sorted(m for m in changed if m not in state.months)
+            # Months whose content changed or disappeared since the previous extract
+            restated = sorted((changed - set(new_months)) | (set(state.months) - set(current)))
+        recompute = set(new_months) | set(restated)
+
+        late_postings = int(scan.months["late_postings"].reindex(restated, fill_value=0).sum())
+
+        if recompute >= set(months.index):
+            df = load_fec(fec_path, encoding=encoding, separator=separator, columns=AGGREGATE_COLUMNS)
+        else:
+            # Parse only the lines of the partitions to recompute
+            df = parse_fec_bytes(scan.text(sorted(recompute)), fmt, columns=AGGREGATE_COLUMNS)
+        rows_ingested = len(df)
+        watermark = pd.Timestamp(str(scan.latest)) if scan.latest else None
+
+    balances, aux_balances, daily = _partition_balances(df, month_keys(df["EcritureDate"]))
+    if first_run:
+        state = IncrementalState(ledger_id)
+    state.balances = _replace_partitions(state.balances, balances, recompute)
+    state.aux_balances = _replace_partitions(state.aux_balances, aux_balances, recompute)
+    state.daily = _replace_partitions(state.daily, daily, recompute)
+    state.months = {
+        int(month): {
+            "n_rows": int(row.n_rows),
+            "fingerprint": row.fingerprint,
+            "date_min": row.date_min if pd.notna(row.date_min) else None,
+            "date_max": row.date_max if pd.notna(row.date_max) else None,
+        }
+        for month, row in months.iterrows()
+    }
+    state.watermark = watermark if pd.notna(watermark) else None
+    state.digest = digest
+    try:
+        state.save(fec_path)
+    except OSError:
+        pass  # A read-only state dir must not break the analysis
+
+    mode = "full" if first_run or scan is None else "incremental"
+    return state.aggregates(), _summary(
+        ledger_id, mode, state, previous_watermark, rows_ingested, new_months, restated, late_postings
+    )
+
+
+def _replace_partitions(current: pd.DataFrame, partitions: pd.DataFrame, months: set) -> pd.DataFrame:
+    kept = current[~current["month"].isin(months)]
+    combined = pd.concat([kept, partitions], ignore_index=True) if len(kept) else partitions
+    return combined.astype({col: "int64" for col in ("month", "Debit", "Credit", "net") if col in combined.columns})
+
+
+def _summary(
+    ledger_id: str,
+    mode: str,
+    state: IncrementalState,
+    previous_watermark: Optional[pd.Timestamp],
+    rows_ingested: int,
+    new_months: List[int],
+    restated: List[int],
+    late_postings: int,
+) -> Dict:
+    return {
+        "ledger_id": ledger_id,
+        "mode": mode,
+        "previous_watermark": _iso(previous_watermark),
+        "watermark": _iso(state.watermark),
+        "rows_ingested": rows_ingested,
+        "months_total": len(state.months),
+        "new_months": [_month_label(m) for m in new_months],
+        "restated_months": [_month_label(m) for m in restated],
+        "late_postings": late_postings,
+    }
+
+
+def _iso(ts: Optional[pd.Timestamp]) -> Optional[str]:
+    return ts.strftime("%Y-%m-%d") if ts is not None else None
@@ -0,0 +1,231 @@
+"""
+IFRS 16 restatement of the leases expensed under French GAAP.
+
+French GAAP books crédit-bail fees (612) and rents (613) as operating
+charges; IFRS 16 puts a right-of-use asset and a lease liability on the
+balance sheet and replaces the charge by depreciation and interest. To
+compare a French target with IFRS comparables, each lease is rebuilt from
+its postings:
+
+- a lease is the account plus the lessor (the third party of the same
+  entry, else the entry label stripped of dates and numbers);
+- its monthly payment is the run-rate of the last twelve months of the
+  ledger, its term a default per lease type, its elapsed life the months
+  since its first payment (half the term when it predates the ledger);
+- liability = present value of the remaining payments at the incremental
+  borrowing rate, right-of-use asset = initial liability depreciated
+  straight-line over the term.
+
+Every lease is a row of numpy arrays and the annuity formulas apply to all
+of them at once, so the cost is one groupby of the lease postings.
+"""
+
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import account_range
+from dexter.fec.reader import MISSING_DAY, to_euros
+
+# FEC columns the lease engine reads
+LEASE_COLUMNS = ["JournalCode", "EcritureNum", "EcritureDate", "CompteNum", "CompAuxNum", "EcritureLib", "Debit", "Credit"]
+
+# Lease types: account spec -> label and default contract term in months.
+# Later specs override earlier ones for the accounts they match.
+LEASE_TYPES = {
+    "612": {"label": "Crédit-bail", "term_months": 48},
+    "613": {"label": "Location mobilière", "term_months": 36},
+    "6132": {"label": "Bail immobilier", "term_months": 108},  # bail commercial 3-6-9
+}
+
+# Accounts of the lessor on the same entry
+LESSOR_ACCOUNTS = "40"
+
+# Incremental borrowing rate used to discount the remaining payments
+DEFAULT_DISCOUNT_RATE = 0.05
+
+# Low-value leases (yearly payments below this, EUR) stay expensed, as IFRS 16 allows
+LOW_VALUE_ANNUAL_PAYMENT = 1_500.0
+
+# A lease without payment in the last months of the ledger has ended
+ENDED_AFTER_MONTHS = 3
+
+_LABEL_NOISE = (
+    r"\d+|janv\w*|f[ée]v\w*|mars|avr\w*|mai|juin|juil\w*|ao[uû]t|sept\w*|oct\w*|nov\w*|d[ée]c\w*"
+    r"|[^\w]+"
+)
+
+
+def annuity_factor(months: np.ndarray, monthly_rate: float) -> np.ndarray:
+    """Present value of 1 paid at the end of each of `months` months."""
+    months = np.maximum(months, 0)
+    if monthly_rate == 0:
+        return months.astype(np.float64)
+    return (1 - (1 + monthly_rate) ** -months) / monthly_rate
+
+
+def lease_payments(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Net lease charges (cents) per lease and month, and the leases (account,
+    type, lessor). Lines outside the lease accounts or undated are ignored.
+    """
+    accounts = df["CompteNum"]
+    if not isinstance(accounts.dtype, pd.CategoricalDtype):
+        accounts = accounts.astype("category")
+    # Classify the distinct account numbers once, then map every line by its code
+    categories = accounts.cat.categories.astype(str)
+    codes = accounts.cat.codes.to_numpy()
+    types = np.full(len(categories) + 1, -1, dtype=np.int64)  # last slot: code -1 (no account)
+    for i, spec in enumerate(LEASE_TYPES):
+        low, high = account_range(spec)
+        types[:-1][(categories >= low) & (categories < high)] = i
+    low, high = account_range(LESSOR_ACCOUNTS)
+    lessor_account = np.append((categories >= low) & (categories < high), False)
+    lease_type = types[codes]
+    days = df["EcritureDate"].to_numpy()
+    rows = (lease_type >= 0) & (days != MISSING_DAY)
+
+    # Lessor: third party of the same entry, first one found
+    journals = pd.factorize(df["JournalCode"])[0]
+    numbers, distinct = pd.factorize(df["EcritureNum"])
+    entry = (journals + 1) * (len(distinct) + 1) + numbers
+    third_party = lessor_account[codes]
+    party = np.asarray(categories, dtype=object)[codes[third_party]]
+    if "CompAuxNum" in df.columns:
+        aux = df["CompAuxNum"].to_numpy(dtype=object)[third_party]
+        party = np.where(pd.notna(aux), aux, party)
+    lessors = pd.Series(party, index=entry[third_party])
+    lessors = lessors[~lessors.index.duplicated()]
+    lessor = lessors.reindex(entry[rows]).to_numpy(dtype=object)
+
+    # No third party on the entry (direct bank debit): group by cleaned label
+    label_codes, labels = pd.factorize(df["EcritureLib"][rows].astype(object).fillna("").astype(str))
+    cleaned = pd.Series(labels).str.lower().str.replace(_LABEL_NOISE, " ", regex=True).str.split().str.join(" ")
+    by_label = "libellé: " + cleaned.to_numpy(dtype=object)[label_codes] if len(labels) else np.array([], dtype=object)
+    lessor = np.where(pd.notna(lessor), lessor, by_label)
+
+    lines = pd.DataFrame({
+        "account": np.asarray(categories, dtype=object)[codes[rows]],
+        "type": lease_type[rows],
+        "lessor": lessor,
+        "month": days[rows].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64),
+        "amount": df["Debit"].to_numpy()[rows] - df["Credit"].to_numpy()[rows],
+    })
+    lease_id, keys = pd.factorize(pd.MultiIndex.from_arrays([lines["account"], lines["lessor"]]))
+    leases = pd.DataFrame({
+        "account": keys.get_level_values(0),
+        "lessor": keys.get_level_values(1),
+        "type": lines.groupby(lease_id)["type"].first().to_numpy(),
+    })
+    monthly = lines.groupby([lease_id, "month"])["amount"].sum()
+    monthly.index.names = ["lease", "month"]
+    return monthly, leases
+
+
+def restate_leases(
+    df: pd.DataFrame,
+    discount_rate: float = DEFAULT_DISCOUNT_RATE,
+    top_n: int = 10,
+) -> Dict:
+    """
+    IFRS 16 restatement of the 612/613 leases of a normalized ledger: lease
+    liability and right-of-use asset at the end of the ledger, interest and
+    depreciation of the period, EBITDA uplift, net debt change and the
+    liability schedule of the following years.
+    """
+    monthly, leases = lease_payments(df)
+    if monthly.empty:
+        return {"n_leases": 0, "note": "Aucune redevance de crédit-bail (612) ni location (613) dans le FEC"}
+
+    lease = monthly.index.get_level_values("lease").to_numpy()
+    month = monthly.index.get_level_values("month").to_numpy()
+    amount = monthly.to_numpy()
+    days = df["EcritureDate"].to_numpy()
+    dated = days[days != MISSING_DAY].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    ledger_first, ledger_last = int(dated.min()), int(dated.max())
+    n = len(leases)
+
+    # Lease-level arrays: expense of the period, first/last payment
+    expense = np.bincount(lease, weights=amount, minlength=n)
+    first_paid = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(first_paid, lease, month)
+    last_paid = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(last_paid, lease, month)
+    active = last_paid > ledger_last - ENDED_AFTER_MONTHS
+    # Months each lease ran within the ledger: an active lease runs to its end
+    end = np.where(active, ledger_last, last_paid)
+    in_period = end - np.maximum(first_paid, ledger_first) + 1
+
+    # Run-rate: payments of the last twelve months over the months the lease ran in them
+    window_start = max(ledger_first, ledger_last - 11)
+    recent = month >= window_start
+    recent_months = np.maximum(end - np.maximum(first_paid, window_start) + 1, 1)
+    run_rate = np.bincount(lease[recent], weights=amount[recent], minlength=n) / recent_months
+
+    term = np.array([spec["term_months"] for spec in LEASE_TYPES.values()])[leases["type"].to_numpy()]
+    # A lease paid since the first month of the ledger may be older: assume it is half way through
+    start_unknown = first_paid <= ledger_first
+    elapsed = np.where(start_unknown, term // 2, ledger_last - first_paid + 1)
+    # An ended lease has nothing left to pay
+    remaining = np.where(active, np.clip(term - elapsed, 0, None), 0)
+
+    restated = (run_rate * 12 >= LOW_VALUE_ANNUAL_PAYMENT * 100) & (expense > 0)
+    on_balance_sheet = restated & active & (remaining > 0)
+
+    monthly_rate = (1 + discount_rate) ** (1 / 12) - 1
+    initial = run_rate * annuity_factor(term, monthly_rate)
+    liability_end = np.where(on_balance_sheet, run_rate * annuity_factor(remaining, monthly_rate), 0.0)
+    liability_start = np.where(restated, run_rate * annuity_factor(np.minimum(remaining + in_period, term), monthly_rate), 0.0)
+    rou_end = np.where(on_balance_sheet, initial * remaining / term, 0.0)
+    depreciation = np.where(restated, initial / term * np.minimum(in_period, term), 0.0)
+    # Interest: the payments of the period not used to repay the liability
+    paid = np.where(restated, run_rate * np.minimum(in_period, term), 0.0)
+    interest = np.maximum(paid - (liability_start - liability_end), 0.0)
+    uplift = np.where(restated, expense, 0.0)
+
+    # Liability left at each following year end: remaining term shortened 12 months at a time
+    years = int(np.ceil(remaining[on_balance_sheet].max() / 12)) if on_balance_sheet.any() else 0
+    step = np.arange(1, years + 1) * 12
+    schedule = (run_rate[:, None] * annuity_factor(remaining[:, None] - step[None, :], monthly_rate))[on_balance_sheet].sum(axis=0)
+    ledger_end_year = ledger_last // 12 + 1970
+
+    ebitda_uplift = float(uplift.sum())
+    names = [spec["label"] for spec in LEASE_TYPES.values()]
+    top = np.argsort(-liability_end, kind="stable")[:top_n]
+    return {
+        "n_leases": n,
+        "n_restated": int(restated.sum()),
+        "n_on_balance_sheet": int(on_balance_sheet.sum()),
+        "discount_rate_pct": round(discount_rate * 100, 2),
+        "lease_liability": round(to_euros(float(liability_end.sum())), 2),
+        "right_of_use_asset": round(to_euros(float(rou_end.sum())), 2),
+        "depreciation": round(to_euros(float(depreciation.sum())), 2),
+        "interest": round(to_euros(float(interest.sum())), 2),
+        "ebitda_uplift": round(to_euros(ebitda_uplift), 2),
+        "ebit_impact": round(to_euros(ebitda_uplift - float(depreciation.sum())), 2),
+        "pretax_result_impact": round(to_euros(ebitda_uplift - float(depreciation.sum()) - float(interest.sum())), 2),
+        # Lease liabilities count as financial debt under IFRS 16
+        "net_debt_change": round(to_euros(float(liability_end.sum())), 2),
+        "liability_schedule": {str(ledger_end_year + k + 1): round(to_euros(float(v)), 2) for k, v in enumerate(schedule)},
+        "leases": [
+            {
+                "account": leases.at[i, "account"],
+                "lessor": leases.at[i, "lessor"],
+                "type": names[leases.at[i, "type"]],
+                "monthly_payment": round(to_euros(float(run_rate[i])), 2),
+                "expense": round(to_euros(float(expense[i])), 2),
+                "term_months": int(term[i]),
+                "remaining_months": int(remaining[i]),
+                "start_assumed": bool(start_unknown[i]),
+                "liability": round(to_euros(float(liability_end[i])), 2),
+                "right_of_use": round(to_euros(float(rou_end[i])), 2),
+            }
+            for i in top if restated[i]
+        ],
+        "assumptions": {
+            "term_months": {spec: t["term_months"] for spec, t in LEASE_TYPES.items()},
+            "low_value_annual_payment": LOW_VALUE_ANNUAL_PAYMENT,
+            "note": "Durées par défaut par type de bail ; baux antérieurs au FEC supposés à mi-vie. "
+                    "À corriger avec les contrats (data room) pour un retraitement définitif.",
+        },
+    }
@@ -0,0 +1,263 @@
+"""
+Invoice/settlement matching on the 411 and 401 sub-ledgers.
+
+Invoices are paired with the settlements that cleared them in three passes,
+each one on the lines the previous passes left open:
+
+1. lettrage: lines sharing an EcritureLet code on the same counterparty
+   form a group; a balanced group settles its invoices on the date of its
+   last settlement line (DateLet if it has none);
+2. exact amount: an invoice and a later settlement of the same amount on
+   the same counterparty, oldest first;
+3. FIFO: the remaining settlements of a counterparty pay its remaining
+   invoices oldest first (running totals compared with a binary search).
+
+Every pass is a groupby, a hash merge or a sorted search over the whole
+sub-ledger, never a loop over counterparties or lines. The matched pairs
+give payment delays per counterparty; the open invoices give the aging
+balance and the overdue exposure.
+"""
+
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import account_range
+from dexter.fec.reader import MISSING_DAY, to_euros, to_timestamp
+
+# FEC columns the matching engine reads
+LETTRAGE_COLUMNS = ["EcritureDate", "CompteNum", "CompAuxNum", "CompAuxLib", "Debit", "Credit", "EcritureLet", "DateLet"]
+
+# Client invoices are debits, supplier invoices credits
+LETTRAGE_LEDGERS = {
+    "clients": {"accounts": "411", "sign": 1},
+    "suppliers": {"accounts": "401", "sign": -1},
+}
+
+# Legal maximum payment term in France (LME): 60 days from the invoice date
+DEFAULT_PAYMENT_TERMS_DAYS = 60
+
+# Aging buckets of open invoices: upper bound in days -> label
+AGING_BUCKETS = [(30, "0-30"), (60, "31-60"), (90, "61-90"), (180, "91-180"), (np.inf, "180+")]
+
+
+def ledger_lines(df: pd.DataFrame, side: str = "clients") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Dated lines of the 411 (clients) or 401 (suppliers) accounts as integer
+    columns: counterparty code, day, signed amount (invoices positive,
+    cents), lettering group (-1 when unlettered) and lettering day. Also
+    returns the counterparties (CompAuxNum, else CompteNum, and label) by
+    code. Strings are factorized once here so that every later groupby and
+    merge hashes integers.
+    """
+    ledger = LETTRAGE_LEDGERS[side]
+    low, high = account_range(ledger["accounts"])
+    accounts = df["CompteNum"].astype(str)
+    rows = ((accounts >= low) & (accounts < high)).to_numpy() & (df["EcritureDate"].to_numpy() != MISSING_DAY)
+    lines = df[rows]
+
+    counterparty = accounts[rows].to_numpy(dtype=object)
+    label = np.full(len(lines), np.nan, dtype=object)
+    if "CompAuxNum" in lines.columns:
+        aux = lines["CompAuxNum"].to_numpy(dtype=object)
+        counterparty = np.where(pd.notna(aux), aux, counterparty)
+        if "CompAuxLib" in lines.columns:
+            label = lines["CompAuxLib"].to_numpy(dtype=object)
+    cp, ids = pd.factorize(counterparty)
+
+    group = np.full(len(lines), -1, dtype=np.int64)
+    if "EcritureLet" in lines.columns:
+        letter = lines["EcritureLet"].astype(object)
+        letter_code, letters = pd.factorize(letter.where(letter.astype(str).str.strip() != "", None))
+        lettered = letter_code >= 0
+        # A lettering code only ties lines of the same counterparty
+        group[lettered] = pd.factorize(cp[lettered].astype(np.int64) * (len(letters) + 1) + letter_code[lettered])[0]
+    let_day = lines["DateLet"].to_numpy() if "DateLet" in lines.columns else np.full(len(lines), MISSING_DAY)
+
+    counterparties = pd.DataFrame({
+        "id": ids,
+        "label": pd.Series(label).groupby(cp).first().reindex(range(len(ids))).to_numpy(dtype=object),
+    })
+    return pd.DataFrame({
+        "cp": cp.astype(np.int64),
+        "day": lines["EcritureDate"].to_numpy(dtype=np.int64),
+        "amount": ledger["sign"] * (lines["Debit"].to_numpy() - lines["Credit"].to_numpy()),
+        "group": group,
+        "let_day": let_day.astype(np.int64),
+    }), counterparties
+
+
+def _match_lettered(lines: pd.DataFrame) -> pd.Series:
+    """Settlement day of every line of a balanced lettering group (NaN elsewhere)."""
+    lettered = lines[lines["group"] >= 0]
+    groups = lettered["group"]
+    residual = lettered["amount"].groupby(groups).transform("sum")
+    settled_on = lettered["day"].where(lettered["amount"] < 0).groupby(groups).transform("max")
+    lettered_on = lettered["let_day"].where(lettered["let_day"] != MISSING_DAY).groupby(groups).transform("max")
+    paid_day = settled_on.fillna(lettered_on)
+    closed = (residual == 0) & paid_day.notna()
+    return paid_day[closed].reindex(lines.index)
+
+
+def _match_exact(invoices: pd.DataFrame, payments: pd.DataFrame) -> pd.DataFrame:
+    """Pairs (invoice index, payment index, payment day) of equal amounts, n-th invoice with n-th payment."""
+    invoices = invoices.sort_values("day", kind="stable")
+    payments = payments.sort_values("day", kind="stable")
+    invoices = invoices.assign(rank=invoices.groupby(["cp", "amount"]).cumcount())
+    payments = payments.assign(rank=payments.groupby(["cp", "amount"]).cumcount())
+    pairs = invoices.reset_index()[["index", "cp", "amount", "rank", "day"]].merge(
+        payments.reset_index()[["index", "cp", "amount", "rank", "day"]],
+        on=["cp", "amount", "rank"], suffixes=("", "_paid"),
+    )
+    # A settlement booked before the invoice is not its payment
+    return pairs[pairs["day_paid"] >= pairs["day"]]
+
+
+def _match_fifo(invoices: pd.DataFrame, payments: pd.DataFrame) -> pd.DataFrame:
+    """
+    Oldest-first allocation of each counterparty's payments to its invoices:
+    an invoice is paid on the day the running total of payments reaches the
+    running total of invoices up to it. Adds `paid_day` (NaN if unpaid) and
+    `open_amount` (cents still due) to the invoices.
+    """
+    invoices = invoices.sort_values(["cp", "day"], kind="stable")
+    payments = payments.sort_values(["cp", "day"], kind="stable")
+    inv_cp, pay_cp = invoices["cp"].to_numpy(), payments["cp"].to_numpy()
+    due = invoices.groupby("cp", sort=False)["amount"].cumsum().to_numpy()
+    paid = payments.groupby("cp", sort=False)["amount"].cumsum().to_numpy()
+
+    # One sorted key space for all counterparties: counterparty offset + running total
+    span = int(max(due.max(initial=0), paid.max(initial=0))) + 1
+    pay_keys = pay_cp * span + paid
+    pos = np.searchsorted(pay_keys, inv_cp * span + due, side="left")
+    found = pos < len(pay_keys)
+    found[found] = pay_cp[pos[found]] == inv_cp[found]
+
+    available = payments.groupby("cp", sort=False)["amount"].sum().reindex(inv_cp).fillna(0).to_numpy()
+    open_amount = np.clip(due - available, 0, invoices["amount"].to_numpy())
+
+    paid_day = np.full(len(invoices), np.nan)
+    paid_day[found] = payments["day"].to_numpy()[pos[found]]
+    return invoices.assign(paid_day=paid_day, open_amount=open_amount)
+
+
+def match_invoices(lines: pd.DataFrame) -> pd.DataFrame:
+    """
+    Invoices of `lines` (see ledger_lines) with their settlement day
+    (`paid_day`, NaN if open), the matching `method` and the cents still open.
+    """
+    # Every line of a balanced lettering group gets the group's settlement day
+    lettered_day = _match_lettered(lines)
+    invoices = lines[lines["amount"] > 0].copy()
+    invoices["paid_day"] = lettered_day[invoices.index]
+    invoices["method"] = np.where(invoices["paid_day"].notna(), "lettrage", None)
+    invoices["open_amount"] = 0
+
+    # Lines outside balanced groups go through the amount passes
+    remaining = lines[lettered_day.isna()]
+    open_invoices = remaining[remaining["amount"] > 0]
+    payments = remaining[remaining["amount"] < 0].assign(amount=lambda p: -p["amount"])
+
+    exact = _match_exact(open_invoices, payments)
+    matched = exact["index"].to_numpy()
+    invoices.loc[matched, "paid_day"] = exact["day_paid"].to_numpy()
+    invoices.loc[matched, "method"] = "montant"
+
+    fifo = _match_fifo(open_invoices.drop(index=matched), payments.drop(index=exact["index_paid"].to_numpy()))
+    invoices.loc[fifo.index, "paid_day"] = fifo["paid_day"]
+    invoices.loc[fifo.index, "method"] = np.where(fifo["paid_day"].notna(), "fifo", None)
+    invoices.loc[fifo.index, "open_amount"] = fifo["open_amount"]
+    return invoices.astype({"paid_day": "float64", "open_amount": "int64"})
+
+
+def _weighted_days(days: pd.Series, weights: pd.Series) -> Optional[float]:
+    total = weights.sum()
+    return round(float((days * weights).sum() / total), 1) if total > 0 else None
+
+
+def payment_report(
+    df: pd.DataFrame,
+    side: str = "clients",
+    payment_terms_days: int = DEFAULT_PAYMENT_TERMS_DAYS,
+    as_of: Optional[pd.Timestamp] = None,
+    top_n: int = 10,
+) -> Dict:
+    """
+    Payment delays, aging balance and overdue exposure of the clients (411)
+    or suppliers (401) of a normalized ledger, as of `as_of` (default: the
+    last dated entry of the sub-ledger).
+    """
+    lines, counterparties = ledger_lines(df, side)
+    if lines.empty:
+        return {"side": side, "n_invoices": 0, "note": f"Aucune écriture sur les comptes {LETTRAGE_LEDGERS[side]['accounts']}"}
+    invoices = match_invoices(lines)
+    as_of_day = int(lines["day"].max()) if as_of is None else int(np.datetime64(as_of.date(), "D").astype(np.int64))
+
+    # Settled invoices: delay in days, weighted by the invoice amount
+    paid = invoices[invoices["paid_day"].notna()]
+    delay = (paid["paid_day"] - paid["day"]).clip(lower=0)
+
+    # Open invoices: age from the invoice date, overdue past the payment terms
+    still_open = invoices[invoices["open_amount"] > 0]
+    age = as_of_day - still_open["day"]
+    bounds = [-np.inf] + [upper for upper, _ in AGING_BUCKETS]
+    buckets = pd.cut(age, bounds, labels=[label for _, label in AGING_BUCKETS])
+    aging = still_open["open_amount"].groupby(buckets, observed=False).sum()
+    overdue = still_open["open_amount"][age > payment_terms_days]
+    open_total = int(still_open["open_amount"].sum())
+
+    per_counterparty = pd.DataFrame({
+        "invoiced": invoices.groupby("cp")["amount"].sum(),
+        "n_invoices": invoices.groupby("cp").size(),
+        "avg_delay_days": (delay * paid["amount"]).groupby(paid["cp"]).sum() / paid["amount"].groupby(paid["cp"]).sum(),
+        "open": still_open["open_amount"].groupby(still_open["cp"]).sum(),
+        "overdue": overdue.groupby(still_open["cp"][age > payment_terms_days]).sum(),
+        "oldest_open_day": still_open["day"].groupby(still_open["cp"]).min(),
+    })
+    per_counterparty[["open", "overdue"]] = per_counterparty[["open", "overdue"]].fillna(0).astype("int64")
+    top = per_counterparty.sort_values("invoiced", ascending=False).head(top_n)
+    invoiced_total = int(invoices["amount"].sum())
+    # Net balance = open invoices - settlements not allocated to any invoice
+    unapplied = open_total - int(lines["amount"].sum())
+
+    return {
+        "side": side,
+        "as_of": to_timestamp(as_of_day).strftime("%Y-%m-%d"),
+        "payment_terms_days": payment_terms_days,
+        "n_invoices": int(len(invoices)),
+        "n_counterparties": int(len(per_counterparty)),
+        "invoiced_total": round(to_euros(invoiced_total), 2),
+        "matching": {
+            "lettrage": int((invoices["method"] == "lettrage").sum()),
+            "montant": int((invoices["method"] == "montant").sum()),
+            "fifo": int((invoices["method"] == "fifo").sum()),
+            "open": int(invoices["paid_day"].isna().sum()),
+            "lettered_pct": round(float((lines["group"] >= 0).mean() * 100), 1),
+        },
+        "avg_payment_delay_days": _weighted_days(delay, paid["amount"]),
+        "median_payment_delay_days": float(delay.median()) if len(delay) else None,
+        "paid_late_pct": (
+            round(float(paid["amount"][delay > payment_terms_days].sum() / paid["amount"].sum() * 100), 2)
+            if len(paid) else 0.0
+        ),
+        "open_total": round(to_euros(open_total), 2),
+        "aging": {label: round(to_euros(int(amount)), 2) for label, amount in aging.items()},
+        "overdue_total": round(to_euros(int(overdue.sum())), 2),
+        "overdue_pct_of_open": round(float(overdue.sum() / open_total * 100), 2) if open_total > 0 else 0.0,
+        # Prepayments, credit notes, invoices missing from the ledger
+        "unapplied_payments": round(to_euros(max(unapplied, 0)), 2),
+        "top_counterparties": [
+            {
+                "id": counterparties.at[cp, "id"],
+                "label": counterparties.at[cp, "label"] if pd.notna(counterparties.at[cp, "label"]) else None,
+                "invoiced": round(to_euros(int(row.invoiced)), 2),
+                "share_pct": round(float(row.invoiced / invoiced_total * 100), 2) if invoiced_total > 0 else 0.0,
+                "n_invoices": int(row.n_invoices),
+                "avg_delay_days": round(float(row.avg_delay_days), 1) if pd.notna(row.avg_delay_days) else None,
+                "open": round(to_euros(int(row.open)), 2),
+                "overdue": round(to_euros(int(row.overdue)), 2),
+                "oldest_open": to_timestamp(int(row.oldest_open_day)).strftime("%Y-%m-%d") if pd.notna(row.oldest_open_day) else None,
+            }
+            for cp, row in top.iterrows()
+        ],
+    }
@@ -0,0 +1,203 @@
+"""
+Rules-based EBITDA normalization from the PCG balances of a FEC.
+
+Reported EBITDA is rebuilt from the ledger (result before financial items,
+corporate tax and depreciation) and the adjustments that only need the
+ledger are quantified here:
+
+- owner compensation (644 + 646) against a market manager cost scaled by
+  the geography cost index;
+- crédit-bail fees (612) added back, as IFRS 16 would book them below
+  EBITDA;
+- exceptional charges and income (67x/687, 77x/787) taken out;
+- operating provisions (6815 net of their reversals 7815) added back.
+
+Each adjustment carries the account-level balances it was computed from.
+Accounts that need judgment (related-party rent, travel, fees, asset
+write-downs, subsidies) are listed as residual items for the LLM, with
+their amounts, instead of being adjusted.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from dexter.fec.accounts import AccountIndex
+from dexter.fec.reader import to_euros
+from dexter.schemas import EBITDAAdjustment
+
+# Fully loaded cost (gross salary + employer contributions) of a hired
+# general manager of a services SME at the baseline geography (index 1.00)
+DEFAULT_MARKET_MANAGER_COST = 110_000.0
+
+# Reported EBITDA: result, plus the net debit of each item below EBITDA
+# (a charge is added back, an income, whose net debit is negative, removed)
+EBITDA_BRIDGE = [
+    ("66", "Charges financières"),
+    ("686", "Dotations financières"),
+    ("76", "Produits financiers"),
+    ("786", "Reprises financières"),
+    ("69", "Participation des salariés, impôts sur les bénéfices"),
+    ("6811-6812", "Dotations aux amortissements d'exploitation"),
+]
+
+OWNER_COMPENSATION_ACCOUNTS = ["644", "646"]
+LEASE_ACCOUNTS = ["612"]
+EXCEPTIONAL_CHARGE_ACCOUNTS = ["67", "687"]
+EXCEPTIONAL_INCOME_ACCOUNTS = ["77", "787"]
+PROVISION_ACCOUNTS = ["6815", "7815"]
+
+# Accounts left to judgment, with the question to settle
+RESIDUAL_ACCOUNTS = {
+    "6132": "Loyers immobiliers : locaux détenus par le dirigeant (SCI) ? loyer vs marché",
+    "6135": "Locations mobilières : véhicules ou biens à usage personnel ?",
+    "6226": "Honoraires : conseils non récurrents (cession, litige, restructuration) ?",
+    "625": "Déplacements, missions et réceptions : dépenses personnelles du dirigeant ?",
+    "6816-6817": "Dépréciations d'actifs et de créances : risque récurrent ou ponctuel ?",
+    "7816-7817": "Reprises de dépréciations : produit non récurrent ?",
+    "74": "Subventions d'exploitation : pérennes après la reprise ?",
+}
+
+# Residual items below this share of revenue are not worth a judgment call
+RESIDUAL_MATERIALITY = 0.005
+
+
+def _accounts(index: AccountIndex, specs: List[str]) -> Tuple[int, List[Dict]]:
+    """Net debit (cents) over the specs and the per-account balances behind it."""
+    total, trail = 0, []
+    for spec in specs:
+        rows = index.select(spec)
+        for account, row in rows.iterrows():
+            net = int(row["Debit"]) - int(row["Credit"])
+            if net == 0:
+                continue
+            total += net
+            trail.append({
+                "account": account,
+                "debit": round(to_euros(int(row["Debit"])), 2),
+                "credit": round(to_euros(int(row["Credit"])), 2),
+                "net_debit": round(to_euros(net), 2),
+            })
+    return total, trail
+
+
+def _source(trail: List[Dict]) -> str:
+    return "FEC " + ", ".join(f"{a['account']} ({a['net_debit']:,.2f} €)" for a in trail)
+
+
+def reported_ebitda(index: AccountIndex) -> Tuple[int, List[Dict]]:
+    """EBITDA (cents) rebuilt from the ledger result, with the bridge lines."""
+    result = int(index.net_credit("7")) - int(index.net_debit("6"))
+    ebitda, bridge = result, [{"label": "Résultat (classe 7 - classe 6)", "accounts": "6, 7", "amount": round(to_euros(result), 2)}]
+    for spec, label in EBITDA_BRIDGE:
+        amount = int(index.net_debit(spec))
+        if amount:
+            ebitda += amount
+            bridge.append({"label": label, "accounts": spec, "amount": round(to_euros(amount), 2)})
+    return ebitda, bridge
+
+
+def normalize_ebitda_from_ledger(
+    index: AccountIndex,
+    cost_index: float = 1.0,
+    market_manager_cost: Optional[float] = None,
+    add_back_credit_bail: bool = True,
+) -> Dict:
+    """
+    Reported EBITDA, the quantified ledger-driven adjustments (EBITDAAdjustment
+    records, each with its account-level audit trail), normalized EBITDA and
+    the residual items that need judgment. Positive adjustments add to EBITDA.
+    """
+    ebitda_cents, bridge = reported_ebitda(index)
+    revenue_cents = int(index.net_credit("70"))
+    adjustments, trails = [], []
+
+    def adjust(category, amount_cents, description, trail, confidence):
+        adjustments.append(EBITDAAdjustment(
+            category=category,
+            amount=round(to_euros(amount_cents), 2),
+            description=description,
+            source=_source(trail),
+            confidence=confidence,
+        ))
+        trails.append(trail)
+
+    # Owner compensation vs the market cost of a hired manager in this geography
+    owner_cents, trail = _accounts(index, OWNER_COMPENSATION_ACCOUNTS)
+    market = (market_manager_cost or DEFAULT_MARKET_MANAGER_COST) * cost_index
+    if owner_cents > 0:
+        excess = owner_cents - round(market * 100)
+        adjust(
+            "Rémunération dirigeant",
+            excess,
+            f"Rémunération et cotisations de l'exploitant {to_euros(owner_cents):,.2f} € vs coût d'un dirigeant "
+            f"salarié au prix du marché {market:,.2f} € (indice géographique {cost_index:.2f})",
+            trail,
+            "Medium",
+        )
+
+    # Crédit-bail: the fee leaves EBITDA once the lease is restated as an asset and a debt
+    lease_cents, trail = _accounts(index, LEASE_ACCOUNTS)
+    if add_back_credit_bail and lease_cents > 0:
+        adjust(
+            "Loyers",
+            lease_cents,
+            f"Redevances de crédit-bail {to_euros(lease_cents):,.2f} € réintégrées (retraitement IFRS 16 : "
+            "amortissement et intérêts sous l'EBITDA, dette de crédit-bail à ajouter à la dette nette, voir restate_leases)",
+            trail,
+            "High",
+        )
+
+    exceptional_cents, trail = _accounts(index, EXCEPTIONAL_CHARGE_ACCOUNTS)
+    if exceptional_cents > 0:
+        adjust(
+            "Non-récurrent",
+            exceptional_cents,
+            f"Charges exceptionnelles (67x, 687) {to_euros(exceptional_cents):,.2f} € neutralisées",
+            trail,
+            "Medium",
+        )
+    income_cents, trail = _accounts(index, EXCEPTIONAL_INCOME_ACCOUNTS)
+    if income_cents < 0:
+        adjust(
+            "Non-récurrent",
+            income_cents,
+            f"Produits exceptionnels (77x, 787) {to_euros(-income_cents):,.2f} € neutralisés",
+            trail,
+            "Medium",
+        )
+
+    # Operating provisions: non-cash, net of the reversals of the year
+    provision_cents, trail = _accounts(index, PROVISION_ACCOUNTS)
+    if provision_cents != 0:
+        adjust(
+            "Provisions",
+            provision_cents,
+            f"Dotations nettes des reprises de provisions d'exploitation (6815 - 7815) "
+            f"{to_euros(provision_cents):,.2f} € réintégrées",
+            trail,
+            "Medium",
+        )
+
+    residual_items = []
+    for spec, question in RESIDUAL_ACCOUNTS.items():
+        amount = int(index.net_debit(spec))
+        if revenue_cents > 0 and abs(amount) >= RESIDUAL_MATERIALITY * revenue_cents:
+            residual_items.append({
+                "accounts": spec,
+                "net_debit": round(to_euros(amount), 2),
+                "pct_of_revenue": round(abs(amount) / revenue_cents * 100, 2),
+                "question": question,
+            })
+
+    normalized_cents = ebitda_cents + sum(round(a.amount * 100) for a in adjustments)
+    return {
+        "ebitda_reported": round(to_euros(ebitda_cents), 2),
+        "ebitda_bridge": bridge,
+        "adjustments": [a.model_dump() for a in adjustments],
+        # Account balances behind each adjustment, same order as `adjustments`
+        "audit_trail": trails,
+        "total_adjustments": round(to_euros(normalized_cents - ebitda_cents), 2),
+        "ebitda_normalized": round(to_euros(normalized_cents), 2),
+        "ebitda_normalized_margin_pct": round(normalized_cents / revenue_cents * 100, 2) if revenue_cents > 0 else None,
+        "market_manager_cost": round(market, 2),
+        "residual_items": residual_items,
+    }
@@ -0,0 +1,270 @@
+"""
+Supplier and customer overlap across the companies of a portfolio.
+
+Every company's 401 and 411 sub-ledgers are reduced to one profile per
+counterparty (CompAuxNum/CompAuxLib, invoiced amount, invoice count). The
+index matches the same supplier or customer across companies without
+comparing every pair of names:
+
+- names are normalized (accents, punctuation and legal forms removed) and
+  split into tokens stemmed to their first STEM_LENGTH letters, each token
+  hashed to a uint64;
+- the tokens shared by at most MAX_BLOCK_SIZE names are the blocking keys:
+  only names sharing one become candidate pairs, through a self-join of the
+  (name, token) table;
+- a candidate pair matches when the Jaccard similarity of its token sets
+  reaches JACCARD_THRESHOLD, or when the shorter name (two tokens or more)
+  is contained in the longer one. Names with the same normalized form or
+  the same SIREN match directly.
+
+Matches are merged into counterparties by connected components. The cost
+grows with the number of distinct names and the size of the blocks, not
+with the square of the portfolio.
+"""
+
+from typing import Dict, Optional
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+
+from dexter.fec.consolidation import find_siren
+from dexter.fec.daily import DEFAULT_VAT_RATE
+from dexter.fec.lettrage import LETTRAGE_LEDGERS, ledger_lines
+from dexter.fec.reader import to_euros
+
+# FEC columns the overlap index reads
+OVERLAP_COLUMNS = ["EcritureDate", "CompteNum", "CompAuxNum", "CompAuxLib", "Debit", "Credit"]
+
+# Words that do not identify a company
+LEGAL_FORMS = {
+    "SA", "SAS", "SASU", "SARL", "EURL", "SNC", "SCI", "SCP", "SCOP", "SELARL", "SELAS", "GIE", "EI",
+    "STE", "SOCIETE", "ETS", "ETABLISSEMENTS", "CIE", "ET", "DE", "DU", "DES", "LA", "LE", "LES", "L", "D",
+}
+
+# Tokens are compared on their first letters (TRANSPORTS ~ TRANSPORT, INTERNATIONAL ~ INTERNAT.)
+STEM_LENGTH = 6
+
+# Tokens shared by more names than this are too common to be blocking keys
+MAX_BLOCK_SIZE = 50
+
+# Token-set similarity above which two names are the same counterparty
+JACCARD_THRESHOLD = 0.6
+
+# Share of the spend shared with another company that joint purchasing saves
+PURCHASING_SAVINGS_RATE = 0.03
+
+# Average invoices this dispersed between companies point to price gaps to renegotiate
+DISPERSION_CV = 0.5
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9A-Z]+")
+
+
+def normalize_name(label: str) -> str:
+    """Upper case ASCII tokens, legal forms and stop words removed: 'Sté Dupont & Fils SARL' -> 'DUPONT FILS'."""
+    text = unicodedata.normalize("NFKD", str(label)).encode("ascii", "ignore").decode().upper()
+    return " ".join(t for t in _NON_ALPHANUMERIC.split(text) if t and t not in LEGAL_FORMS)
+
+
+def counterparty_spend(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per 401 supplier and 411 client of a normalized ledger: side,
+    code, label, invoiced amount (VAT included, cents) and invoice count.
+    """
+    profiles = []
+    for side in LETTRAGE_LEDGERS:
+        lines, counterparties = ledger_lines(df, side)
+        invoices = lines[lines["amount"] > 0]
+        n = len(counterparties)
+        profiles.append(pd.DataFrame({
+            "side": side,
+            "id": counterparties["id"].to_numpy(dtype=object),
+            "label": counterparties["label"].to_numpy(dtype=object),
+            "spend": np.bincount(invoices["cp"], weights=invoices["amount"], minlength=n).round().astype(np.int64),
+            "n_invoices": np.bincount(invoices["cp"], minlength=n),
+        }))
+    profiles = pd.concat(profiles, ignore_index=True)
+    return profiles[profiles["n_invoices"] > 0].reset_index(drop=True)
+
+
+def _on_distinct(values: pd.Series, func) -> np.ndarray:
+    """func applied once per distinct value, mapped back to every row (object array)."""
+    codes, distinct = pd.factorize(values)
+    return np.array([func(v) for v in distinct] + [None], dtype=object)[codes]
+
+
+def _components(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Connected component (smallest member) of each of n nodes linked by the edges (left, right)."""
+    labels = np.arange(n)
+    while True:
+        smallest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, smallest)
+        np.minimum.at(updated, right, smallest)
+        updated = updated[updated]  # pointer jumping
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def match_names(names: pd.Series) -> np.ndarray:
+    """
+    Cluster of each distinct normalized name: names sharing a rare token are
+    compared on their hashed token sets, the matching pairs merged.
+    """
+    n = len(names)
+    tokens = names.str.split().explode().dropna()
+    tokens = tokens[tokens != ""]
+    name_id = tokens.index.to_numpy()
+    hashes = pd.util.hash_array(tokens.str[:STEM_LENGTH].to_numpy(dtype=object))
+    token_id = pd.factorize(hashes)[0]
+    pairs = pd.DataFrame({"name": name_id, "token": token_id}).drop_duplicates()
+    n_tokens = np.bincount(pairs["name"], minlength=n)
+
+    # Blocking: self-join on the tokens rare enough to be discriminant
+    block_size = np.bincount(pairs["token"])
+    blocks = pairs[block_size[pairs["token"].to_numpy()] <= MAX_BLOCK_SIZE]
+    candidates = blocks.merge(blocks, on="token", suffixes=("", "_other"))
+    candidates = candidates.loc[candidates["name"] < candidates["name_other"], ["name", "name_other"]].drop_duplicates()
+    if candidates.empty:
+        return np.arange(n)
+
+    # Shared tokens of each candidate pair, frequent ones included
+    left, right = candidates["name"].to_numpy(), candidates["name_other"].to_numpy()
+    n_distinct = int(pairs["token"].max()) + 1
+    known = np.sort(pairs["name"].to_numpy() * n_distinct + pairs["token"].to_numpy())
+    by_name = pairs.sort_values("name", kind="stable")
+    offsets = np.r_[0, np.cumsum(np.bincount(by_name["name"], minlength=n))]
+    count = n_tokens[left]
+    pair_of = np.repeat(np.arange(len(left)), count)
+    position = offsets[left].repeat(count) + (np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count))
+    probe = right[pair_of] * n_distinct + by_name["token"].to_numpy()[position]
+    found = known[np.minimum(np.searchsorted(known, probe), len(known) - 1)] == probe
+    shared = np.bincount(pair_of, weights=found, minlength=len(left))
+
+    smaller = np.minimum(n_tokens[left], n_tokens[right])
+    jaccard = shared / (n_tokens[left] + n_tokens[right] - shared)
+    contained = (smaller >= 2) & (shared == smaller)
+    match = (jaccard >= JACCARD_THRESHOLD) | contained
+    return _components(n, left[match], right[match])
+
+
+class CounterpartyIndex:
+    """Suppliers and clients of several companies, matched across companies."""
+
+    def __init__(self):
+        self.profiles = pd.DataFrame(columns=["company", "side", "id", "label", "spend", "n_invoices"])
+        self._clusters: Optional[np.ndarray] = None
+
+    def add(self, company: str, profiles: pd.DataFrame) -> "CounterpartyIndex":
+        """Adds (or replaces) the counterparty profiles of one company."""
+        kept = self.profiles[self.profiles["company"] != company]
+        added = profiles.assign(company=company)
+        self.profiles = pd.concat([kept, added], ignore_index=True) if len(kept) else added.reset_index(drop=True)
+        self._clusters = None
+        return self
+
+    def clusters(self) -> np.ndarray:
+        """Counterparty cluster of every profile, suppliers and clients matched separately."""
+        if self._clusters is None:
+            self._clusters = self._match()
+        return self._clusters
+
+    def _match(self) -> np.ndarray:
+        profiles = self.profiles
+        label = profiles["label"].fillna("").astype(str)
+        normalized = _on_distinct(label, normalize_name)
+        # Without a label (or one made of legal forms only) a counterparty
+        # stays on its own: codes are not shared between companies
+        owner = np.where(normalized == "", profiles["company"].astype(str) + "/" + profiles["id"].astype(str), "")
+        name_code, keys = pd.factorize(pd.MultiIndex.from_arrays([profiles["side"], normalized, owner]))
+        sides = keys.get_level_values(0).to_numpy(dtype=object)
+        names = pd.Series(keys.get_level_values(1).to_numpy(dtype=object))
+
+        # Fuzzy matches within each side, as edges between distinct names
+        left, right = [np.arange(len(names))], [np.arange(len(names))]
+        for side in np.unique(sides):
+            members = np.flatnonzero(sides == side)
+            left.append(members)
+            right.append(members[match_names(names[members].reset_index(drop=True))])
+
+        # Same side and SIREN (in the code or the label): same counterparty
+        siren = _on_distinct(profiles["id"].astype(str), find_siren)
+        siren = np.where(pd.notna(siren), siren, _on_distinct(label, find_siren))
+        known = pd.notna(siren)
+        if known.any():
+            sided = pd.factorize(pd.MultiIndex.from_arrays([profiles["side"][known], siren[known]]))[0]
+            left.append(name_code[known])
+            right.append(pd.Series(name_code[known]).groupby(sided).transform("first").to_numpy())
+
+        return _components(len(names), np.concatenate(left), np.concatenate(right))[name_code]
+
+    def overlap(self, side: str, top_n: int = 20) -> Dict:
+        """
+        Counterparties of `side` shared by several companies: combined
+        invoiced amount, split by company and the dispersion of the average
+        invoice between companies.
+        """
+        clusters = self.clusters()
+        rows = (self.profiles["side"] == side).to_numpy()
+        profiles = self.profiles[rows].assign(cluster=clusters[rows])
+        if profiles.empty:
+            return {"n_companies": 0, "n_counterparties": 0, "shared": []}
+
+        by_company = profiles.groupby(["cluster", "company"]).agg(
+            spend=("spend", "sum"), n_invoices=("n_invoices", "sum"), label=("label", "first")
+        ).reset_index()
+        n_companies = by_company.groupby("cluster")["company"].transform("size")
+        shared = by_company[n_companies >= 2]
+        total = int(profiles["spend"].sum())
+        shared_spend = int(shared["spend"].sum())
+
+        average = shared["spend"] / shared["n_invoices"]
+        stats = pd.DataFrame({"cluster": shared["cluster"], "average": average}).groupby("cluster")["average"].agg(["mean", "std"])
+        combined = shared.groupby("cluster")["spend"].sum().sort_values(ascending=False, kind="stable")
+        # Name of a counterparty: label (else code) of its largest profile
+        largest = profiles.sort_values("spend", ascending=False, kind="stable").drop_duplicates("cluster")
+        names = largest["label"].where(largest["label"].notna(), largest["id"]).set_axis(largest["cluster"])
+
+        top = []
+        for cluster in combined.index[:top_n]:
+            detail = shared[shared["cluster"] == cluster]
+            top.append({
+                "name": names[cluster],
+                "n_companies": len(detail),
+                "combined_spend": round(to_euros(int(combined[cluster])), 2),
+                "by_company": {
+                    row.company: {
+                        "spend": round(to_euros(int(row.spend)), 2),
+                        "n_invoices": int(row.n_invoices),
+                        "average_invoice": round(to_euros(row.spend / row.n_invoices), 2),
+                    }
+                    for row in detail.itertuples()
+                },
+                # Coefficient of variation of the average invoice between companies
+                "average_invoice_cv": round(float(stats.at[cluster, "std"] / stats.at[cluster, "mean"]), 3),
+            })
+        return {
+            "n_companies": int(profiles["company"].nunique()),
+            "n_counterparties": int(profiles["cluster"].nunique()),
+            "n_shared": int(combined.size),
+            "total_spend": round(to_euros(total), 2),
+            "shared_spend": round(to_euros(shared_spend), 2),
+            "shared_spend_pct": round(shared_spend / total * 100, 1) if total > 0 else 0.0,
+            "shared": top,
+        }
+
+
+def overlap_report(index: CounterpartyIndex, top_n: int = 20, savings_rate: float = PURCHASING_SAVINGS_RATE) -> Dict:
+    """
+    Shared suppliers and clients of the indexed companies, and the yearly
+    savings of buying the shared supplier spend (VAT excluded) jointly.
+    """
+    suppliers = index.overlap("suppliers", top_n=top_n)
+    clients = index.overlap("clients", top_n=top_n)
+    return {
+        "suppliers": suppliers,
+        "clients": clients,
+        "purchasing_savings": round(suppliers.get("shared_spend", 0.0) / (1 + DEFAULT_VAT_RATE) * savings_rate, 2),
+        "savings_rate_pct": round(savings_rate * 100, 2),
+    }
@@ -0,0 +1,367 @@
+"""
+FEC (Fichier des Écritures Comptables) parsing.
+
+Turns the raw text export into normalized pandas frames: stripped column
+names, Debit/Credit as int64 cents, dates as int32 day ordinals and
+categorical codes/labels. Supports both a full in-memory load and a chunked
+iterator for multi-GB ledgers.
+
+Frames are compact: account, journal and counterparty columns are
+dictionary-encoded (pandas categoricals), so a label repeated on a million
+lines is stored once. Pass `columns` to load only what an analysis reads;
+free-text columns (EcritureLib, PieceRef...) are then never tokenized.
+
+The separator, encoding and decimal convention are sniffed from the first
+bytes of the file, so the ledger itself is parsed exactly once.
+
+Amounts stay exact integers (cents) through every aggregation; convert with
+to_euros only when presenting a result.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+import codecs
+import io
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# FEC should have at least 10 columns (Article A47 A-1 lists 18)
+MIN_FEC_COLUMNS = 10
+
+DEFAULT_SEPARATORS = ["|", ";", "\t"]
+
+AMOUNT_COLUMNS = ("Debit", "Credit")
+
+FEC_DATE_COLUMNS = ("EcritureDate", "PieceDate", "DateLet", "ValidDate")
+
+# Low-cardinality columns loaded as categoricals
+CATEGORICAL_COLUMNS = (
+    "JournalCode", "JournalLib", "CompteNum", "CompteLib", "CompAuxNum", "CompAuxLib", "EcritureLet", "Idevise",
+)
+
+# Day ordinals: days since 1970-01-01 (int32), MISSING_DAY when absent or invalid
+MISSING_DAY = np.iinfo(np.int32).min
+
+# Official FEC file name (article A47 A-1 LPF): <SIREN>FEC<closing date YYYYMMDD>
+FEC_FILENAME = re.compile(r"^(\d{9})FEC(\d{8})", re.IGNORECASE)
+
+# Bytes inspected by the sniffer: header plus a few hundred lines
+SNIFF_SAMPLE_BYTES = 64 * 1024
+
+CENTS_PER_EURO = 100
+
+# Rows converted at once by parse_amount_cents (bounds the code-point matrix)
+AMOUNT_PARSE_BLOCK = 1_000_000
+
+# Byte classes of amount characters (after folding non-ASCII to 127 or a space)
+_ALLOWED = np.zeros(256, dtype=bool)
+_ALLOWED[[ord(c) for c in "0123456789,.-+ "]] = True
+_ALLOWED[0] = True  # numpy's fixed-width padding
+_IS_SIGN = np.zeros(256, dtype=bool)
+_IS_SIGN[[ord("-"), ord("+")]] = True
+_GROUPING_SPACES = [0xA0, 0x202F]  # non-breaking spaces used as thousands separators
+
+# Place value of a digit, indexed by its power of ten plus 1 (index 0 = ignored digit)
+_PLACE_VALUES = np.array([0] + [10 ** k for k in range(19)], dtype=np.int64)
+
+# Bytes 0x80-0x9F are printable in cp1252 (€, œ, ’...) but C1 controls in latin-1;
+# these five are undefined in cp1252
+CP1252_UNDEFINED = {0x81, 0x8D, 0x8F, 0x90, 0x9D}
+
+
+class FECParseError(ValueError):
+    """Raised when no separator yields a valid FEC layout."""
+
+    def __init__(self, tried_separators: List[str], encoding: str):
+        super().__init__("Could not parse FEC file. Try different encoding or separator.")
+        self.tried_separators = tried_separators
+        self.encoding = encoding
+
+
+def parse_fec_filename(fec_path: str) -> Optional[Dict]:
+    """SIREN and closing date of an officially named FEC file, else None."""
+    match = FEC_FILENAME.match(os.path.basename(fec_path))
+    if not match:
+        return None
+    closing = pd.to_datetime(match.group(2), format="%Y%m%d", errors="coerce")
+    return {"siren": match.group(1), "closing_date": closing if pd.notna(closing) else None}
+
+
+def candidate_separators(separator: str) -> List[str]:
+    """Requested separator first, then the usual FEC separators."""
+    return [separator] + [sep for sep in DEFAULT_SEPARATORS if sep != separator]
+
+
+class FECFormat:
+    """Layout of a FEC file as detected by sniff_fec_format (columns are raw header names)."""
+
+    def __init__(self, encoding: str, separator: str, decimal: str, columns: List[str]):
+        self.encoding = encoding
+        self.separator = separator
+        self.decimal = decimal
+        self.columns = columns
+
+    def __repr__(self):
+        return f"FECFormat(encoding={self.encoding!r}, separator={self.separator!r}, decimal={self.decimal!r})"
+
+
+def _sniff_encoding(sample: bytes, encoding_hint: str) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.isascii():
+        # Pure ASCII decodes identically everywhere
+        return encoding_hint
+    try:
+        # Ignore a multi-byte character cut by the end of the sample
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 3:
+            high = {b for b in set(sample) if b >= 0x80}
+            if high & set(range(0x80, 0xA0)) and not high & CP1252_UNDEFINED:
+                return "cp1252"
+            hint = encoding_hint.lower().replace("_", "-")
+            return "cp1252" if hint in ("cp1252", "windows-1252") else "latin-1"
+        return "utf-8"
+
+
+def _sniff_decimal(rows: List[List[str]], columns: List[str]) -> str:
+    amount_idx = [i for i, col in enumerate(columns) if col.strip() in AMOUNT_COLUMNS]
+    for row in rows:
+        for i in amount_idx:
+            if i < len(row):
+                if "," in row[i]:
+                    return ","
+                if "." in row[i]:
+                    return "."
+    return ","
+
+
+def sniff_fec_format(fec_path: str, encoding: str = "latin-1", separator: str = "|") -> FECFormat:
+    """
+    Detects separator, encoding and decimal mark from the header and a
+    sample of lines, without parsing the whole file.
+
+    The requested separator wins when it yields a valid FEC layout; the
+    requested encoding is only used when the sample cannot tell (pure ASCII,
+    or latin-1 vs cp1252 without any 0x80-0x9F byte).
+    """
+    with open(fec_path, "rb") as f:
+        sample = f.read(SNIFF_SAMPLE_BYTES)
+        truncated = bool(f.read(1))
+
+    detected_encoding = _sniff_encoding(sample, encoding)
+    lines = sample.decode(detected_encoding, errors="replace").splitlines()
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]  # last line may be cut
+    lines = [line for line in lines if line.strip()]
+
+    separators_to_try = candidate_separators(separator)
+    if not lines:
+        raise FECParseError(separators_to_try, detected_encoding)
+
+    header, body = lines[0], lines[1:]
+    for sep in separators_to_try:
+        n_columns = header.count(sep) + 1
+        if n_columns < MIN_FEC_COLUMNS:
+            continue
+        rows = [line.split(sep) for line in body]
+        # Most data lines must agree with the header width (quoted fields aside)
+        if rows and sum(len(row) == n_columns for row in rows) < len(rows) / 2:
+            continue
+        columns = header.split(sep)
+        return FECFormat(detected_encoding, sep, _sniff_decimal(rows, columns), columns)
+
+    raise FECParseError(separators_to_try, detected_encoding)
+
+
+def day_ordinals(values: pd.Series) -> np.ndarray:
+    """
+    YYYYMMDD strings to int32 day ordinals. Only the distinct values are
+    parsed (a 5-year ledger has under 2,000 of them).
+    """
+    categorical = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    parsed = pd.to_datetime(pd.Series(categorical.cat.categories, dtype=object), format="%Y%m%d", errors="coerce")
+    days = parsed.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+    # Code -1 (missing value) reads the trailing MISSING_DAY
+    lookup = np.append(np.where(parsed.isna().to_numpy(), MISSING_DAY, days), MISSING_DAY).astype(np.int32)
+    return lookup[categorical.cat.codes.to_numpy()]
+
+
+def to_timestamp(day) -> Optional[pd.Timestamp]:
+    """Presentation helper: day ordinal to Timestamp (None for MISSING_DAY)."""
+    return None if day == MISSING_DAY else pd.Timestamp(np.datetime64(int(day), "D"))
+
+
+def day_range(days: np.ndarray):
+    """First and last dated day as Timestamps, (None, None) if no line is dated."""
+    dated = days[days != MISSING_DAY]
+    if not len(dated):
+        return None, None
+    return to_timestamp(dated.min()), to_timestamp(dated.max())
+
+
+def to_euros(cents):
+    """Presentation helper: cents (int or array) to euros."""
+    return cents / CENTS_PER_EURO
+
+
+def _parse_cents_block(text: np.ndarray) -> np.ndarray:
+    """int64 cents from a fixed-width unicode array, as matrix operations over code points."""
+    n, width = len(text), text.dtype.itemsize // 4
+    if width == 0:
+        return np.zeros(n, dtype=np.int64)
+    wide = text.view(np.uint32).reshape(n, width)
+    codes = wide.astype(np.uint8)
+    non_ascii = wide > 127
+    if non_ascii.any():
+        codes[non_ascii] = np.where(np.isin(wide[non_ascii], _GROUPING_SPACES), ord(" "), 127)
+
+    digits = codes - np.uint8(ord("0"))  # wraps around for non-digits
+    is_digit = digits < 10
+
+    # The last ',' or '.' is the decimal mark; earlier ones group thousands
+    is_mark = (codes == ord(",")) | (codes == ord("."))
+    has_mark = is_mark.any(axis=1)
+    last_mark = np.where(has_mark, width - 1 - is_mark[:, ::-1].argmax(axis=1), width)
+    fractional = is_digit & (np.arange(width) > last_mark[:, None])
+    integral = is_digit & ~fractional
+
+    # Power of ten of each digit in cents: integer digits count from the
+    # right starting at 10^2, fractional ones are 10^1, 10^0, then dropped
+    int_power = np.cumsum(integral[:, ::-1], axis=1, dtype=np.int16)[:, ::-1] + 1
+    frac_rank = np.cumsum(fractional, axis=1, dtype=np.int16)
+    power = np.where(integral, int_power, np.where(fractional & (frac_rank <= 2), 2 - frac_rank, -1))
+    cents = (digits * _PLACE_VALUES[power + 1]).sum(axis=1)
+    # Third decimal rounds half away from zero
+    cents += (fractional & (frac_rank == 3) & (digits >= 5)).any(axis=1)
+
+    # At most one sign, ahead of every digit and mark ("12-3" is not an amount)
+    is_sign = _IS_SIGN[codes]
+    has_sign = is_sign.any(axis=1)
+    leading_sign = is_sign.argmax(axis=1) < (is_digit | is_mark).argmax(axis=1)
+    valid = (
+        _ALLOWED[codes].all(axis=1) & is_digit.any(axis=1) & (is_sign.sum(axis=1) <= 1) & (~has_sign | leading_sign)
+    )
+    negative = (codes == ord("-")).any(axis=1)
+    return np.where(valid, np.where(negative, -cents, cents), 0)
+
+
+def parse_amount_cents(values: pd.Series) -> np.ndarray:
+    """
+    Parses FEC amounts ("1234,56", "-12,5", "1 234.56", "") into int64 cents
+    without a Python-level operation per cell. Unparseable values become 0,
+    like the former to_numeric(errors='coerce').fillna(0).
+
+    Fallback for amount columns the CSV parser could not type as floats.
+    """
+    cents = np.zeros(len(values), dtype=np.int64)
+    for start in range(0, len(values), AMOUNT_PARSE_BLOCK):
+        block = values.iloc[start:start + AMOUNT_PARSE_BLOCK].fillna("").to_numpy(dtype=str)
+        cents[start:start + len(block)] = _parse_cents_block(block)
+    return cents
+
+
+def normalize_fec_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip column names, convert amounts to int64 cents and dates to day ordinals."""
+    # Standardize column names (some FEC files have different casing)
+    df.columns = [col.strip() for col in df.columns]
+
+    # Convert amounts to exact integer cents
+    for col in AMOUNT_COLUMNS:
+        if col in df.columns:
+            if pd.api.types.is_float_dtype(df[col]):
+                # Exact for any 2-decimal amount below ~10^13 EUR: the parsed
+                # double is within far less than half a cent of the value
+                df[col] = np.rint(df[col].fillna(0).to_numpy() * CENTS_PER_EURO).astype(np.int64)
+            else:
+                df[col] = parse_amount_cents(df[col])
+
+    # Convert dates to day ordinals
+    for col in FEC_DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = day_ordinals(df[col])
+
+    return df
+
+
+def _csv_options(fmt: FECFormat, typed_amounts: bool, columns: Optional[List[str]] = None) -> Dict:
+    """
+    read_csv arguments: codes, labels and dates as categoricals, amounts as
+    float64 if `typed_amounts`, other columns as strings, and only the given
+    (stripped) `columns` if any.
+    """
+    dtype = defaultdict(lambda: str)  # Read all as string first
+    for col in fmt.columns:
+        name = col.strip()
+        if name in CATEGORICAL_COLUMNS or name in FEC_DATE_COLUMNS:
+            dtype[col] = "category"
+        elif typed_amounts and name in AMOUNT_COLUMNS:
+            # The C parser handles the decimal mark, so amount cells never become Python strings
+            dtype[col] = "float64"
+    options = {"sep": fmt.separator, "encoding": fmt.encoding, "dtype": dtype, "decimal": fmt.decimal}
+    if columns is not None:
+        wanted = set(columns)
+        # Columns missing from the file are simply absent from the frame
+        options["usecols"] = [col for col in fmt.columns if col.strip() in wanted]
+    return options
+
+
+def load_fec(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Loads a whole FEC into memory as a normalized DataFrame. Pass `columns`
+    to tokenize only the columns an analysis needs.
+
+    Raises FECParseError if no separator gives at least MIN_FEC_COLUMNS columns.
+    """
+    fmt = sniff_fec_format(fec_path, encoding=encoding, separator=separator)
+    return _read_normalized(lambda: fec_path, fmt, columns)
+
+
+def parse_fec_bytes(data: bytes, fmt: FECFormat, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Parses FEC text already in memory (header line included) with a known format."""
+    return _read_normalized(lambda: io.BytesIO(data), fmt, columns)
+
+
+def _read_normalized(source, fmt: FECFormat, columns: Optional[List[str]]) -> pd.DataFrame:
+    # Explicit dtypes: the parser can work by blocks (low_memory) without
+    # mixed-type inference, and categories are merged across blocks
+    try:
+        df = pd.read_csv(source(), **_csv_options(fmt, True, columns))
+    except ValueError:
+        # Some amount is not a plain number (thousands separator, stray text)
+        df = pd.read_csv(source(), **_csv_options(fmt, False, columns))
+    return normalize_fec_frame(df)
+
+
+def iter_fec_chunks(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    chunksize: int = 500_000,
+    columns: Optional[List[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yields normalized FEC batches of at most `chunksize` lines."""
+    fmt = sniff_fec_format(fec_path, encoding=encoding, separator=separator)
+    yielded = 0
+    try:
+        with pd.read_csv(fec_path, chunksize=chunksize, **_csv_options(fmt, True, columns)) as reader:
+            for chunk in reader:
+                yield normalize_fec_frame(chunk)
+                yielded += 1
+        return
+    except ValueError:
+        pass
+
+    # Untyped amounts from the first batch that failed to parse
+    with pd.read_csv(fec_path, chunksize=chunksize, **_csv_options(fmt, False, columns)) as reader:
+        for i, chunk in enumerate(reader):
+            if i >= yielded:
+                yield normalize_fec_frame(chunk)
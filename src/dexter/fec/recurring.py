@@ -0,0 +1,219 @@
+"""
+Recurring revenue detection from the invoicing pattern of each client.
+
+Client invoices (411 debits) are summed into a client x month matrix. In
+that matrix, a client is billed:
+
+- periodically when most gaps between its invoiced months match a
+  contract period (monthly, quarterly, annual);
+- at a stable amount when the coefficient of variation of its monthly
+  amounts is low.
+
+Periodic, stable clients are recurring. Their share of the last twelve
+months of invoicing is the recurring revenue share. The same matrix summed
+by calendar year gives client retention and the cohorts (clients grouped
+by year of first invoice). Every step works on the whole matrix with numpy
+(nonzero, diff, bincount, reduceat), never client by client.
+
+Amounts are VAT-inclusive invoice amounts in int64 cents. Credit notes
+cannot be told apart from settlements on 411 and are left out.
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from dexter.fec.lettrage import ledger_lines
+from dexter.fec.reader import to_euros
+
+# FEC columns the detector reads
+RECURRING_COLUMNS = ["EcritureDate", "CompteNum", "CompAuxNum", "CompAuxLib", "Debit", "Credit"]
+
+# Contract periods, in priority order: gap between invoiced months, tolerance
+# on that gap, and minimum number of invoiced months to call it a contract
+PERIODICITIES = {
+    "monthly": {"months": 1, "tolerance": 0, "min_months": 6},
+    "quarterly": {"months": 3, "tolerance": 1, "min_months": 3},
+    "annual": {"months": 12, "tolerance": 1, "min_months": 2},
+}
+
+# Share of a client's gaps that must match the period
+REGULARITY_THRESHOLD = 0.8
+
+# Maximum coefficient of variation of the monthly amounts of a stable client
+STABILITY_MAX_CV = 0.25
+
+# Window of the recurring revenue share, in months up to the last invoice
+RECURRING_WINDOW_MONTHS = 12
+
+
+def month_index(days: np.ndarray) -> np.ndarray:
+    """Months since January 1970 of day ordinals."""
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def client_month_matrix(invoices: pd.DataFrame, n_clients: int) -> Tuple[np.ndarray, int]:
+    """
+    Invoiced cents per client (rows, ledger_lines codes) and month (columns,
+    from the first invoiced month). Returns the matrix and its first month.
+    """
+    months = month_index(invoices["day"].to_numpy())
+    first = int(months.min())
+    n_months = int(months.max()) - first + 1
+    cells = invoices["cp"].to_numpy() * n_months + (months - first)
+    # float64 sums of integer cents stay exact up to 2**53 (90 billion euros)
+    sums = np.bincount(cells, weights=invoices["amount"].to_numpy(), minlength=n_clients * n_months)
+    return sums.round().astype(np.int64).reshape(n_clients, n_months), first
+
+
+def periodicity(matrix: np.ndarray) -> np.ndarray:
+    """
+    Index into PERIODICITIES of each client's invoicing period, -1 when no
+    period fits. Gaps are read from the non-zero cells of the matrix.
+    """
+    n_clients = matrix.shape[0]
+    rows, cols = np.nonzero(matrix > 0)  # row-major: sorted by client, then month
+    n_months = np.bincount(rows, minlength=n_clients)
+    same_client = rows[1:] == rows[:-1]
+    gap_rows = rows[1:][same_client]
+    gaps = np.diff(cols)[same_client]
+    n_gaps = np.maximum(n_months - 1, 1)
+
+    period = np.full(n_clients, -1, dtype=np.int64)
+    for i, spec in enumerate(PERIODICITIES.values()):
+        hits = np.bincount(gap_rows, weights=np.abs(gaps - spec["months"]) <= spec["tolerance"], minlength=n_clients)
+        regular = (n_months >= spec["min_months"]) & (hits >= REGULARITY_THRESHOLD * n_gaps)
+        period[(period < 0) & regular] = i
+    return period
+
+
+def amount_variation(matrix: np.ndarray) -> np.ndarray:
+    """Coefficient of variation of each client's invoiced months (NaN for clients never invoiced)."""
+    rows, cols = np.nonzero(matrix > 0)
+    values = matrix[rows, cols].astype(np.float64)
+    n = np.bincount(rows, minlength=matrix.shape[0]).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(rows, weights=values, minlength=matrix.shape[0]) / n
+        square = np.bincount(rows, weights=values ** 2, minlength=matrix.shape[0]) / n
+        return np.sqrt(np.maximum(square - mean ** 2, 0)) / mean
+
+
+def yearly_matrix(matrix: np.ndarray, first_month: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Matrix summed by calendar year, and the years of its columns."""
+    months = first_month + np.arange(matrix.shape[1])
+    years = months // 12 + 1970
+    starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    return np.add.reduceat(matrix, starts, axis=1), years[starts]
+
+
+def cohort_table(yearly: np.ndarray, years: np.ndarray) -> List[Dict]:
+    """
+    Clients grouped by year of first invoice: size, share still invoiced and
+    revenue kept (vs the cohort's first year) in every following year.
+    """
+    active = yearly > 0
+    invoiced = active.any(axis=1)
+    cohort = active.argmax(axis=1)[invoiced]
+    active, yearly = active[invoiced], yearly[invoiced]
+    n_years = len(years)
+
+    rows, cols = np.nonzero(active)
+    cells = cohort[rows] * n_years + cols
+    clients = np.bincount(cells, minlength=n_years * n_years).reshape(n_years, n_years)
+    revenue = np.bincount(cells, weights=yearly[rows, cols], minlength=n_years * n_years).reshape(n_years, n_years)
+
+    table = []
+    for c, year in enumerate(years):
+        size, base = clients[c, c], revenue[c, c]
+        if size == 0:
+            continue
+        table.append({
+            "cohort": int(year),
+            # Clients of the first year of the ledger may have started earlier
+            "left_censored": c == 0,
+            "clients": int(size),
+            "revenue": round(to_euros(float(base)), 2),
+            "client_retention_pct": {str(years[y]): round(float(clients[c, y] / size * 100), 1) for y in range(c + 1, n_years)},
+            "revenue_retention_pct": {
+                str(years[y]): round(float(revenue[c, y] / base * 100), 1) for y in range(c + 1, n_years)
+            } if base > 0 else {},
+        })
+    return table
+
+
+def recurring_revenue_score(recurring_pct: float) -> int:
+    """Pillar 2 score: 10 at 90%+ recurring revenue, 5 at 50%, 0 when fully transactional."""
+    return int(min(recurring_pct, 90) // 9)
+
+
+def recurring_report(df: pd.DataFrame, top_n: int = 10) -> Dict:
+    """
+    Invoicing periodicity and amount stability of every client of a
+    normalized ledger, the recurring share of the last twelve months of
+    invoicing, client retention by year, cohorts and the pillar 2 score.
+    """
+    lines, counterparties = ledger_lines(df, "clients")
+    invoices = lines[lines["amount"] > 0]
+    if invoices.empty:
+        return {"n_clients": 0, "score": 0, "note": "Aucune facture client (débit 411) dans le FEC"}
+
+    matrix, first_month = client_month_matrix(invoices, len(counterparties))
+    period = periodicity(matrix)
+    variation = amount_variation(matrix)
+    recurring = (period >= 0) & (variation <= STABILITY_MAX_CV)
+
+    # Recurring share over the last twelve months (or the whole ledger if shorter)
+    window = matrix[:, -RECURRING_WINDOW_MONTHS:].sum(axis=1)
+    window_total = int(window.sum())
+    recurring_total = int(window[recurring].sum())
+    recurring_pct = round(recurring_total / window_total * 100, 1) if window_total > 0 else 0.0
+    periodic_unstable = (period >= 0) & ~recurring
+
+    by_periodicity = {}
+    for i, name in enumerate(PERIODICITIES):
+        clients = recurring & (period == i)
+        by_periodicity[name] = {
+            "clients": int(clients.sum()),
+            "revenue_12m": round(to_euros(int(window[clients].sum())), 2),
+            "share_pct": round(float(window[clients].sum() / window_total * 100), 1) if window_total > 0 else 0.0,
+        }
+
+    yearly, years = yearly_matrix(matrix, first_month)
+    active = yearly > 0
+    kept = (active[:, :-1] & active[:, 1:]).sum(axis=0)
+    previous = active[:, :-1].sum(axis=0)
+    retention = {str(years[y + 1]): round(float(kept[y] / previous[y] * 100), 1) for y in range(len(years) - 1) if previous[y] > 0}
+
+    names = list(PERIODICITIES)
+    top = np.flatnonzero(recurring)
+    top = top[np.argsort(-window[top], kind="stable")][:top_n]
+    last_month = first_month + matrix.shape[1] - 1
+
+    return {
+        "period": {
+            "start": f"{first_month // 12 + 1970}-{first_month % 12 + 1:02d}",
+            "end": f"{last_month // 12 + 1970}-{last_month % 12 + 1:02d}",
+            "n_months": int(matrix.shape[1]),
+        },
+        "n_clients": int((matrix > 0).any(axis=1).sum()),
+        "invoiced_12m": round(to_euros(window_total), 2),
+        "recurring_revenue_12m": round(to_euros(recurring_total), 2),
+        "recurring_revenue_pct": recurring_pct,
+        "recurring_clients": int(recurring.sum()),
+        "by_periodicity": by_periodicity,
+        # Contract-like billing rhythm but amounts too irregular to be counted
+        "periodic_unstable_pct": round(float(window[periodic_unstable].sum() / window_total * 100), 1) if window_total > 0 else 0.0,
+        "client_retention_pct": retention,
+        "cohorts": cohort_table(yearly, years),
+        "top_recurring_clients": [
+            {
+                "id": counterparties.at[c, "id"],
+                "label": counterparties.at[c, "label"] if pd.notna(counterparties.at[c, "label"]) else None,
+                "periodicity": names[period[c]],
+                "revenue_12m": round(to_euros(int(window[c])), 2),
+                "amount_cv": round(float(variation[c]), 3),
+            }
+            for c in top
+        ],
+        "score": recurring_revenue_score(recurring_pct),
+    }
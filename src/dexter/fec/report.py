@@ -0,0 +1,189 @@
+"""
+FEC due diligence report.
+
+Builds the `read_fec` output dict from LedgerAggregates, so the same report
+comes out whether the ledger was loaded in one piece or streamed in batches.
+"""
+
+from typing import Dict
+import pandas as pd
+
+from dexter.fec.accounts import AccountIndex
+from dexter.fec.aggregates import LedgerAggregates
+from dexter.fec.concentration import counterparty_profiles
+from dexter.fec.daily import daily_balance_report
+from dexter.fec.reader import to_euros
+
+
+def build_fec_report(agg: LedgerAggregates, fec_path: str) -> Dict:
+    """Computes financials, concentration, seasonality and red flags from ledger aggregates."""
+    # Single group-by over the ledger; every category below is a lookup in this index
+    index = AccountIndex(agg.account_balances())
+
+    # Basic statistics
+    total_entries = agg.total_entries
+    # No period when the ledger has no dated entry
+    date_range = (agg.date_min, agg.date_max) if agg.date_min is not None else None
+    unique_accounts = agg.unique_accounts
+
+    # Calculate exact number of days in period (for annualization)
+    nb_days_in_period = (date_range[1] - date_range[0]).days if date_range else 365
+    period_factor = 365.25 / nb_days_in_period if nb_days_in_period > 0 else 1
+
+    # Totals are exact int64 cents; euros are only derived for presentation
+    # Revenue analysis (Class 7)
+    revenue_accounts = index.select('7').index
+    revenue_cents = index.net_credit('7')
+
+    # Expense analysis (Class 6)
+    expenses_cents = index.net_debit('6')
+
+    # Account 644 - Owner compensation (key for EBITDA normalization)
+    owner_comp_cents = index.net_debit('644')
+
+    # Account 681 - Depreciation (add back for EBITDA)
+    depreciation_cents = index.net_debit('681')
+
+    # Account 6815 - Provisions (add back for EBITDA)
+    provisions_cents = index.net_debit('6815')
+
+    result_cents = revenue_cents - expenses_cents
+    ebitda_cents = result_cents + depreciation_cents + provisions_cents
+
+    total_revenue = to_euros(revenue_cents)
+    total_expenses = to_euros(expenses_cents)
+    owner_comp_total = to_euros(owner_comp_cents)
+    depreciation_total = to_euros(depreciation_cents)
+    provisions_total = to_euros(provisions_cents)
+    result_before_tax = to_euros(result_cents)
+    ebitda_proxy = to_euros(ebitda_cents)
+
+    # Client concentration (411XXX accounts)
+    clients = index.select('4110-4119999')
+    if len(clients) > 0:
+        client_balances = (clients['Debit'] - clients['Credit']).sort_values(ascending=False)
+        top_5_clients = to_euros(client_balances.head(5))
+        top_client_concentration = client_balances.head(5).sum() / client_balances.sum() if client_balances.sum() != 0 else 0
+    else:
+        top_5_clients = pd.Series()
+        top_client_concentration = 0
+
+    # Supplier concentration (401XXX accounts)
+    suppliers = index.select('4010-4019999')
+    if len(suppliers) > 0:
+        supplier_balances = (suppliers['Credit'] - suppliers['Debit']).sort_values(ascending=False)
+        top_5_suppliers = to_euros(supplier_balances.head(5))
+        top_supplier_concentration = supplier_balances.head(5).sum() / supplier_balances.sum() if supplier_balances.sum() != 0 else 0
+    else:
+        top_5_suppliers = pd.Series()
+        top_supplier_concentration = 0
+
+    # Red flags detection
+    red_flags = []
+
+    # Red flag: Client concentration >30%
+    if top_client_concentration > 0.30:
+        red_flags.append({
+            "type": "Concentration client",
+            "severity": "High" if top_client_concentration > 0.50 else "Medium",
+            "description": f"Top 5 clients = {top_client_concentration*100:.1f}% du CA (>30% = risque)"
+        })
+
+    # Red flag: Owner compensation excessive (>10% revenue for small business)
+    if owner_comp_total > 0 and total_revenue > 0:
+        owner_comp_pct = owner_comp_total / total_revenue
+        if owner_comp_pct > 0.10:
+            red_flags.append({
+                "type": "Rémunération dirigeant excessive",
+                "severity": "Medium",
+                "description": f"Compte 644 = {owner_comp_pct*100:.1f}% du CA (normalisable pour EBITDA)",
+                "adjustable_amount": round(owner_comp_total, 2)
+            })
+
+    # Red flag: Loss-making
+    if result_cents < 0:
+        red_flags.append({
+            "type": "Résultat déficitaire",
+            "severity": "High",
+            "description": f"Perte de {abs(result_before_tax):,.2f} €"
+        })
+
+    # Day-by-day balances: average cash, debt cost, DSO/DPO, working capital range
+    daily_balances = daily_balance_report(agg.daily, index, agg.date_min, agg.date_max)
+
+    # Red flag: Bank overdraft for more than a month in total
+    if daily_balances and daily_balances["cash_512"]["days_overdrawn"] > 30:
+        red_flags.append({
+            "type": "Trésorerie négative",
+            "severity": "Medium",
+            "description": f"Solde 512 négatif {daily_balances['cash_512']['days_overdrawn']} jours sur {daily_balances['nb_days']} (découvert)"
+        })
+
+    # Monthly seasonality analysis
+    monthly = agg.monthly_balances(revenue_accounts)
+    monthly_revenue = to_euros(monthly['Credit'] - monthly['Debit'])
+    if len(monthly_revenue) >= 3:
+        revenue_std = monthly_revenue.std()
+        revenue_mean = monthly_revenue.mean()
+        coef_variation = (revenue_std / revenue_mean) if revenue_mean > 0 else 0
+        high_seasonality = coef_variation > 0.3
+    else:
+        coef_variation = 0
+        high_seasonality = False
+
+    return {
+        "success": True,
+        "file_path": fec_path,
+        "total_entries": total_entries,
+        "date_range": {
+            "start": date_range[0].strftime('%Y-%m-%d') if date_range else None,
+            "end": date_range[1].strftime('%Y-%m-%d') if date_range else None,
+            "nb_days": nb_days_in_period,
+            "is_full_year": abs(nb_days_in_period - 365) < 10
+        },
+        "unique_accounts": unique_accounts,
+        "financials": {
+            "total_revenue": round(total_revenue, 2),
+            "total_revenue_annualized": round(total_revenue * period_factor, 2),
+            "total_expenses": round(total_expenses, 2),
+            "result_before_tax": round(result_before_tax, 2),
+            "owner_compensation_644": round(owner_comp_total, 2),
+            "depreciation_681": round(depreciation_total, 2),
+            "provisions_6815": round(provisions_total, 2),
+            "ebitda_proxy": round(ebitda_proxy, 2),
+            "ebitda_margin_pct": round((ebitda_cents / revenue_cents * 100), 2) if revenue_cents > 0 else 0
+        },
+        "concentration": {
+            "top_client_concentration_pct": round(top_client_concentration * 100, 2),
+            "top_5_clients": top_5_clients.head(5).to_dict(),
+            "top_supplier_concentration_pct": round(top_supplier_concentration * 100, 2),
+            "top_5_suppliers": top_5_suppliers.head(5).to_dict(),
+            "client_risk": "HIGH" if top_client_concentration > 0.30 else "LOW",
+            # Top-N, curve and Herfindahl index per sub-ledger (CompteNum / CompAuxNum)
+            "profiles": counterparty_profiles(agg, index)
+        },
+        "seasonality": {
+            "coefficient_variation": round(coef_variation, 3),
+            "high_seasonality": high_seasonality,
+            "note": "Coef > 0.3 = forte saisonnalité (risque cash flow)"
+        },
+        "daily_balances": daily_balances,
+        "pcg_balances": index.pcg_balances(),
+        "red_flags": red_flags,
+        "dd_notes": {
+            "period_accuracy": f"Période de {nb_days_in_period} jours (facteur annualisation: {period_factor:.3f})",
+            "ebitda_adjustments_needed": owner_comp_total > 0 or depreciation_total > 0 or provisions_total > 0,
+            "key_accounts_to_review": [
+                "644 (Rémunération exploitant)" if owner_comp_total > 0 else None,
+                "411XXX (Détail clients)" if top_client_concentration > 0.30 else None,
+                "67X (Charges exceptionnelles à normaliser)"
+            ]
+        },
+        "next_steps": [
+            "Use normalize_ebitda tool with FEC insights",
+            f"Analyze owner_compensation_644: {owner_comp_total:,.2f} EUR" if owner_comp_total > 0 else "No owner compensation detected",
+            f"⚠️ Client concentration = {top_client_concentration*100:.1f}% - red flag if >30%" if top_client_concentration > 0.30 else "Client diversification OK",
+            "Review monthly revenue trend for seasonality",
+            f"⚠️ Period = {nb_days_in_period} days - annualize metrics" if not abs(nb_days_in_period - 365) < 10 else "Full year data"
+        ]
+    }
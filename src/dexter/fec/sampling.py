@@ -0,0 +1,284 @@
+"""
+Approximate read of a large FEC for first-look screening.
+
+Only a fixed budget of bytes is read. The data part of the file is cut into
+SAMPLE_STRATA strata of equal size (FEC files are ordered by journal and
+date, so the strata spread the sample over every journal and every month),
+each stratum into slots of the block size, and BLOCKS_PER_STRATUM slots are
+drawn at random in each stratum. A line belongs to the slot holding the
+newline that precedes it: a block skips to its first newline and runs to
+the end of the line its last newline starts, so every line of the file
+belongs to exactly one slot and the blocks only hold whole lines.
+
+Per-block sums of the report quantities (revenue, expenses, EBITDA proxy,
+invoiced amounts per client and supplier) are expanded with the stratified
+estimator, the variance coming from the spread of the blocks within each
+stratum (finite population correction included). Shares (margin,
+concentration) are ratio estimates with a linearized variance. Whether the
+exact read is needed follows from the intervals: an EBITDA interval across
+a bound of the investment thesis, a concentration interval across the red
+flag threshold or a revenue estimate too imprecise to rank the target.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import os
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import account_range
+from dexter.fec.reader import parse_fec_bytes, sniff_fec_format, to_euros
+
+# FEC columns the sampling estimator reads
+SAMPLING_COLUMNS = ["CompteNum", "Debit", "Credit"]
+
+# Bytes read in sampling mode; smaller files are read in full
+DEFAULT_SAMPLE_BYTES = 32 * 1024 * 1024
+
+SAMPLE_STRATA = 64
+# Two blocks per stratum is the fewest that yields a variance
+BLOCKS_PER_STRATUM = 2
+
+# Read past the end of a block to finish its last line (longest FEC line expected)
+MAX_LINE_BYTES = 64 * 1024
+
+# Normal quantile of the two-sided 95% confidence intervals
+Z_95 = 1.959964
+
+# EBITDA range of the investment thesis (EUR), as in SourcingCriteria
+THESIS_EBITDA_RANGE = (500_000.0, 2_000_000.0)
+
+# Top-5 share above which concentration is a red flag, as in the exact report
+CONCENTRATION_THRESHOLD = 0.30
+
+# Revenue interval half-width (share of the estimate) beyond which the sample is too small to screen
+MAX_RELATIVE_ERROR = 0.10
+
+
+class SampleDesign:
+    """Strata and blocks of a byte sample: stratum of each block, slots and blocks drawn per stratum."""
+
+    def __init__(self, stratum: np.ndarray, slots: np.ndarray, drawn: np.ndarray, bytes_read: int, file_bytes: int):
+        self.stratum = stratum
+        self.slots = slots
+        self.drawn = drawn
+        self.bytes_read = bytes_read
+        self.file_bytes = file_bytes
+
+    def __repr__(self):
+        return f"SampleDesign(blocks={len(self.stratum)}, strata={len(self.slots)}, bytes_read={self.bytes_read})"
+
+
+def _realign(f, start: int, end: int, file_bytes: int) -> bytes:
+    """Whole lines whose preceding newline lies in [start, end)."""
+    f.seek(start)
+    data = f.read(min(end + MAX_LINE_BYTES, file_bytes) - start)
+    first = data.find(b"\n")
+    if first < 0 or first >= end - start:
+        return b""
+    last = data.rfind(b"\n", 0, end - start)
+    stop = data.find(b"\n", last + 1)
+    if stop < 0:
+        # Last line of the file without a final newline, or a line longer than the margin
+        stop = len(data) - 1 if start + len(data) == file_bytes else last
+    lines = data[first + 1:stop + 1]
+    return lines if lines.endswith(b"\n") or not lines else lines + b"\n"
+
+
+def read_sample(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    sample_bytes: int = DEFAULT_SAMPLE_BYTES,
+    seed: int = 0,
+    columns: Optional[List[str]] = None,
+) -> Tuple[pd.DataFrame, np.ndarray, SampleDesign]:
+    """
+    The sampled lines as a normalized DataFrame, the block of each line and
+    the sample design. Raises FECParseError like load_fec.
+    """
+    fmt = sniff_fec_format(fec_path, encoding=encoding, separator=separator)
+    file_bytes = os.path.getsize(fec_path)
+    rng = np.random.default_rng(seed)
+    with open(fec_path, "rb") as f:
+        header = f.readline()
+        # The header's newline precedes the first data line
+        data_start = len(header) - 1
+        bounds = np.linspace(data_start, file_bytes, SAMPLE_STRATA + 1).astype(np.int64)
+        block_bytes = max(sample_bytes // (SAMPLE_STRATA * BLOCKS_PER_STRATUM), 1)
+        blocks, stratum, slots, drawn = [], [], [], []
+        for h in range(SAMPLE_STRATA):
+            n_slots = max(int((bounds[h + 1] - bounds[h]) // block_bytes), 1)
+            edges = np.linspace(bounds[h], bounds[h + 1], n_slots + 1).astype(np.int64)
+            picked = np.sort(rng.choice(n_slots, size=min(BLOCKS_PER_STRATUM, n_slots), replace=False))
+            for s in picked:
+                blocks.append(_realign(f, int(edges[s]), int(edges[s + 1]), file_bytes))
+                stratum.append(h)
+            slots.append(n_slots)
+            drawn.append(len(picked))
+
+    design = SampleDesign(
+        np.array(stratum), np.array(slots), np.array(drawn), sum(len(b) for b in blocks), file_bytes
+    )
+    if not header.endswith(b"\n"):
+        header += b"\n"
+    # One parse for all the blocks; lines are counted per block to tag them
+    counts = np.array([b.count(b"\n") for b in blocks], dtype=np.int64)
+    df = parse_fec_bytes(header + b"".join(blocks), fmt, columns)
+    if len(df) != counts.sum():
+        # Blank or quoted multi-line rows: parse block by block instead
+        frames = [parse_fec_bytes(header + b, fmt, columns) for b in blocks]
+        counts = np.array([len(frame) for frame in frames], dtype=np.int64)
+        df = pd.concat(frames, ignore_index=True)
+    return df, np.repeat(np.arange(len(blocks)), counts), design
+
+
+def estimate_total(per_block: np.ndarray, design: SampleDesign) -> Tuple[float, float]:
+    """Stratified estimate of a file total from per-block sums, and its variance."""
+    per_block = np.asarray(per_block, dtype=np.float64)
+    n_strata = len(design.slots)
+    sums = np.bincount(design.stratum, weights=per_block, minlength=n_strata)
+    squares = np.bincount(design.stratum, weights=per_block ** 2, minlength=n_strata)
+    n, big_n = design.drawn.astype(np.float64), design.slots.astype(np.float64)
+    mean = sums / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        within = np.where(n > 1, (squares - n * mean ** 2) / (n - 1), 0.0)
+    variance = big_n ** 2 * (1 - n / big_n) * np.maximum(within, 0.0) / n
+    return float((big_n * mean).sum()), float(variance.sum())
+
+
+def estimate_ratio(numerator: np.ndarray, denominator: np.ndarray, design: SampleDesign) -> Tuple[float, float]:
+    """Ratio of two file totals and its linearized variance."""
+    top, _ = estimate_total(numerator, design)
+    bottom, _ = estimate_total(denominator, design)
+    if bottom == 0:
+        return 0.0, 0.0
+    ratio = top / bottom
+    _, variance = estimate_total((np.asarray(numerator) - ratio * np.asarray(denominator)) / bottom, design)
+    return ratio, variance
+
+
+def _interval(estimate: float, variance: float, scale=to_euros, digits: int = 2) -> Dict:
+    half = Z_95 * float(np.sqrt(variance))
+    return {
+        "estimate": round(scale(estimate), digits),
+        "ci_low": round(scale(estimate - half), digits),
+        "ci_high": round(scale(estimate + half), digits),
+    }
+
+
+def _top_share(flows: np.ndarray, block: np.ndarray, codes: np.ndarray, design: SampleDesign, n_blocks: int) -> Tuple[float, float]:
+    """Top-5 share of the flows by account (top 5 picked on the expanded totals), and its variance."""
+    rows = np.flatnonzero(flows != 0)
+    if not len(rows):
+        return 0.0, 0.0
+    accounts, account = np.unique(codes[rows], return_inverse=True)
+    # Expansion weight of a line: slots of its stratum over blocks drawn there
+    weight = (design.slots / design.drawn)[design.stratum[block[rows]]]
+    expanded = np.bincount(account, weights=flows[rows] * weight, minlength=len(accounts))
+    top = np.isin(account, np.argsort(-expanded, kind="stable")[:5])
+    numerator = np.bincount(block[rows][top], weights=flows[rows][top], minlength=n_blocks)
+    denominator = np.bincount(block[rows], weights=flows[rows], minlength=n_blocks)
+    return estimate_ratio(numerator, denominator, design)
+
+
+def sample_report(
+    df: pd.DataFrame,
+    block: np.ndarray,
+    design: SampleDesign,
+    ebitda_range: Tuple[float, float] = THESIS_EBITDA_RANGE,
+) -> Dict:
+    """
+    Revenue, expenses, EBITDA proxy (same definitions as the read_fec
+    report), EBITDA margin and top-5 client/supplier shares with their 95%
+    confidence intervals, and whether the exact read is needed.
+    """
+    accounts = df["CompteNum"]
+    if not isinstance(accounts.dtype, pd.CategoricalDtype):
+        accounts = accounts.astype("category")
+    categories = accounts.cat.categories.astype(str)
+    codes = accounts.cat.codes.to_numpy()
+
+    def member(spec: str) -> np.ndarray:
+        # Classify the distinct account numbers once, then map every line by its code
+        low, high = account_range(spec)
+        return np.append((categories >= low) & (categories < high), False)[codes]
+
+    debit, credit = df["Debit"].to_numpy(), df["Credit"].to_numpy()
+    net_debit = (debit - credit).astype(np.float64)
+    n_blocks = len(design.stratum)
+
+    def per_block(values: np.ndarray) -> np.ndarray:
+        return np.bincount(block, weights=values, minlength=n_blocks)
+
+    revenue = per_block(np.where(member("7"), -net_debit, 0.0))
+    expenses = per_block(np.where(member("6"), net_debit, 0.0))
+    # As in the exact report: result plus depreciation (681) and provisions (6815)
+    add_backs = np.where(member("681"), net_debit, 0.0) + np.where(member("6815"), net_debit, 0.0)
+    ebitda = revenue - expenses + per_block(add_backs)
+
+    revenue_total, revenue_var = estimate_total(revenue, design)
+    ebitda_total, ebitda_var = estimate_total(ebitda, design)
+    margin, margin_var = estimate_ratio(ebitda, revenue, design)
+    lines_total, _ = estimate_total(np.bincount(block, minlength=n_blocks), design)
+    # Invoiced amounts: debits to the client accounts, credits to the supplier accounts
+    clients, clients_var = _top_share(np.where(member("4110-4119999"), debit, 0).astype(np.float64), block, codes, design, n_blocks)
+    suppliers, suppliers_var = _top_share(np.where(member("4010-4019999"), credit, 0).astype(np.float64), block, codes, design, n_blocks)
+
+    def pct(value: float) -> float:
+        return value * 100
+
+    ebitda_ci = _interval(ebitda_total, ebitda_var)
+    client_ci = _interval(clients, clients_var, pct)
+    low, high = ebitda_range
+
+    reasons = []
+    for bound in (low, high):
+        if ebitda_ci["ci_low"] <= bound <= ebitda_ci["ci_high"]:
+            reasons.append(f"EBITDA estimé {ebitda_ci['estimate']:,.0f} € : l'intervalle de confiance contient la borne de la thèse {bound:,.0f} €")
+    threshold = CONCENTRATION_THRESHOLD * 100
+    if client_ci["ci_low"] <= threshold <= client_ci["ci_high"]:
+        reasons.append(f"Concentration clients {client_ci['estimate']:.1f}% : l'intervalle de confiance contient le seuil de {threshold:.0f}%")
+    relative_error = Z_95 * np.sqrt(revenue_var) / abs(revenue_total) if revenue_total else float("inf")
+    if relative_error > MAX_RELATIVE_ERROR:
+        reasons.append(f"CA estimé à ±{relative_error * 100:.0f}% près : échantillon trop petit pour conclure")
+
+    if ebitda_ci["ci_high"] < low or ebitda_ci["ci_low"] > high:
+        thesis = "hors cible"
+    elif ebitda_ci["ci_low"] >= low and ebitda_ci["ci_high"] <= high:
+        thesis = "dans la cible"
+    else:
+        thesis = "indéterminé"
+
+    return {
+        "mode": "sample",
+        "sample": {
+            "file_bytes": design.file_bytes,
+            "bytes_read": design.bytes_read,
+            "fraction_pct": round(design.bytes_read / design.file_bytes * 100, 2) if design.file_bytes else 0.0,
+            "lines_sampled": len(df),
+            "total_entries_estimate": int(round(lines_total)),
+            "strata": len(design.slots),
+            "blocks": n_blocks,
+        },
+        "confidence_level_pct": 95,
+        "financials": {
+            "total_revenue": _interval(revenue_total, revenue_var),
+            "total_expenses": _interval(*estimate_total(expenses, design)),
+            "ebitda_proxy": ebitda_ci,
+            "ebitda_margin_pct": _interval(margin, margin_var, pct),
+        },
+        "concentration": {
+            "top_client_concentration_pct": client_ci,
+            "top_supplier_concentration_pct": _interval(suppliers, suppliers_var, pct),
+            "basis": "Part des 5 premiers comptes 411/401 dans les montants facturés (débits 411, crédits 401) "
+                     "de l'échantillon, et non dans les soldes comme la lecture exacte",
+        },
+        "thesis": {
+            "ebitda_range": [low, high],
+            "fit": thesis,
+        },
+        "exact_path_needed": bool(reasons),
+        "reasons": reasons,
+        "note": "Estimation par échantillonnage d'octets stratifié : lire le FEC en entier (sample=False) "
+                "avant toute conclusion chiffrée.",
+    }
@@ -0,0 +1,390 @@
+"""
+Local SQLite store of FEC entries for ad-hoc ledger queries.
+
+read_fec returns a fixed summary; follow-up questions ("what hit account
+6226 in March?") need the entries themselves. A FEC is ingested once into
+its own SQLite database:
+
+- entries: one row per line (amounts in int64 cents, dates as ISO text),
+  indexed on CompteNum, CompAuxNum, EcritureDate and JournalCode;
+- daily / monthly: Debit/Credit totals per account, counterparty, journal
+  and day / month, which answer balance and counterparty queries without
+  touching the entries. Periods made of whole months read the monthly
+  totals (a few thousand rows), other periods the daily ones.
+
+The database is built in a temporary file, indexed once the rows are
+loaded, then moved into place, so a reader never sees a partial ledger. A
+ledger is re-ingested only when the file content changes.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import account_range
+from dexter.fec.cache import file_digest
+from dexter.fec.reader import MISSING_DAY, iter_fec_chunks, to_euros
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dexter", "ledgers")
+
+# Bump when the schema or the stored representation changes
+STORE_SCHEMA_VERSION = 1
+
+# FEC columns kept in the store (Montantdevise/Idevise are not queried)
+STORE_COLUMNS = [
+    "JournalCode", "JournalLib", "EcritureNum", "EcritureDate",
+    "CompteNum", "CompteLib", "CompAuxNum", "CompAuxLib",
+    "PieceRef", "PieceDate", "EcritureLib",
+    "Debit", "Credit", "EcritureLet", "DateLet", "ValidDate",
+]
+
+DATE_COLUMNS = {"EcritureDate", "PieceDate", "DateLet", "ValidDate"}
+AMOUNT_COLUMNS = {"Debit", "Credit"}
+
+INGEST_CHUNKSIZE = 200_000
+
+ENTRIES_TABLE = (
+    "CREATE TABLE entries (line INTEGER PRIMARY KEY, "
+    + ", ".join(f"{col} {'INTEGER NOT NULL' if col in AMOUNT_COLUMNS else 'TEXT'}" for col in STORE_COLUMNS)
+    + ")"
+)
+
+# Built after the bulk insert: one sort per index instead of B-tree inserts per row
+INDEXES = """
+CREATE INDEX entries_account ON entries (CompteNum, EcritureDate);
+CREATE INDEX entries_auxiliary ON entries (CompAuxNum);
+CREATE INDEX entries_date ON entries (EcritureDate);
+CREATE INDEX entries_journal ON entries (JournalCode, EcritureDate);
+
+CREATE TABLE daily AS
+SELECT CompteNum, COALESCE(CompAuxNum, '') AS CompAuxNum, JournalCode, EcritureDate,
+       COUNT(*) AS n, SUM(Debit) AS Debit, SUM(Credit) AS Credit
+FROM entries GROUP BY CompteNum, CompAuxNum, JournalCode, EcritureDate;
+CREATE INDEX daily_account ON daily (CompteNum, EcritureDate);
+
+CREATE TABLE monthly AS
+SELECT CompteNum, CompAuxNum, JournalCode, substr(EcritureDate, 1, 7) AS month,
+       SUM(n) AS n, SUM(Debit) AS Debit, SUM(Credit) AS Credit
+FROM daily GROUP BY CompteNum, CompAuxNum, JournalCode, month;
+CREATE INDEX monthly_account ON monthly (CompteNum, month);
+
+CREATE TABLE labels AS
+SELECT CompteNum, COALESCE(CompAuxNum, '') AS CompAuxNum, MAX(CompteLib) AS CompteLib, MAX(CompAuxLib) AS CompAuxLib
+FROM entries GROUP BY CompteNum, CompAuxNum;
+CREATE UNIQUE INDEX labels_key ON labels (CompteNum, CompAuxNum);
+"""
+
+
+def store_dir() -> str:
+    return os.getenv("DEXTER_FEC_STORE_DIR", DEFAULT_STORE_DIR)
+
+
+def store_path(fec_path: str) -> str:
+    """Database of one FEC, named after its absolute path."""
+    name = hashlib.blake2b(os.path.abspath(fec_path).encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(store_dir(), name + ".sqlite3")
+
+
+def iso_date(value: Optional[str]) -> Optional[str]:
+    """'2023-03-31' or '20230331' to the stored 'YYYY-MM-DD' form (None stays None)."""
+    if value is None:
+        return None
+    return pd.Timestamp(str(value).strip()).strftime("%Y-%m-%d")
+
+
+def _iso_days(days: np.ndarray) -> List[Optional[str]]:
+    """Day ordinals to ISO strings, None for MISSING_DAY."""
+    text = days.astype("datetime64[D]").astype(str).astype(object)
+    text[days == MISSING_DAY] = None
+    return text.tolist()
+
+
+def _rows(chunk: pd.DataFrame, first_line: int):
+    """Rows of a normalized chunk in STORE_COLUMNS order, with None for missing values."""
+    values = []
+    for col in STORE_COLUMNS:
+        if col not in chunk.columns:
+            values.append([0 if col in AMOUNT_COLUMNS else None] * len(chunk))
+        elif col in DATE_COLUMNS:
+            values.append(_iso_days(chunk[col].to_numpy()))
+        elif col in AMOUNT_COLUMNS:
+            values.append(chunk[col].tolist())
+        else:
+            series = chunk[col].astype(object)
+            values.append(series.where(series.notna(), None).tolist())
+    return zip(range(first_line, first_line + len(chunk)), *values)
+
+
+def _whole_months(start_date: Optional[str], end_date: Optional[str]) -> bool:
+    """True when the period starts on a 1st and ends on a month end (open bounds count)."""
+    return (start_date is None or pd.Timestamp(start_date).is_month_start) and \
+        (end_date is None or pd.Timestamp(end_date).is_month_end)
+
+
+def _condition(
+    account: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    journal: Optional[str] = None,
+    label: Optional[str] = None,
+    by_month: bool = False,
+) -> Tuple[str, List]:
+    """
+    SQL WHERE clause and its parameters; date bounds are inclusive. With
+    `by_month`, the bounds are compared to the `month` column of the
+    monthly totals.
+    """
+    clauses, params = [], []
+    if account:
+        clauses.append("CompteNum >= ? AND CompteNum < ?")
+        params.extend(account_range(account))
+    date_column, width = ("month", 7) if by_month else ("EcritureDate", 10)
+    if start_date:
+        clauses.append(f"{date_column} >= ?")
+        params.append(iso_date(start_date)[:width])
+    if end_date:
+        clauses.append(f"{date_column} <= ?")
+        params.append(iso_date(end_date)[:width])
+    if journal:
+        clauses.append("JournalCode = ?")
+        params.append(journal)
+    if label:
+        clauses.append("EcritureLib LIKE ?")
+        params.append(f"%{label}%")
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _source(filters: Dict) -> Tuple[str, str, str, Tuple[str, List]]:
+    """
+    Smallest table able to answer an aggregate query: (table, line count
+    expression, month expression, WHERE clause and parameters).
+    """
+    if filters.get("label"):
+        # Label searches need the entries
+        return "entries", "COUNT(*)", "substr(EcritureDate, 1, 7)", _condition(**filters)
+    if _whole_months(filters.get("start_date"), filters.get("end_date")):
+        return "monthly", "SUM(n)", "month", _condition(by_month=True, **filters)
+    return "daily", "SUM(n)", "substr(EcritureDate, 1, 7)", _condition(**filters)
+
+
+def _amounts(row: sqlite3.Row) -> Dict:
+    return {
+        "debit": round(to_euros(row["debit"]), 2),
+        "credit": round(to_euros(row["credit"]), 2),
+        "balance": round(to_euros(row["debit"] - row["credit"]), 2),
+    }
+
+
+def _read_meta(path: str) -> Optional[Dict]:
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return meta if meta.get("schema_version") == STORE_SCHEMA_VERSION else None
+
+
+def _build(fec_path: str, path: str, encoding: str, separator: str, meta: Dict):
+    """Writes the database of `fec_path` to `path` (a fresh file)."""
+    conn = sqlite3.connect(path)
+    try:
+        # A throwaway file until it is moved into place: no journal needed
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(ENTRIES_TABLE)
+        insert = f"INSERT INTO entries VALUES ({', '.join('?' * (len(STORE_COLUMNS) + 1))})"
+        n_rows = 0
+        chunks = iter_fec_chunks(fec_path, encoding=encoding, separator=separator,
+                                 chunksize=INGEST_CHUNKSIZE, columns=STORE_COLUMNS)
+        for chunk in chunks:
+            conn.executemany(insert, _rows(chunk, n_rows))
+            n_rows += len(chunk)
+        conn.executescript(INDEXES)
+
+        date_min, date_max = conn.execute("SELECT MIN(EcritureDate), MAX(EcritureDate) FROM entries").fetchone()
+        meta = dict(meta, n_rows=n_rows, date_min=date_min, date_max=date_max)
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value)")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class LedgerStore:
+    """Read-only queries on the SQLite database of one ingested FEC."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.conn.row_factory = sqlite3.Row
+        self.meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+
+    @classmethod
+    def open(cls, fec_path: str, encoding: str = "latin-1", separator: str = "|") -> Tuple["LedgerStore", Dict]:
+        """
+        The store of `fec_path`, ingesting it first if it is new or changed
+        (same size and mtime, or same content hash, counts as unchanged).
+        Returns the store and an ingestion info dict.
+        """
+        source = os.path.abspath(fec_path)
+        path = store_path(source)
+        stat = os.stat(source)
+        meta = _read_meta(path)
+        fresh = meta is not None and (
+            (meta["size"], meta["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+            or meta["digest"] == file_digest(source)
+        )
+        seconds = None
+        if not fresh:
+            start = time.perf_counter()
+            os.makedirs(store_dir(), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                _build(source, tmp_path, encoding, separator, {
+                    "schema_version": STORE_SCHEMA_VERSION,
+                    "source": source,
+                    "digest": file_digest(source),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "ingested": time.time(),
+                })
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            seconds = round(time.perf_counter() - start, 2)
+
+        store = cls(path)
+        info = {
+            "source": source,
+            "n_rows": store.meta["n_rows"],
+            "date_range": {"start": store.meta["date_min"], "end": store.meta["date_max"]},
+            "ingested": not fresh,
+        }
+        if seconds is not None:
+            info["seconds"] = seconds
+        return store, info
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- queries ----------
+
+    def balances(self, by: str = "account", limit: int = 50, **filters) -> List[Dict]:
+        """
+        Debit, credit and net balance (EUR) per account ("account") or per
+        month ("month") of the entries matching `filters` (account spec,
+        start_date, end_date, journal, label).
+        """
+        table, n, month, (where, params) = _source(filters)
+        key = {"account": "CompteNum", "month": month}[by]
+        rows = self.conn.execute(
+            f"SELECT {key} AS key, {n} AS n, SUM(Debit) AS debit, SUM(Credit) AS credit"
+            f" FROM {table}{where} GROUP BY key ORDER BY key LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        labels = {}
+        if by == "account" and rows:
+            labels = dict(self.conn.execute(
+                f"SELECT CompteNum, MAX(CompteLib) FROM labels"
+                f" WHERE CompteNum IN ({', '.join('?' * len(rows))}) GROUP BY CompteNum",
+                [row["key"] for row in rows],
+            ).fetchall())
+
+        result = []
+        for row in rows:
+            entry = {by: row["key"], "n_entries": row["n"], **_amounts(row)}
+            if by == "account":
+                entry["label"] = labels.get(row["key"])
+            result.append(entry)
+        return result
+
+    def counterparties(self, account: str = "411", limit: int = 10, **filters) -> List[Dict]:
+        """
+        Largest counterparties of a ledger (411 clients, 401 suppliers...) by
+        absolute net balance: the CompAuxNum sub-ledger when filled, else the
+        individual account.
+        """
+        table, n, _, (where, params) = _source(dict(filters, account=account))
+        rows = self.conn.execute(
+            f"SELECT CompteNum, COALESCE(NULLIF(CompAuxNum, ''), CompteNum) AS id, {n} AS n,"
+            f" SUM(Debit) AS debit, SUM(Credit) AS credit FROM {table}{where}"
+            " GROUP BY id ORDER BY ABS(SUM(Debit) - SUM(Credit)) DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        result = []
+        for row in rows:
+            label = self.conn.execute(
+                "SELECT COALESCE(MAX(CompAuxLib), MAX(CompteLib)) FROM labels"
+                " WHERE CompteNum = ? AND (CompAuxNum = ? OR CompteNum = ?)",
+                (row["CompteNum"], row["id"], row["id"]),
+            ).fetchone()[0]
+            result.append({"id": row["id"], "label": label, "n_entries": row["n"], **_amounts(row)})
+        return result
+
+    def entries(self, limit: int = 100, **filters) -> Dict:
+        """Entries matching `filters`, by date, with the count and totals of all matches."""
+        where, params = _condition(**filters)
+        totals = self.conn.execute(
+            f"SELECT COUNT(*) AS n, SUM(Debit) AS debit, SUM(Credit) AS credit FROM entries{where}", params
+        ).fetchone()
+        rows = self.conn.execute(
+            f"SELECT line, {', '.join(STORE_COLUMNS)} FROM entries{where} ORDER BY EcritureDate, line LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return {
+            "n_matches": totals["n"],
+            "total_debit": round(to_euros(totals["debit"] or 0), 2),
+            "total_credit": round(to_euros(totals["credit"] or 0), 2),
+            "entries": [
+                {**dict(row), "Debit": round(to_euros(row["Debit"]), 2), "Credit": round(to_euros(row["Credit"]), 2)}
+                for row in rows
+            ],
+            "truncated": totals["n"] > len(rows),
+        }
+
+
+def query_ledger(
+    fec_path: str,
+    query: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    limit: Optional[int] = None,
+    **filters,
+) -> Dict:
+    """
+    Ingests `fec_path` if needed, then runs one query: "balances" (per
+    account), "monthly" (per month), "counterparties" or "entries".
+    """
+    queries = {
+        "balances": lambda store, **kw: {"rows": store.balances(by="account", **kw)},
+        "monthly": lambda store, **kw: {"rows": store.balances(by="month", **kw)},
+        "counterparties": lambda store, **kw: {"rows": store.counterparties(**kw)},
+        "entries": lambda store, **kw: store.entries(**kw),
+    }
+    if query not in queries:
+        raise ValueError(f"Unknown ledger query: {query} (expected one of {', '.join(queries)})")
+
+    filters = {name: value for name, value in filters.items() if value is not None}
+    if limit is not None:
+        filters["limit"] = limit
+    store, ledger_info = LedgerStore.open(fec_path, encoding=encoding, separator=separator)
+    with store:
+        start = time.perf_counter()
+        result = queries[query](store, **filters)
+        query_ms = (time.perf_counter() - start) * 1000
+
+    return {"query": query, "filters": filters, **result, "ledger": ledger_info, "query_ms": round(query_ms, 1)}
@@ -0,0 +1,199 @@
+"""
+Account variance between the fiscal years of one company.
+
+Two or more ledgers are aligned on account number and fiscal month (month
+since the start of each ledger, so a July-June year lines up with the
+previous July-June year) into a year x account x month cube of net debits
+(int64 cents). The cube is filled by a single bincount over the lines of
+every ledger, the accounts of each ledger being mapped once onto the union
+of the charts. Variances, new and disappeared accounts and the
+contribution of each account to the EBITDA change are then array
+operations on the cube.
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from dexter.fec.accounts import account_range
+from dexter.fec.normalization import EBITDA_BRIDGE
+from dexter.fec.reader import MISSING_DAY, to_euros
+
+# FEC columns the variance engine reads
+VARIANCE_COLUMNS = ["EcritureDate", "CompteNum", "Debit", "Credit"]
+
+# Fiscal months of the cube: a first fiscal year may run up to 24 months
+MAX_FISCAL_MONTHS = 24
+
+# Relative variances are not reported below this base (EUR): +900% on 10 EUR says nothing
+MIN_RELATIVE_BASE = 1_000.0
+
+
+def _in_specs(accounts: np.ndarray, specs: List[str]) -> np.ndarray:
+    inside = np.zeros(len(accounts), dtype=bool)
+    for spec in specs:
+        low, high = account_range(spec)
+        inside |= (accounts >= low) & (accounts < high)
+    return inside
+
+
+def ebitda_accounts(accounts: np.ndarray) -> np.ndarray:
+    """Class 6 and 7 accounts that make EBITDA (the EBITDA bridge items left out)."""
+    return _in_specs(accounts, ["6", "7"]) & ~_in_specs(accounts, [spec for spec, _ in EBITDA_BRIDGE])
+
+
+def variance_cube(ledgers: List[pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Net debit (cents) per ledger, account and fiscal month; lines per ledger
+    and account; the accounts (sorted, union of the ledgers) and the first
+    and last months (months since 1970) of each ledger. Undated lines are
+    left out.
+    """
+    periods = []
+    accounts = pd.Index([], dtype=object)
+    for df in ledgers:
+        column = df["CompteNum"]
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype("category")
+        accounts = accounts.union(column.cat.categories.astype(str))
+    accounts = accounts.sort_values()
+
+    years, cells_account, cells_month, amounts = [], [], [], []
+    for y, df in enumerate(ledgers):
+        column = df["CompteNum"]
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype("category")
+        # Each ledger's chart mapped once onto the union
+        to_union = np.append(accounts.get_indexer(column.cat.categories.astype(str)), -1)
+        account = to_union[column.cat.codes.to_numpy()]
+        days = df["EcritureDate"].to_numpy()
+        month = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        keep = (account >= 0) & (days != MISSING_DAY)
+        first = int(month[keep].min()) if keep.any() else 0
+        periods.append((first, int(month[keep].max()) if keep.any() else 0))
+        years.append(np.full(int(keep.sum()), y))
+        cells_account.append(account[keep])
+        cells_month.append(np.clip(month[keep] - first, 0, MAX_FISCAL_MONTHS - 1))
+        amounts.append((df["Debit"].to_numpy() - df["Credit"].to_numpy())[keep])
+
+    year, account, month = np.concatenate(years), np.concatenate(cells_account), np.concatenate(cells_month)
+    n_years, n_accounts = len(ledgers), len(accounts)
+    cells = (year * n_accounts + account) * MAX_FISCAL_MONTHS + month
+    size = n_years * n_accounts * MAX_FISCAL_MONTHS
+    # float64 sums of integer cents stay exact up to 2**53 (90 billion euros)
+    cube = np.bincount(cells, weights=np.concatenate(amounts), minlength=size).round().astype(np.int64)
+    lines = np.bincount(year * n_accounts + account, minlength=n_years * n_accounts)
+    return (
+        cube.reshape(n_years, n_accounts, MAX_FISCAL_MONTHS),
+        lines.reshape(n_years, n_accounts),
+        np.asarray(accounts, dtype=object),
+        np.array(periods, dtype=np.int64).reshape(-1, 2),
+    )
+
+
+def _euros(cents) -> float:
+    return round(to_euros(float(cents)), 2)
+
+
+def _relative_pct(change: float, base: float):
+    return round(change / abs(base) * 100, 1) if abs(base) >= MIN_RELATIVE_BASE * 100 else None
+
+
+def _month_label(month: int) -> str:
+    return f"{month // 12 + 1970}-{month % 12 + 1:02d}"
+
+
+def variance_report(ledgers: List[pd.DataFrame], labels: List[str], top_n: int = 20) -> Dict:
+    """
+    Year-over-year variance of every account between consecutive ledgers
+    (sorted by period, labelled by `labels`): annual summary, EBITDA
+    bridge by account class and top movers for the last two years, with the
+    monthly detail of each mover, and the accounts that appeared or
+    disappeared.
+    """
+    cube, lines, accounts, periods = variance_cube(ledgers)
+    order = np.lexsort((periods[:, 1], periods[:, 0]))
+    cube, lines, periods, labels = cube[order], lines[order], periods[order], [labels[y] for y in order]
+    annual = cube.sum(axis=2)
+    present = lines > 0
+    in_ebitda = ebitda_accounts(accounts)
+    # Net credit: revenue positive, charges negative
+    ebitda = -(annual[:, in_ebitda].sum(axis=1))
+    revenue = -annual[:, _in_specs(accounts, ["70"])].sum(axis=1)
+
+    summary = []
+    for y, label in enumerate(labels):
+        row = {
+            "fiscal_year": label,
+            "start": _month_label(int(periods[y, 0])),
+            "end": _month_label(int(periods[y, 1])),
+            "revenue": _euros(revenue[y]),
+            "ebitda": _euros(ebitda[y]),
+            "n_accounts": int(present[y].sum()),
+        }
+        if y > 0:
+            row["revenue_change_pct"] = _relative_pct(float(revenue[y] - revenue[y - 1]), float(revenue[y - 1]))
+            row["ebitda_change"] = _euros(ebitda[y] - ebitda[y - 1])
+        summary.append(row)
+
+    if len(ledgers) < 2:
+        return {"years": summary, "note": "Au moins deux FEC (N-1 et N) sont nécessaires pour calculer des variations"}
+
+    current, previous = annual[-1], annual[-2]
+    change = current - previous
+    ebitda_change = int(ebitda[-1] - ebitda[-2])
+    # Contribution to the EBITDA change: lower charges or higher revenue raise EBITDA
+    contribution = np.where(in_ebitda, -change, 0)
+    new = present[-1] & ~present[-2]
+    gone = present[-2] & ~present[-1]
+
+    pnl = _in_specs(accounts, ["6", "7"])
+    classes = pd.Series(contribution[in_ebitda], index=[a[:2] for a in accounts[in_ebitda]]).groupby(level=0).sum()
+    classes = classes[classes != 0].sort_values(key=np.abs, ascending=False)
+
+    n_months = _fiscal_months(cube)
+
+    def movers(rows: np.ndarray) -> List[Dict]:
+        order = rows[np.argsort(-np.abs(change[rows]), kind="stable")]
+        order = order[change[order] != 0][:top_n]
+        return [
+            {
+                "account": accounts[a],
+                "previous": _euros(previous[a]),
+                "current": _euros(current[a]),
+                "change": _euros(change[a]),
+                "change_pct": _relative_pct(float(change[a]), float(previous[a])),
+                "status": "new" if new[a] else "disappeared" if gone[a] else "continuing",
+                "ebitda_contribution": _euros(contribution[a]) if in_ebitda[a] else None,
+                "ebitda_contribution_pct": round(float(contribution[a] / ebitda_change * 100), 1) if in_ebitda[a] and ebitda_change else None,
+                # Fiscal month by fiscal month, N minus N-1
+                "monthly_change": [_euros(v) for v in (cube[-1, a] - cube[-2, a])[:n_months]],
+            }
+            for a in order
+        ]
+
+    return {
+        "years": summary,
+        "compared": {"previous": labels[-2], "current": labels[-1]},
+        "ebitda_change": _euros(ebitda_change),
+        # EBITDA change by two-digit account class, largest first
+        "ebitda_bridge_by_class": {cls: _euros(v) for cls, v in classes.items()},
+        "top_movers_pnl": movers(np.flatnonzero(pnl)),
+        "top_movers_balance_sheet": movers(np.flatnonzero(~pnl)),
+        "new_accounts": _account_list(accounts, current, new, top_n),
+        "disappeared_accounts": _account_list(accounts, previous, gone, top_n),
+        "n_new_accounts": int(new.sum()),
+        "n_disappeared_accounts": int(gone.sum()),
+    }
+
+
+def _fiscal_months(cube: np.ndarray) -> int:
+    """Fiscal months actually used by the last two ledgers."""
+    used = np.flatnonzero((cube[-2:] != 0).any(axis=(0, 1)))
+    return int(used.max()) + 1 if len(used) else 0
+
+
+def _account_list(accounts: np.ndarray, amounts: np.ndarray, mask: np.ndarray, top_n: int) -> List[Dict]:
+    rows = np.flatnonzero(mask)
+    rows = rows[np.argsort(-np.abs(amounts[rows]), kind="stable")][:top_n]
+    return [{"account": accounts[a], "net_debit": _euros(amounts[a])} for a in rows]
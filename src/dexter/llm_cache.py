@@ -0,0 +1,167 @@
+"""
+On-disk cache of Claude responses for call_llm.
+
+A response is stored under the hash of the whole request (model, system
+prompt, messages, tool schemas, temperature, max_tokens), so the same
+planning prompt or the same DD step re-run with unrelated inputs changed
+costs no API round-trip. Only deterministic calls (temperature 0) use it by
+default.
+
+The cache is one SQLite database in WAL mode: several agent processes can
+read and write it at once, each write being a single short transaction.
+Entries expire after a TTL (DEXTER_LLM_CACHE_TTL_HOURS, default 168) and
+the total size is bounded (DEXTER_LLM_CACHE_MAX_MB, default 256): the least
+recently used entries are evicted first. DEXTER_LLM_CACHE=0 turns it off.
+"""
+
+from typing import Dict, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dexter", "llm")
+DEFAULT_TTL_HOURS = 168
+DEFAULT_MAX_MB = 256
+
+# Bump when the key or the stored response layout changes
+CACHE_FORMAT_VERSION = 1
+
+# Seconds a process waits for another one's write transaction
+BUSY_TIMEOUT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def cache_dir() -> str:
+    return os.getenv("DEXTER_LLM_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+def cache_enabled() -> bool:
+    return os.getenv("DEXTER_LLM_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def ttl_seconds() -> float:
+    return float(os.getenv("DEXTER_LLM_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS)) * 3600
+
+
+def max_cache_bytes() -> int:
+    return int(float(os.getenv("DEXTER_LLM_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def request_key(request: Dict) -> str:
+    """Content hash of an API request (canonical JSON: key order and spacing do not matter)."""
+    raw = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"v{CACHE_FORMAT_VERSION}|{raw}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Responses (JSON dicts) by request key, with TTL, LRU size bound and hit/miss counters; thread-safe."""
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.path = path or os.path.join(cache_dir(), "responses.sqlite3")
+        self.ttl = ttl_seconds() if ttl is None else ttl
+        self.max_bytes = max_cache_bytes() if max_bytes is None else max_bytes
+        # Counters of this process; the database is shared
+        self.hits = 0
+        self.misses = 0
+        self._ready = False
+        # get/put run in worker threads (see acreate_message)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly around writes
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The cached response for `key` (marked as recently used), or None if absent or expired."""
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT response FROM responses WHERE key = ? AND created >= ?", (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None  # An unreadable cache is a miss, never a failed call
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: str, response: Dict):
+        """Stores a response, then drops expired entries and evicts down to the size bound."""
+        text = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, text, len(text.encode("utf-8")), now, now),
+                )
+                conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                # Keep the most recently used entries that fit in max_bytes
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM responses)"
+                    " WHERE running > ?)",
+                    (self.max_bytes,),
+                )
+                conn.execute("COMMIT")
+        except sqlite3.Error:
+            pass  # A read-only or locked cache must not break the call
+
+    def stats(self) -> Dict:
+        """Hit/miss counts of this process, and entries and size of the shared cache."""
+        try:
+            with closing(self._connect()) as conn:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": entries,
+            "size_bytes": size,
+            "path": self.path,
+        }
+
+    def clear(self):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM responses")
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def response_cache() -> ResponseCache:
+    """The process-wide cache used by call_llm (created on first use)."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,268 @@
+"""
+Retries, deadlines and circuit breaking for the Claude API calls of call_llm.
+
+Transient failures (429 rate limits, 529 overloads, 5xx, connection errors
+and timeouts) are retried with full-jitter exponential backoff, or after the
+delay the API asks for in `retry-after`. Each call has a deadline that
+covers its attempts and waits: a retry that cannot finish in time is not
+started. Other errors (bad request, authentication) are raised at once.
+The local waits of an attempt (rate limiter, concurrency slot) are checked
+against the deadline too, but a call that runs out of time before its
+request is sent fails with DeadlineExceededError: it says nothing about
+the provider.
+
+A circuit breaker per model type opens after CIRCUIT_FAILURE_THRESHOLD
+consecutive transient failures of the API: calls then fail fast with
+LLMUnavailableError for CIRCUIT_COOLDOWN seconds instead of each spending
+its whole retry budget. Once the cooldown is over the breaker is half-open:
+a single call probes the provider, the others keep failing fast until it
+succeeds (closed) or fails (open again). Retries, give-ups and fast
+failures are counted in retry_stats().
+"""
+
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+
+import anthropic
+
+T = TypeVar("T")
+
+# Attempts after the first one
+MAX_RETRIES = int(os.getenv("DEXTER_LLM_MAX_RETRIES", 4))
+
+# Backoff bounds (seconds): the n-th retry waits up to min(cap, base * 2**n)
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Time budget of one call_llm call, attempts and waits included (seconds)
+DEFAULT_DEADLINE = float(os.getenv("DEXTER_LLM_DEADLINE_S", 300))
+
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30.0
+
+# HTTP statuses worth retrying: timeout, conflict, rate limit, server errors and overload
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised without calling the API while the circuit breaker of a model is open."""
+
+    def __init__(self, model_type: str, retry_in: float):
+        state = f"retry in {retry_in:.0f}s" if retry_in > 0 else "probe in progress"
+        super().__init__(f"Claude API unavailable for {model_type} (circuit open, {state})")
+        self.model_type = model_type
+        self.retry_in = retry_in
+
+
+class DeadlineExceededError(TimeoutError):
+    """The deadline of a call ran out in the local queues, before its request was sent."""
+
+
+_stats = {
+    "retries": 0,
+    "retries_by_reason": {},
+    "gave_up": 0,
+    "deadline_exceeded": 0,
+    "circuit_opened": 0,
+    "circuit_rejected": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, reason: Optional[str] = None):
+    with _stats_lock:
+        _stats[name] += 1
+        if reason is not None:
+            _stats["retries_by_reason"][reason] = _stats["retries_by_reason"].get(reason, 0) + 1
+
+
+def retry_stats() -> Dict:
+    """
+    Retries (total and by reason), calls given up, calls out of time before
+    sending, circuit openings and calls rejected while open.
+    """
+    with _stats_lock:
+        return dict(_stats, retries_by_reason=dict(_stats["retries_by_reason"]))
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, DeadlineExceededError):
+        return False
+    if isinstance(error, (anthropic.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def failure_reason(error: BaseException) -> str:
+    """Metric label of a failure: the HTTP status, else the exception class."""
+    status = getattr(error, "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Delay (seconds) asked for by the API in retry-after-ms or retry-after (seconds or HTTP date), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(retry: int) -> float:
+    """Full jitter: uniform between 0 and the capped exponential bound."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** retry))
+
+
+class CircuitBreaker:
+    """
+    Consecutive transient failures of one model type; thread-safe, shared by
+    all event loops. Closed, open during the cooldown, then half-open with
+    at most one probe in flight.
+    """
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, cooldown: float = CIRCUIT_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def admit(self) -> Optional[bool]:
+        """
+        Whether a call may go: False when closed, True for the one probe let
+        through while half-open, None to reject it.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self.probing or time.monotonic() < self.opened_at + self.cooldown:
+                return None
+            self.probing = True
+            return True
+
+    def retry_in(self) -> float:
+        """Seconds until the cooldown ends (0 when closed or half-open)."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(self.opened_at + self.cooldown - time.monotonic(), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            # Past the threshold every failure (the half-open probe included) restarts the cooldown
+            if self.failures >= self.threshold:
+                if self.opened_at is None or time.monotonic() >= self.opened_at + self.cooldown:
+                    _count("circuit_opened")
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """The probe ended without an answer about the provider: the next call probes instead."""
+        with self._lock:
+            self.probing = False
+
+
+def _remaining(end: float) -> float:
+    return max(end - time.monotonic(), 0.0)
+
+
+async def _attempt(
+    send: Callable[[], Awaitable[T]],
+    end: float,
+    wait_turn: Optional[Callable[[float], Awaitable[None]]],
+    slots: Optional[asyncio.Semaphore],
+) -> T:
+    """One request: local waits first (DeadlineExceededError past `end`), then the API call, cancelled at `end`."""
+    if wait_turn is not None:
+        await wait_turn(end)
+    if slots is None:
+        return await asyncio.wait_for(send(), timeout=_remaining(end))
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=_remaining(end))
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError("deadline reached waiting for a concurrency slot") from None
+    try:
+        return await asyncio.wait_for(send(), timeout=_remaining(end))
+    finally:
+        slots.release()
+
+
+async def call_with_retries(
+    send: Callable[[], Awaitable[T]],
+    breaker: CircuitBreaker,
+    model_type: str,
+    deadline: float = DEFAULT_DEADLINE,
+    max_retries: int = MAX_RETRIES,
+    wait_turn: Optional[Callable[[float], Awaitable[None]]] = None,
+    slots: Optional[asyncio.Semaphore] = None,
+) -> T:
+    """
+    Sends the request of `send` until it succeeds, retrying transient
+    failures within `max_retries` and `deadline` seconds. Each attempt first
+    awaits `wait_turn(end)` (a rate limiter given the monotonic time the
+    call must end by) and a `slots` semaphore, if given. Raises
+    LLMUnavailableError while `breaker` is open, DeadlineExceededError when
+    time runs out before a request is sent, the last error when retries or
+    time run out.
+    """
+    end = time.monotonic() + deadline
+    retry = 0
+    while True:
+        probe = breaker.admit()
+        if probe is None:
+            _count("circuit_rejected")
+            raise LLMUnavailableError(model_type, breaker.retry_in())
+        try:
+            result = await _attempt(send, end, wait_turn, slots)
+        except DeadlineExceededError:
+            # Still queued on our side: not a provider failure
+            if probe:
+                breaker.release_probe()
+            _count("deadline_exceeded")
+            raise
+        except Exception as error:
+            if not is_retryable(error):
+                if probe:
+                    breaker.release_probe()
+                raise
+            breaker.record_failure()
+            delay = retry_after(error)
+            delay = backoff_delay(retry) if delay is None else delay + random.uniform(0, BACKOFF_BASE)
+            if retry >= max_retries or time.monotonic() + delay >= end:
+                _count("gave_up")
+                raise
+            _count("retries", failure_reason(error))
+            retry += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled by the caller
+            if probe:
+                breaker.release_probe()
+            raise
+        breaker.record_success()
+        return result
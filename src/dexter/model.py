@@ -1,15 +1,51 @@
+import asyncio
+import inspect
+import json
 import os
-from anthropic import Anthropic
-from pydantic import BaseModel
-from typing import Type, List, Optional, Literal
+import threading
+import time
+import weakref
+from functools import lru_cache
+from anthropic import AsyncAnthropic
+from pydantic import BaseModel, ValidationError
+from typing import Callable, Type, List, Optional, Literal, Dict, Tuple
 from langchain_core.tools import BaseTool
 from langchain_core.messages import AIMessage
+from anthropic.types import Message
 
+from dexter.llm_cache import cache_enabled, request_key, response_cache
+from dexter.llm_resilience import DEFAULT_DEADLINE, CircuitBreaker, DeadlineExceededError, call_with_retries, retry_stats
 from dexter.prompts import DEFAULT_SYSTEM_PROMPT
 
-# Initialize Anthropic client
-# Make sure your ANTHROPIC_API_KEY is set in your environment
-anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Provider-side prompt caching: marks the end of a prefix reused across calls
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# API calls in flight at once per event loop (sync callers share one background loop)
+MAX_CONCURRENCY = int(os.getenv("DEXTER_LLM_MAX_CONCURRENCY", 16))
+
+# Requests per minute allowed per model type (token bucket refill rate)
+RATE_LIMITS_RPM = {
+    "sonnet": float(os.getenv("DEXTER_LLM_RPM_SONNET", 50)),
+    "haiku": float(os.getenv("DEXTER_LLM_RPM_HAIKU", 100)),
+}
+
+# Bucket capacity, in seconds of refill: requests sent at once after an idle period
+BURST_SECONDS = 5.0
+
+# Token usage of the API calls made by this process (response cache hits excluded)
+_usage_totals = {
+    "calls": 0,
+    "input_tokens": 0,
+    "cache_read_input_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "output_tokens": 0,
+}
+# Structured outputs: API calls made, valid on the first try, repaired, and still invalid after repair
+_structured_totals = {"calls": 0, "valid_first_try": 0, "repaired": 0, "failed": 0}
+_usage_lock = threading.Lock()
+
+# Repair requests sent after a structured output fails validation
+STRUCTURED_REPAIR_ATTEMPTS = 1
 
 # Model selection based on task complexity
 ModelType = Literal["sonnet", "haiku"]
@@ -21,24 +57,185 @@ def get_model_name(model_type: ModelType) -> str:
     else:
         return "claude-3-5-haiku-20241022"  # Haiku for fast/bulk tasks
 
-def call_llm(
-    prompt: str,
-    system_prompt: Optional[str] = None,
-    output_schema: Optional[Type[BaseModel]] = None,
-    tools: Optional[List[BaseTool]] = None,
+class StructuredOutputError(ValueError):
+    """The forced tool call did not match `output_schema`, even after the repair requests."""
+
+class TokenBucket:
+    """Requests-per-minute limiter shared by every thread and event loop of the process."""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns the seconds to wait before using it (the bucket may go negative)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        """Gives back a reserved token that will not be used."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    async def acquire(self, deadline: Optional[float] = None):
+        """
+        Waits for a token. Raises DeadlineExceededError, without keeping it,
+        when the token comes after `deadline` (time.monotonic() value).
+        """
+        wait = self.reserve()
+        if deadline is not None and time.monotonic() + wait > deadline:
+            self.refund()
+            raise DeadlineExceededError(f"deadline reached before the rate limiter frees a request ({wait:.1f}s)")
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.refund()
+                raise
+
+_rate_limiters = {model_type: TokenBucket(rpm) for model_type, rpm in RATE_LIMITS_RPM.items()}
+_circuit_breakers = {model_type: CircuitBreaker() for model_type in RATE_LIMITS_RPM}
+
+# Per event loop: the concurrency semaphore and the async client (asyncio objects are bound to their loop)
+_loop_resources: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, AsyncAnthropic]]" = weakref.WeakKeyDictionary()
+
+def _resources() -> Tuple[asyncio.Semaphore, AsyncAnthropic]:
+    loop = asyncio.get_running_loop()
+    if loop not in _loop_resources:
+        # Make sure your ANTHROPIC_API_KEY is set in your environment.
+        # Retries are handled by llm_resilience, not by the SDK.
+        client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
+        _loop_resources[loop] = (asyncio.Semaphore(MAX_CONCURRENCY), client)
+    return _loop_resources[loop]
+
+def cached_prefix(system_prompt: str, tools: Optional[List[Dict]]) -> Tuple[List[Dict], Optional[List[Dict]]]:
+    """
+    System blocks and tool definitions with cache breakpoints: the API caches
+    the prompt up to the last tool, then up to the end of the system prompt,
+    so the static prefix is billed at the cache-read rate on later calls.
+    """
+    system = [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}]
+    if tools:
+        tools = tools[:-1] + [dict(tools[-1], cache_control=CACHE_CONTROL)]
+    return system, tools
+
+def usage_metadata(usage) -> Dict:
+    """Anthropic usage as langchain usage metadata (input tokens include the cached ones)."""
+    cache_read = usage.cache_read_input_tokens or 0
+    cache_creation = usage.cache_creation_input_tokens or 0
+    input_tokens = usage.input_tokens + cache_read + cache_creation
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": usage.output_tokens,
+        "total_tokens": input_tokens + usage.output_tokens,
+        "input_token_details": {"cache_read": cache_read, "cache_creation": cache_creation},
+    }
+
+def _record_usage(usage):
+    with _usage_lock:
+        _usage_totals["calls"] += 1
+        _usage_totals["input_tokens"] += usage.input_tokens
+        _usage_totals["cache_read_input_tokens"] += usage.cache_read_input_tokens or 0
+        _usage_totals["cache_creation_input_tokens"] += usage.cache_creation_input_tokens or 0
+        _usage_totals["output_tokens"] += usage.output_tokens
+
+async def acreate_message(
+    kwargs: dict,
+    use_cache: bool,
     model_type: ModelType = "sonnet",
-    temperature: float = 0.0,
-) -> AIMessage:
+    client=None,
+    deadline: float = DEFAULT_DEADLINE,
+    cacheable: Optional[Callable[[Message], bool]] = None,
+) -> Message:
     """
-    Call Claude with appropriate model based on task complexity.
+    messages.create through the on-disk response cache when `use_cache`,
+    for the responses `cacheable` accepts (default: all of them). On
+    a cache miss each attempt waits for the rate limiter of `model_type`,
+    then for a concurrency slot; transient errors are retried within
+    `deadline` seconds (see llm_resilience). `client` (default: the async
+    client of the running loop) may also be a synchronous client, e.g. a
+    local fake in tests.
+    """
+    if use_cache:
+        cache = response_cache()
+        key = request_key(kwargs)
+        # SQLite calls block (a writer holds the lock up to BUSY_TIMEOUT): keep them off the event loop
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            cached = Message.model_validate(cached)
+            if cacheable is None or cacheable(cached):
+                return cached
 
-    Args:
-        prompt: User prompt
-        system_prompt: System instructions
-        output_schema: Pydantic model for structured output
-        tools: List of tools for function calling
-        model_type: "sonnet" for complex tasks, "haiku" for fast/bulk
-        temperature: Model temperature (0 = deterministic)
+    semaphore, default_client = _resources()
+
+    async def send() -> Message:
+        response = (client or default_client).messages.create(**kwargs)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
+    response = await call_with_retries(
+        send,
+        _circuit_breakers[model_type],
+        model_type,
+        deadline=deadline,
+        wait_turn=_rate_limiters[model_type].acquire,
+        slots=semaphore,
+    )
+
+    _record_usage(response.usage)
+    if use_cache and (cacheable is None or cacheable(response)):
+        await asyncio.to_thread(cache.put, key, response.model_dump(mode="json"))
+    return response
+
+def llm_usage_stats() -> dict:
+    """
+    Tokens of the API calls made so far, with the share of input read from
+    the prompt cache, and the retries and circuit breaker events.
+    """
+    with _usage_lock:
+        stats = dict(_usage_totals, **retry_stats())
+        structured = dict(_structured_totals)
+    # Calls whose output could not be used as is
+    structured["wasted_calls"] = structured["calls"] - structured["valid_first_try"] - structured["repaired"]
+    stats["structured_outputs"] = structured
+    prompt_tokens = stats["input_tokens"] + stats["cache_read_input_tokens"] + stats["cache_creation_input_tokens"]
+    stats["cache_read_pct"] = round(stats["cache_read_input_tokens"] / prompt_tokens * 100, 1) if prompt_tokens else None
+    return stats
+
+def llm_cache_stats() -> dict:
+    """Hit/miss counts and size of the call_llm response cache."""
+    return response_cache().stats()
+
+@lru_cache(maxsize=None)
+def output_tool(output_schema: Type[BaseModel]) -> Dict:
+    """Tool definition whose input is `output_schema` (JSON schema computed once per class; do not mutate)."""
+    return {
+        "name": output_schema.__name__,
+        "description": (output_schema.__doc__ or f"Returns a {output_schema.__name__}.").strip(),
+        "input_schema": output_schema.model_json_schema(),
+    }
+
+def build_request(
+    prompt: str,
+    system_prompt: Optional[str],
+    tools: Optional[List[BaseTool]],
+    model_type: ModelType,
+    temperature: float,
+    prompt_cache: bool,
+    output_schema: Optional[Type[BaseModel]] = None,
+) -> Dict:
+    """
+    messages.create arguments of a call_llm call. With `output_schema` the
+    model is forced to call a single tool taking that schema as input (the
+    other tools are not offered).
     """
     final_system_prompt = system_prompt if system_prompt else DEFAULT_SYSTEM_PROMPT
     model_name = get_model_name(model_type)
@@ -54,11 +251,12 @@ def call_llm(
             }
             for tool in tools
         ]
+    if output_schema:
+        anthropic_tools = [output_tool(output_schema)]
 
     # Build message
     messages = [{"role": "user", "content": prompt}]
 
-    # Call Anthropic API
     kwargs = {
         "model": model_name,
         "max_tokens": 4096,
@@ -67,12 +265,44 @@ def call_llm(
         "messages": messages,
     }
 
+    if prompt_cache:
+        kwargs["system"], anthropic_tools = cached_prefix(final_system_prompt, anthropic_tools)
+
     if anthropic_tools:
         kwargs["tools"] = anthropic_tools
+    if output_schema:
+        kwargs["tool_choice"] = {"type": "tool", "name": output_schema.__name__}
+    return kwargs
 
-    response = anthropic_client.messages.create(**kwargs)
+def parse_structured(response: Message, output_schema: Type[BaseModel]) -> Tuple[Optional[BaseModel], Optional[Dict], str]:
+    """The validated output, or None with the tool input received and what is wrong with it."""
+    block = next((b for b in response.content if b.type == "tool_use" and b.name == output_schema.__name__), None)
+    if block is None:
+        return None, None, f"no call to the {output_schema.__name__} tool"
+    try:
+        return output_schema.model_validate(block.input), block.input, ""
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(str(p) for p in err['loc']) or '(root)'}: {err['msg']}" for err in e.errors())
+        return None, block.input, errors
 
-    # Convert to AIMessage format for compatibility
+def repair_request(kwargs: Dict, output_schema: Type[BaseModel], received: Optional[Dict], errors: str) -> Dict:
+    """
+    Short follow-up to an invalid structured output: same system prompt and
+    forced tool (a cached prefix), but a user message holding only the input
+    received and the validation errors instead of the original prompt.
+    """
+    name = output_schema.__name__
+    received_text = json.dumps(received, ensure_ascii=False, default=str) if received is not None else "(none)"
+    content = (
+        f"Your {name} tool input does not match its schema.\n"
+        f"Input received: {received_text}\n"
+        f"Errors: {errors}\n"
+        f"Call {name} again with a corrected input. Keep the values that were valid."
+    )
+    return dict(kwargs, messages=[{"role": "user", "content": content}])
+
+def to_ai_message(response: Message) -> AIMessage:
+    """Converts an API response to an AIMessage."""
     content = ""
     tool_calls = []
 
@@ -86,17 +316,127 @@ def call_llm(
                 "id": block.id
             })
 
-    ai_message = AIMessage(content=content, tool_calls=tool_calls if tool_calls else None)
+    return AIMessage(content=content, tool_calls=tool_calls, usage_metadata=usage_metadata(response.usage))
 
-    # Handle structured output if requested
-    if output_schema:
-        import json
-        # Parse the content as JSON and validate with Pydantic
-        try:
-            data = json.loads(content)
-            return output_schema(**data)
-        except:
-            # Fallback: return raw message
-            return ai_message
-
-    return ai_message
+async def acall_llm(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    output_schema: Optional[Type[BaseModel]] = None,
+    tools: Optional[List[BaseTool]] = None,
+    model_type: ModelType = "sonnet",
+    temperature: float = 0.0,
+    cache: Optional[bool] = None,
+    prompt_cache: bool = True,
+    client=None,
+    deadline: float = DEFAULT_DEADLINE,
+) -> AIMessage:
+    """
+    Async call_llm: same arguments and result. Calls from any number of
+    tasks are bounded by the per-model rate limit (DEXTER_LLM_RPM_SONNET,
+    DEXTER_LLM_RPM_HAIKU) and by DEXTER_LLM_MAX_CONCURRENCY calls in flight,
+    e.g. asyncio.gather(*(acall_llm(p, model_type="haiku") for p in prompts)).
+    """
+    kwargs = build_request(prompt, system_prompt, tools, model_type, temperature, prompt_cache, output_schema)
+    if cache is None:
+        cache = temperature == 0 and cache_enabled()
+    if not output_schema:
+        response = await acreate_message(kwargs, cache, model_type=model_type, client=client, deadline=deadline)
+        return to_ai_message(response)
+
+    # Invalid outputs are never cached: a replay would fail the same way for the whole TTL
+    def valid(response: Message) -> bool:
+        return parse_structured(response, output_schema)[0] is not None
+
+    response = await acreate_message(
+        kwargs, cache, model_type=model_type, client=client, deadline=deadline, cacheable=valid
+    )
+    result, received, errors = parse_structured(response, output_schema)
+    repairs = 0
+    while result is None and repairs < STRUCTURED_REPAIR_ATTEMPTS:
+        repairs += 1
+        repair = repair_request(kwargs, output_schema, received, errors)
+        response = await acreate_message(
+            repair, cache, model_type=model_type, client=client, deadline=deadline, cacheable=valid
+        )
+        result, received, errors = parse_structured(response, output_schema)
+
+    with _usage_lock:
+        _structured_totals["calls"] += repairs + 1
+        outcome = "failed" if result is None else "repaired" if repairs else "valid_first_try"
+        _structured_totals[outcome] += 1
+    if result is None:
+        raise StructuredOutputError(f"{output_schema.__name__} output still invalid after {repairs} repair request(s): {errors}")
+    return result
+
+# Event loop running the calls of synchronous callers, in a daemon thread: (pid, loop)
+_sync_loop: Optional[Tuple[int, asyncio.AbstractEventLoop]] = None
+_sync_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    with _sync_loop_lock:
+        # A forked child does not inherit the thread: start its own loop
+        if _sync_loop is None or _sync_loop[0] != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="dexter-llm", daemon=True).start()
+            _sync_loop = (os.getpid(), loop)
+        return _sync_loop[1]
+
+def call_llm(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    output_schema: Optional[Type[BaseModel]] = None,
+    tools: Optional[List[BaseTool]] = None,
+    model_type: ModelType = "sonnet",
+    temperature: float = 0.0,
+    cache: Optional[bool] = None,
+    prompt_cache: bool = True,
+    client=None,
+    deadline: float = DEFAULT_DEADLINE,
+) -> AIMessage:
+    """
+    Call Claude with appropriate model based on task complexity.
+
+    Args:
+        prompt: User prompt
+        system_prompt: System instructions
+        output_schema: Pydantic model for structured output: the model is
+            forced to call a tool taking this schema as input, and an
+            invalid input gets one short repair request. Returns an
+            instance of the schema or raises StructuredOutputError.
+        tools: List of tools for function calling
+        model_type: "sonnet" for complex tasks, "haiku" for fast/bulk
+        temperature: Model temperature (0 = deterministic)
+        cache: Reuse an identical earlier response from the on-disk cache
+            (default: only at temperature 0, unless DEXTER_LLM_CACHE=0)
+        prompt_cache: Mark the system prompt and tool definitions for
+            provider-side prompt caching
+        client: Anthropic client to call (default: the async client; a
+            local fake in tests)
+        deadline: Seconds the call may take, retries included
+            (DEXTER_LLM_DEADLINE_S, default 300)
+
+    Transient API errors (429, 529 overloaded, 5xx, connection errors) are
+    retried with jittered exponential backoff or after `retry-after`; while
+    the provider keeps failing, calls fail fast with LLMUnavailableError.
+
+    The returned AIMessage carries the token usage of the call in
+    `usage_metadata`, with the cache-read and cache-write input tokens in
+    `input_token_details`.
+
+    Thin wrapper over acall_llm: the call runs on a background event loop
+    shared by all synchronous callers, under the same limits.
+    """
+    coro = acall_llm(
+        prompt,
+        system_prompt=system_prompt,
+        output_schema=output_schema,
+        tools=tools,
+        model_type=model_type,
+        temperature=temperature,
+        cache=cache,
+        prompt_cache=prompt_cache,
+        client=client,
+        deadline=deadline,
+    )
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
@@ -162,7 +162,7 @@ class RedFlag(BaseModel):
     """Represents a deal-breaker or significant concern."""
     category: Literal[
         "Déclin structurel", "Concentration client", "Concentration fournisseur",
-        "Litiges", "Actif immobilier", "Réglementation", "Management", "Autre"
+        "Litiges", "Actif immobilier", "Réglementation", "Management", "Anomalie comptable", "Autre"
     ]
     severity: Literal["Critical", "High", "Medium", "Low"]
     description: str = Field(..., description="Detailed description of the red flag")
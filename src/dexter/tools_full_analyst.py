@@ -25,6 +25,8 @@ from dexter.schemas import (
     # Common
     Sector, Geography
 )
+from dexter.fec.batch import portfolio_overlap_batch
+from dexter.fec.overlap import DISPERSION_CV
 
 # ========================================
 # PHASE 1: SOURCING TOOLS
@@ -311,9 +313,18 @@ def create_100_day_plan(target: TargetCompany, dd_report: DueDiligenceReport) ->
 class IdentifySynergiesInput(BaseModel):
     target: TargetCompany
     existing_portfolio: Optional[List[str]] = Field(None, description="Existing portfolio companies if any")
+    fec_paths: Optional[List[str]] = Field(None, description="FEC files and/or directories of the target and the portfolio companies, to size purchasing synergies from their shared suppliers")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
 
 @tool(args_schema=IdentifySynergiesInput)
-def identify_synergies(target: TargetCompany, existing_portfolio: Optional[List[str]]) -> List[Synergy]:
+def identify_synergies(
+    target: TargetCompany,
+    existing_portfolio: Optional[List[str]],
+    fec_paths: Optional[List[str]] = None,
+    encoding: str = "latin-1",
+    separator: str = "|"
+) -> List[Synergy]:
     """
     Identifies synergy opportunities:
     - Revenue synergies (cross-sell, geo expansion)
@@ -321,15 +332,45 @@ def identify_synergies(target: TargetCompany, existing_portfolio: Optional[List[
     - Operational synergies (process improvements)
     - Financial synergies (better financing terms)
 
+    With fec_paths, the purchasing synergy is quantified from the 401
+    suppliers shared by the companies (combined spend, dispersion of the
+    average invoice) and the 411 clients they share are listed.
+
     Model: Sonnet 4.5 for strategic analysis.
     Returns: List[Synergy] with value quantification.
     """
-    return {
+    result = {
         "instruction": "Use Sonnet 4.5 to identify and quantify synergies",
         "target": target.dict(),
         "existing_portfolio": existing_portfolio,
         "output": "List[Synergy]"
     }
+    if not fec_paths:
+        return result
+
+    overlap = portfolio_overlap_batch(fec_paths, encoding=encoding, separator=separator)
+    result["overlap"] = overlap
+    suppliers = overlap.get("suppliers") or {}
+    if suppliers.get("n_shared"):
+        dispersed = [s["name"] for s in suppliers["shared"] if s["average_invoice_cv"] > DISPERSION_CV][:5]
+        description = (
+            f"Achats groupés : {suppliers['n_shared']} fournisseurs communs à plusieurs sociétés, "
+            f"{suppliers['shared_spend']:,.0f} € TTC facturés ({suppliers['shared_spend_pct']:.1f}% des achats), "
+            f"économie de {overlap['savings_rate_pct']:.1f}% sur le montant HT"
+        )
+        if dispersed:
+            description += f" ; écarts de facture moyenne entre sociétés à renégocier : {', '.join(dispersed)}"
+        result["quantified_synergies"] = [Synergy(
+            category="Cost",
+            description=description,
+            annual_value_eur=overlap["purchasing_savings"],
+            timeline_to_realize="12 months",
+            confidence="Medium",
+            implementation_complexity="Medium",
+            responsible_function="Achats",
+        ).model_dump()]
+        result["instruction"] += "; keep the quantified purchasing synergy from the ledgers and add the others"
+    return result
 
 class DefineIntegrationKPIsInput(BaseModel):
     target_name: str
@@ -6,7 +6,6 @@ Includes accounting system mapping and sector-specific adjustments.
 from langchain.tools import tool
 from typing import List, Dict, Optional, Literal
 import os
-import pandas as pd
 import requests
 from pydantic import BaseModel, Field
 
@@ -15,6 +14,13 @@ from dexter.schemas import (
     FourPillarsScore, RedFlag, Valuation, Comparable,
     Sector, Geography, AccountingStandard
 )
+from dexter.fec.accounts import PCG_ACCOUNTS
+from dexter.fec.analysis import analyze_fec, analyze_payments, normalize_fec_ebitda, restate_fec_leases, scan_fec_anomalies
+from dexter.fec.analysis import analyze_account_variance as account_variance_report
+from dexter.fec.analysis import analyze_recurring_revenue as recurring_revenue_report
+from dexter.fec.batch import analyze_fec_batch, consolidate_fec_batch, discover_fec_files
+from dexter.fec.sampling import DEFAULT_SAMPLE_BYTES
+from dexter.fec.store import query_ledger as query_ledger_store
 
 # ========== Accounting System Mapping ==========
 
@@ -100,82 +106,93 @@ GEOGRAPHY_COST_INDEX = {
     "Autre": 1.00
 }
 
-# ========== French Plan Comptable Général (PCG) ==========
-# Key account ranges for EBITDA normalization and red flag detection
-
-PCG_ACCOUNTS = {
-    # Revenue accounts (Class 7)
-    "revenue": {
-        "701": "Ventes de produits finis",
-        "703": "Ventes de marchandises",
-        "706": "Prestations de services",
-        "708": "Produits des activités annexes",
-    },
-
-    # Operating expenses (Class 6) - for EBITDA adjustments
-    "operating_expenses": {
-        "601-607": "Achats",
-        "611": "Sous-traitance générale",
-        "612": "Redevances de crédit-bail",  # Key for lease normalization
-        "613-614": "Locations et charges locatives",
-        "615-616": "Entretien, réparations",
-        "621-628": "Personnel",
-        "631-637": "Impôts et taxes",
-        "641": "Rémunérations du personnel",
-        "644": "Rémunération du travail de l'exploitant",  # KEY: Owner compensation
-        "645": "Charges de sécurité sociale et de prévoyance",
-        "681": "Dotations aux amortissements",  # Add back for EBITDA
-        "6815": "Dotations aux provisions d'exploitation",  # Add back for EBITDA
-    },
-
-    # Financial accounts
-    "financial": {
-        "661": "Charges d'intérêts",
-        "761": "Produits financiers",
-    },
-
-    # Exceptional items (Class 67/77) - for normalization
-    "exceptional": {
-        "671": "Charges exceptionnelles sur opérations de gestion",
-        "771": "Produits exceptionnels sur opérations de gestion",
-    },
+# ========== Tool Input Schemas ==========
 
-    # Balance sheet - Assets (Class 2)
-    "fixed_assets": {
-        "20": "Immobilisations incorporelles",
-        "21": "Immobilisations corporelles",
-        "23": "Immobilisations en cours",
-    },
+class ReadFECInput(BaseModel):
+    """Input for reading FEC (Fichier des Écritures Comptables)."""
+    fec_path: str = Field(..., description="Path to FEC file (.txt or .csv)")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    chunksize: Optional[int] = Field(None, description="Stream the file in batches of this many lines (for multi-GB FECs)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of this FEC if available")
+    incremental: bool = Field(False, description="Monthly close mode: only re-aggregate months that are new or restated since the previous extract of the same ledger")
+    ledger_id: Optional[str] = Field(None, description="Identifies successive extracts of one company's ledger in incremental mode (default: SIREN from the FEC file name)")
+    sample: bool = Field(False, description="First-look screening of a huge FEC: estimate revenue, EBITDA proxy and concentration with 95% confidence intervals from a byte sample")
+    sample_bytes: int = Field(DEFAULT_SAMPLE_BYTES, description="Bytes read in sampling mode (files up to this size are read exactly)")
+
+class ReadFECBatchInput(BaseModel):
+    """Input for analyzing several FECs (entities x fiscal years) in parallel."""
+    fec_paths: List[str] = Field(..., description="FEC files and/or directories containing FEC files (.txt or .csv)")
+    max_workers: Optional[int] = Field(None, description="Worker processes (default: one per CPU core)")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    chunksize: Optional[int] = Field(None, description="Stream each file in batches of this many lines (bounds memory per worker)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of each FEC if available")
+
+class ConsolidateGroupInput(BaseModel):
+    """Input for consolidating the FECs of a group's entities."""
+    fec_paths: List[str] = Field(..., description="FEC files and/or directories, one fiscal year per entity")
+    aliases: Optional[Dict[str, List[str]]] = Field(None, description="Per entity, the SIREN, CompAuxNum codes or names the other entities use for it (e.g. {'filialeb': ['C_FILB']})")
+    max_workers: Optional[int] = Field(None, description="Worker processes (default: one per CPU core)")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of each FEC if available")
 
-    # Balance sheet - Liabilities (Class 1, 4)
-    "equity_debt": {
-        "101": "Capital",
-        "106": "Réserves",
-        "12": "Résultat de l'exercice",
-        "16": "Emprunts et dettes",
-        "164": "Emprunts auprès des établissements de crédit",
-    },
+class AnalyzeAccountVarianceInput(BaseModel):
+    """Input for the year-over-year account variance of one company."""
+    fec_paths: List[str] = Field(..., description="FEC files and/or directories of one company, two fiscal years or more")
+    top_n: int = Field(20, description="Number of top movers returned")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of each FEC if available")
 
-    # Client accounts (Class 411) - for concentration analysis
-    "clients": {
-        "411": "Clients",
-        "4110-4119999": "Comptes clients individuels",
-    },
+class QueryLedgerInput(BaseModel):
+    """Input for ad-hoc queries on the entries of a FEC."""
+    fec_path: str = Field(..., description="Path to FEC file (.txt or .csv)")
+    query: Literal["balances", "monthly", "counterparties", "entries"] = Field(
+        ..., description="balances: per account; monthly: per month; counterparties: largest clients/suppliers; entries: matching lines"
+    )
+    account: Optional[str] = Field(None, description="Account prefix or range, e.g. '6226', '60', '601-607' (counterparties default: '411', use '401' for suppliers)")
+    start_date: Optional[str] = Field(None, description="First EcritureDate included (YYYY-MM-DD)")
+    end_date: Optional[str] = Field(None, description="Last EcritureDate included (YYYY-MM-DD)")
+    journal: Optional[str] = Field(None, description="JournalCode, e.g. 'BQ', 'VT', 'OD'")
+    label: Optional[str] = Field(None, description="Text searched in EcritureLib (case-insensitive)")
+    limit: Optional[int] = Field(None, description="Maximum number of rows returned")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
 
-    # Supplier accounts (Class 401) - for concentration analysis
-    "suppliers": {
-        "401": "Fournisseurs",
-        "4010-4019999": "Comptes fournisseurs individuels",
-    },
-}
+class AnalyzeReceivablesInput(BaseModel):
+    """Input for invoice/settlement matching on the client or supplier sub-ledger of a FEC."""
+    fec_path: str = Field(..., description="Path to FEC file (.txt or .csv)")
+    side: Literal["clients", "suppliers"] = Field("clients", description="clients (411) or suppliers (401)")
+    payment_terms_days: int = Field(60, description="Payment terms in days from the invoice date (LME legal maximum: 60)")
+    as_of: Optional[str] = Field(None, description="Aging reference date YYYY-MM-DD (default: last entry of the sub-ledger)")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of this FEC if available")
 
-# ========== Tool Input Schemas ==========
+class AnalyzeRecurringRevenueInput(BaseModel):
+    """Input for recurring revenue detection over one or more fiscal years of an entity."""
+    fec_paths: List[str] = Field(..., description="FEC files and/or directories of the same entity, one file per fiscal year")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of each FEC if available")
 
-class ReadFECInput(BaseModel):
-    """Input for reading FEC (Fichier des Écritures Comptables)."""
+class ScanLedgerAnomaliesInput(BaseModel):
+    """Input for the forensic scan of a FEC."""
     fec_path: str = Field(..., description="Path to FEC file (.txt or .csv)")
+    top_n: Optional[int] = Field(None, description="Keep only the N highest-ranked red flags")
     encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
     separator: str = Field("|", description="Field separator (| or ; or tab)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of this FEC if available")
+
+class RestateLeasesInput(BaseModel):
+    """Input for the IFRS 16 restatement of the leases of one or more targets."""
+    fec_paths: List[str] = Field(..., description="FEC files and/or directories, one FEC per target")
+    discount_rate: float = Field(0.05, description="Incremental borrowing rate used to discount lease payments (0.05 = 5%)")
+    encoding: str = Field("latin-1", description="File encoding (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator (| or ; or tab)")
+    use_cache: bool = Field(True, description="Reuse the on-disk parsed copy of each FEC if available")
 
 class ExtractIMDataInput(BaseModel):
     """Input for extracting data from Information Memorandum."""
@@ -186,17 +203,28 @@ class NormalizeEBITDAInput(BaseModel):
     target: TargetCompany = Field(..., description="Target company information")
     financials: FinancialMetrics = Field(..., description="Raw financial metrics")
     im_text: Optional[str] = Field(None, description="Full IM text for additional context")
+    fec_path: Optional[str] = Field(None, description="FEC of the target: quantifies the ledger-driven adjustments without an LLM call")
+    market_manager_cost: Optional[float] = Field(None, description="Loaded yearly cost (EUR) of a hired manager at the baseline geography (default 110,000)")
+    add_back_credit_bail: bool = Field(True, description="Add back crédit-bail fees (612) as IFRS 16 would")
+    encoding: str = Field("latin-1", description="File encoding of the FEC (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator of the FEC (| or ; or tab)")
 
 class ScoreFourPillarsInput(BaseModel):
     """Input for scoring the 4 operational pillars."""
     target: TargetCompany = Field(..., description="Target company information")
     business_description: str = Field(..., description="Detailed business model description")
+    fec_paths: Optional[List[str]] = Field(None, description="FEC files of the target (one per fiscal year): scores pillar 2 from the invoicing patterns")
+    encoding: str = Field("latin-1", description="File encoding of the FECs (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator of the FECs (| or ; or tab)")
 
 class DetectRedFlagsInput(BaseModel):
     """Input for red flag detection."""
     target: TargetCompany = Field(..., description="Target company information")
     financials: FinancialMetrics = Field(..., description="Financial metrics")
     im_text: Optional[str] = Field(None, description="Full IM text for additional context")
+    fec_path: Optional[str] = Field(None, description="FEC of the target: adds the ledger anomalies found by scan_ledger_anomalies")
+    encoding: str = Field("latin-1", description="File encoding of the FEC (latin-1, utf-8, cp1252)")
+    separator: str = Field("|", description="Field separator of the FEC (| or ; or tab)")
 
 class ValueTargetInput(BaseModel):
     """Input for target valuation."""
@@ -206,14 +234,26 @@ class ValueTargetInput(BaseModel):
 # ========== Tools ==========
 
 @tool(args_schema=ReadFECInput)
-def read_fec(fec_path: str, encoding: str = "latin-1", separator: str = "|") -> Dict:
+def read_fec(
+    fec_path: str,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    chunksize: Optional[int] = None,
+    use_cache: bool = True,
+    incremental: bool = False,
+    ledger_id: Optional[str] = None,
+    sample: bool = False,
+    sample_bytes: int = DEFAULT_SAMPLE_BYTES
+) -> Dict:
     """
     Reads and analyzes a French FEC (Fichier des Écritures Comptables) file for MBI due diligence.
 
     MISSION: Provide precise, day-accurate financial analysis for acquisition targets.
 
     Key capabilities:
-    - Day-accurate interest/revenue calculations (no approximations)
+    - Day-accurate balances: average daily cash (512), outstanding debt (164)
+      and actual/365 effective rate, DSO/DPO and working capital (BFR)
+      min/max/average, in `daily_balances`
     - EBITDA normalization with French GAAP account mapping
     - Client/supplier concentration (red flag if >30%)
     - Owner compensation analysis (account 644)
@@ -233,203 +273,315 @@ def read_fec(fec_path: str, encoding: str = "latin-1", separator: str = "|") ->
     - Concentration risks
     - Red flags for due diligence
     - Account-level detail for deep-dive analysis
+
+    Set `chunksize` for multi-GB ledgers: the file is streamed in batches of
+    that many lines, so peak memory depends on the number of accounts rather
+    than the number of lines. The output is the same as a full load.
+
+    Parsed ledgers are cached on disk (keyed by file content, encoding and
+    separator); `cache.hit` in the result tells whether the text file was
+    re-parsed. Pass use_cache=False to bypass the cache.
+
+    Set `incremental=True` for the monthly extracts of a portfolio company:
+    per-month aggregates of the previous extract are kept, and only months
+    that are new or were restated (detected by a per-month fingerprint) are
+    re-aggregated. `incremental` in the result lists them along with the
+    EcritureDate/ValidDate watermark.
+
+    Set `sample=True` for a first look at a huge FEC: only `sample_bytes` of
+    the file are read, in blocks spread over the whole file, and the result
+    gives revenue, expenses, EBITDA proxy, margin and top-5 client/supplier
+    shares as estimates with 95% confidence intervals. `exact_path_needed`
+    tells (with `reasons`) when the exact read is required, e.g. when the
+    EBITDA interval straddles a bound of the 500k-2M€ thesis range.
     """
-    try:
-        # Read FEC file
-        # Try different separators if | doesn't work
-        separators_to_try = [separator, "|", ";", "\t"]
-        df = None
-
-        for sep in separators_to_try:
-            try:
-                df = pd.read_csv(
-                    fec_path,
-                    sep=sep,
-                    encoding=encoding,
-                    dtype=str,  # Read all as string first
-                    low_memory=False
-                )
-                if len(df.columns) >= 10:  # FEC should have at least 10 columns
-                    break
-            except:
-                continue
-
-        if df is None or len(df.columns) < 10:
-            return {
-                "error": "Could not parse FEC file. Try different encoding or separator.",
-                "tried_separators": separators_to_try,
-                "encoding": encoding
-            }
+    return analyze_fec(
+        fec_path,
+        encoding=encoding,
+        separator=separator,
+        chunksize=chunksize,
+        use_cache=use_cache,
+        incremental=incremental,
+        ledger_id=ledger_id,
+        sample=sample,
+        sample_bytes=sample_bytes
+    )
 
-        # Standardize column names (some FEC files have different casing)
-        df.columns = [col.strip() for col in df.columns]
-
-        # Convert amounts to float
-        if 'Debit' in df.columns:
-            df['Debit'] = pd.to_numeric(df['Debit'].str.replace(',', '.'), errors='coerce').fillna(0)
-        if 'Credit' in df.columns:
-            df['Credit'] = pd.to_numeric(df['Credit'].str.replace(',', '.'), errors='coerce').fillna(0)
-
-        # Convert dates
-        if 'EcritureDate' in df.columns:
-            df['EcritureDate'] = pd.to_datetime(df['EcritureDate'], format='%Y%m%d', errors='coerce')
-
-        # Basic statistics
-        total_entries = len(df)
-        date_range = (df['EcritureDate'].min(), df['EcritureDate'].max()) if 'EcritureDate' in df.columns else None
-        unique_accounts = df['CompteNum'].nunique() if 'CompteNum' in df.columns else 0
-
-        # Calculate exact number of days in period (for annualization)
-        nb_days_in_period = (date_range[1] - date_range[0]).days if date_range else 365
-        period_factor = 365.25 / nb_days_in_period if nb_days_in_period > 0 else 1
-
-        # Revenue analysis (Class 7)
-        revenue_accounts = df[df['CompteNum'].str.startswith('7', na=False)]
-        total_revenue = revenue_accounts['Credit'].sum() - revenue_accounts['Debit'].sum()
-
-        # Expense analysis (Class 6)
-        expense_accounts = df[df['CompteNum'].str.startswith('6', na=False)]
-        total_expenses = expense_accounts['Debit'].sum() - expense_accounts['Credit'].sum()
-
-        # Account 644 - Owner compensation (key for EBITDA normalization)
-        owner_comp = df[df['CompteNum'].str.startswith('644', na=False)]
-        owner_comp_total = owner_comp['Debit'].sum() - owner_comp['Credit'].sum()
-
-        # Account 681 - Depreciation (add back for EBITDA)
-        depreciation = df[df['CompteNum'].str.startswith('681', na=False)]
-        depreciation_total = depreciation['Debit'].sum() - depreciation['Credit'].sum()
-
-        # Account 6815 - Provisions (add back for EBITDA)
-        provisions = df[df['CompteNum'].str.startswith('6815', na=False)]
-        provisions_total = provisions['Debit'].sum() - provisions['Credit'].sum()
-
-        # Client concentration (411XXX accounts)
-        clients = df[df['CompteNum'].str.match(r'^411\d+', na=False)].copy()
-        if len(clients) > 0:
-            client_balances = clients.groupby('CompteNum').apply(
-                lambda x: (x['Debit'].sum() - x['Credit'].sum())
-            ).sort_values(ascending=False)
-            top_5_clients = client_balances.head(5)
-            top_client_concentration = top_5_clients.sum() / client_balances.sum() if client_balances.sum() != 0 else 0
-        else:
-            top_5_clients = pd.Series()
-            top_client_concentration = 0
-
-        # Supplier concentration (401XXX accounts)
-        suppliers = df[df['CompteNum'].str.match(r'^401\d+', na=False)].copy()
-        if len(suppliers) > 0:
-            supplier_balances = suppliers.groupby('CompteNum').apply(
-                lambda x: (x['Credit'].sum() - x['Debit'].sum())
-            ).sort_values(ascending=False)
-            top_5_suppliers = supplier_balances.head(5)
-            top_supplier_concentration = top_5_suppliers.sum() / supplier_balances.sum() if supplier_balances.sum() != 0 else 0
-        else:
-            top_5_suppliers = pd.Series()
-            top_supplier_concentration = 0
-
-        # Red flags detection
-        red_flags = []
-
-        # Red flag: Client concentration >30%
-        if top_client_concentration > 0.30:
-            red_flags.append({
-                "type": "Concentration client",
-                "severity": "High" if top_client_concentration > 0.50 else "Medium",
-                "description": f"Top 5 clients = {top_client_concentration*100:.1f}% du CA (>30% = risque)"
-            })
-
-        # Red flag: Owner compensation excessive (>10% revenue for small business)
-        if owner_comp_total > 0 and total_revenue > 0:
-            owner_comp_pct = owner_comp_total / total_revenue
-            if owner_comp_pct > 0.10:
-                red_flags.append({
-                    "type": "Rémunération dirigeant excessive",
-                    "severity": "Medium",
-                    "description": f"Compte 644 = {owner_comp_pct*100:.1f}% du CA (normalisable pour EBITDA)",
-                    "adjustable_amount": round(owner_comp_total, 2)
-                })
-
-        # Red flag: Loss-making
-        if (total_revenue - total_expenses) < 0:
-            red_flags.append({
-                "type": "Résultat déficitaire",
-                "severity": "High",
-                "description": f"Perte de {abs(total_revenue - total_expenses):,.2f} €"
-            })
-
-        # Monthly seasonality analysis
-        monthly_revenue = revenue_accounts.groupby(revenue_accounts['EcritureDate'].dt.to_period('M')).apply(
-            lambda x: (x['Credit'].sum() - x['Debit'].sum())
-        )
-        if len(monthly_revenue) >= 3:
-            revenue_std = monthly_revenue.std()
-            revenue_mean = monthly_revenue.mean()
-            coef_variation = (revenue_std / revenue_mean) if revenue_mean > 0 else 0
-            high_seasonality = coef_variation > 0.3
-        else:
-            coef_variation = 0
-            high_seasonality = False
+@tool(args_schema=ReadFECBatchInput)
+def read_fec_batch(
+    fec_paths: List[str],
+    max_workers: Optional[int] = None,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    chunksize: Optional[int] = None,
+    use_cache: bool = True
+) -> Dict:
+    """
+    Analyzes all the FECs of a group (several legal entities x 3-5 fiscal
+    years) in parallel, one worker process per CPU core.
 
-        return {
-            "success": True,
-            "file_path": fec_path,
-            "total_entries": total_entries,
-            "date_range": {
-                "start": date_range[0].strftime('%Y-%m-%d') if date_range else None,
-                "end": date_range[1].strftime('%Y-%m-%d') if date_range else None,
-                "nb_days": nb_days_in_period,
-                "is_full_year": abs(nb_days_in_period - 365) < 10
-            },
-            "unique_accounts": unique_accounts,
-            "financials": {
-                "total_revenue": round(total_revenue, 2),
-                "total_revenue_annualized": round(total_revenue * period_factor, 2),
-                "total_expenses": round(total_expenses, 2),
-                "result_before_tax": round(total_revenue - total_expenses, 2),
-                "owner_compensation_644": round(owner_comp_total, 2),
-                "depreciation_681": round(depreciation_total, 2),
-                "provisions_6815": round(provisions_total, 2),
-                "ebitda_proxy": round(total_revenue - total_expenses + depreciation_total + provisions_total, 2),
-                "ebitda_margin_pct": round(((total_revenue - total_expenses + depreciation_total + provisions_total) / total_revenue * 100), 2) if total_revenue > 0 else 0
-            },
-            "concentration": {
-                "top_client_concentration_pct": round(top_client_concentration * 100, 2),
-                "top_5_clients": top_5_clients.head(5).to_dict(),
-                "top_supplier_concentration_pct": round(top_supplier_concentration * 100, 2),
-                "top_5_suppliers": top_5_suppliers.head(5).to_dict(),
-                "client_risk": "HIGH" if top_client_concentration > 0.30 else "LOW"
-            },
-            "seasonality": {
-                "coefficient_variation": round(coef_variation, 3),
-                "high_seasonality": high_seasonality,
-                "note": "Coef > 0.3 = forte saisonnalité (risque cash flow)"
-            },
-            "red_flags": red_flags,
-            "dd_notes": {
-                "period_accuracy": f"Période de {nb_days_in_period} jours (facteur annualisation: {period_factor:.3f})",
-                "ebitda_adjustments_needed": owner_comp_total > 0 or depreciation_total > 0 or provisions_total > 0,
-                "key_accounts_to_review": [
-                    "644 (Rémunération exploitant)" if owner_comp_total > 0 else None,
-                    "411XXX (Détail clients)" if top_client_concentration > 0.30 else None,
-                    "67X (Charges exceptionnelles à normaliser)"
-                ]
-            },
-            "next_steps": [
-                "Use normalize_ebitda tool with FEC insights",
-                f"Analyze owner_compensation_644: {owner_comp_total:,.2f} EUR" if owner_comp_total > 0 else "No owner compensation detected",
-                f"⚠️ Client concentration = {top_client_concentration*100:.1f}% - red flag if >30%" if top_client_concentration > 0.30 else "Client diversification OK",
-                "Review monthly revenue trend for seasonality",
-                f"⚠️ Period = {nb_days_in_period} days - annualize metrics" if not abs(nb_days_in_period - 365) < 10 else "Full year data"
-            ]
-        }
+    Use instead of calling read_fec file by file. Each file is identified by
+    the official name <SIREN>FEC<AAAAMMJJ>.txt (entity = SIREN, fiscal year =
+    closing year), or else by its name and the last date of the ledger.
+
+    Returns:
+    - files: the read_fec report of every file, with its entity and fiscal year
+    - errors: files that could not be read
+    - year_over_year: per entity, one row per fiscal year with revenue,
+      EBITDA proxy and margin, account 644, client/supplier concentration and
+      the growth vs the prior year
+    """
+    return analyze_fec_batch(
+        fec_paths,
+        max_workers=max_workers,
+        encoding=encoding,
+        separator=separator,
+        chunksize=chunksize,
+        use_cache=use_cache
+    )
+
+@tool(args_schema=ConsolidateGroupInput)
+def consolidate_group(
+    fec_paths: List[str],
+    aliases: Optional[Dict[str, List[str]]] = None,
+    max_workers: Optional[int] = None,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True
+) -> Dict:
+    """
+    Consolidated figures of a group (holding + acquired companies) from one
+    FEC per entity, intercompany flows eliminated.
 
+    Each entity is identified like in read_fec_batch (SIREN of the official
+    file name, else the file name without its year). Intercompany flows are
+    the 40x/41x/45x lines whose CompAuxNum, CompAuxLib or account names
+    another entity (SIREN, entity name or one of its `aliases`), the sales
+    and purchases of the same entries, and the 451 group current accounts.
+
+    Returns:
+    - pnl: consolidated revenue, EBITDA (with its bridge), net result and PCG balances
+    - balance_sheet: cash, financial debt, net debt, 411/401 and PCG balances
+    - monthly: consolidated revenue and EBITDA per calendar month
+    - entities: each entity's revenue, EBITDA and eliminated amounts
+    - intercompany: eliminated totals, reconciliation of every pair of
+      entities (sales vs purchases, receivable vs payable, 451) and the gaps
+    """
+    return consolidate_fec_batch(
+        fec_paths,
+        aliases=aliases,
+        max_workers=max_workers,
+        encoding=encoding,
+        separator=separator,
+        use_cache=use_cache
+    )
+
+@tool(args_schema=AnalyzeAccountVarianceInput)
+def analyze_account_variance(
+    fec_paths: List[str],
+    top_n: int = 20,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True
+) -> Dict:
+    """
+    Which accounts moved the most between N-1 and N: aligns the FECs of one
+    company on account number and fiscal month and compares them.
+
+    Use instead of calling read_fec once per year and comparing the reports.
+
+    Returns:
+    - years: revenue, EBITDA and number of accounts per fiscal year, with the change vs the prior year
+    - ebitda_change and ebitda_bridge_by_class: EBITDA change N vs N-1 by two-digit account class
+    - top_movers_pnl / top_movers_balance_sheet: accounts ranked by absolute change,
+      with the relative change, the contribution to the EBITDA change and the
+      change month by month
+    - new_accounts / disappeared_accounts: accounts used in only one of the two years
+    """
+    return account_variance_report(
+        discover_fec_files(fec_paths),
+        top_n=top_n,
+        encoding=encoding,
+        separator=separator,
+        use_cache=use_cache
+    )
+
+@tool(args_schema=QueryLedgerInput)
+def query_ledger(
+    fec_path: str,
+    query: str,
+    account: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    journal: Optional[str] = None,
+    label: Optional[str] = None,
+    limit: Optional[int] = None,
+    encoding: str = "latin-1",
+    separator: str = "|"
+) -> Dict:
+    """
+    Answers follow-up questions on the entries of a FEC ("what hit account
+    6226 in March?", "largest clients in H1", "bank entries labelled URSSAF")
+    without re-reading the file.
+
+    The first call on a file loads it into a local SQLite database indexed
+    on CompteNum, CompAuxNum, EcritureDate and JournalCode (about a minute
+    for 2M lines); later calls answer in milliseconds. The database is
+    rebuilt when the file changes.
+
+    Queries (all filters optional and combinable):
+    - balances: debit, credit and balance per account
+    - monthly: debit, credit and balance per month
+    - counterparties: largest balances of a 411/401 range, per CompAuxNum
+      sub-ledger account or individual account
+    - entries: the matching lines by date, with their count and totals
+    """
+    try:
+        return query_ledger_store(
+            fec_path,
+            query,
+            encoding=encoding,
+            separator=separator,
+            limit=limit,
+            account=account,
+            start_date=start_date,
+            end_date=end_date,
+            journal=journal,
+            label=label
+        )
     except Exception as e:
         return {
-            "error": f"Failed to read FEC: {str(e)}",
+            "error": f"Failed to query ledger: {str(e)}",
             "file_path": fec_path,
-            "encoding": encoding,
-            "separator": separator
+            "query": query
+        }
+
+@tool(args_schema=AnalyzeReceivablesInput)
+def analyze_receivables(
+    fec_path: str,
+    side: str = "clients",
+    payment_terms_days: int = 60,
+    as_of: Optional[str] = None,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True
+) -> Dict:
+    """
+    Real payment behaviour of the clients (411) or suppliers (401) of a FEC:
+    pairs every invoice with the settlement that cleared it.
+
+    Matching uses the lettering codes (EcritureLet/DateLet) first, then for
+    unlettered lines a settlement of the same amount, then the oldest-first
+    allocation of the remaining settlements of each counterparty.
+    `matching` tells how many invoices each method settled.
+
+    Returns:
+    - avg/median payment delay (days, weighted by invoice amount) and the
+      share paid after the payment terms
+    - open invoices: total, aging buckets (0-30, 31-60, 61-90, 91-180, 180+
+      days), overdue exposure beyond the payment terms
+    - top counterparties by invoiced amount (not open balance), with their
+      share, delay, open and overdue amounts
+    """
+    return analyze_payments(
+        fec_path,
+        side=side,
+        payment_terms_days=payment_terms_days,
+        as_of=as_of,
+        encoding=encoding,
+        separator=separator,
+        use_cache=use_cache
+    )
+
+@tool(args_schema=AnalyzeRecurringRevenueInput)
+def analyze_recurring_revenue(
+    fec_paths: List[str],
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True
+) -> Dict:
+    """
+    Detects contractually recurring revenue from the client invoices (411
+    debits) of one or more fiscal years of the same entity.
+
+    Each client's invoices are laid out month by month: a client invoiced
+    every month, quarter or year (80% of the gaps) at a stable amount
+    (coefficient of variation <= 0.25) is recurring.
+
+    Returns:
+    - recurring_revenue_pct: share of the last 12 months of invoicing from
+      recurring clients, split by periodicity (monthly, quarterly, annual)
+    - client_retention_pct: share of the clients of year N-1 still invoiced in N
+    - cohorts: clients by year of first invoice with their client and
+      revenue retention in the following years
+    - top recurring clients and the pillar 2 score (0-10) of score_four_pillars
+    """
+    return recurring_revenue_report(
+        discover_fec_files(fec_paths), encoding=encoding, separator=separator, use_cache=use_cache
+    )
+
+@tool(args_schema=ScanLedgerAnomaliesInput)
+def scan_ledger_anomalies(
+    fec_path: str,
+    top_n: Optional[int] = None,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True
+) -> Dict:
+    """
+    Forensic scan of a FEC: accounting anomalies as RedFlag records
+    (category "Anomalie comptable"), most severe and largest amount first.
+
+    Checks:
+    - Benford: first-digit distribution of each journal's amounts (MAD > 0.015)
+    - Duplicate entries (all lines identical) and near duplicates (same
+      amount on the same 401/411 third party within 7 days)
+    - Entries validated on weekends or French public holidays (> 5%)
+    - Round amounts (whole hundreds of euros) clustering on 6/7 accounts
+    - Entries dated before the closing day but validated after it (ValidDate)
+    - Spikes of the manual journals (OD) in a month
+
+    Returns red_flags (ranked), findings (with amount at stake) and the
+    per-check results (Benford MAD per journal, counts, amounts).
+    """
+    return scan_fec_anomalies(fec_path, encoding=encoding, separator=separator, use_cache=use_cache, top_n=top_n)
+
+@tool(args_schema=RestateLeasesInput)
+def restate_leases(
+    fec_paths: List[str],
+    discount_rate: float = 0.05,
+    encoding: str = "latin-1",
+    separator: str = "|",
+    use_cache: bool = True
+) -> Dict:
+    """
+    IFRS 16 restatement of French GAAP leases (612 crédit-bail, 613
+    locations), to compare French targets with IFRS comparables.
+
+    Each lease (account + lessor) is rebuilt from its postings: monthly
+    payment run-rate, default term per type (crédit-bail 48 months, bail
+    immobilier 108, other rentals 36), remaining term. Low-value leases
+    (< 1,500 EUR a year) stay expensed.
+
+    Returns per FEC:
+    - lease_liability and right_of_use_asset at the end of the ledger
+    - depreciation and interest replacing the lease charge
+    - ebitda_uplift, ebit_impact, net_debt_change
+    - liability_schedule by year and the largest leases
+    and portfolio totals across all FECs.
+    """
+    results = {
+        path: restate_fec_leases(path, discount_rate=discount_rate, encoding=encoding, separator=separator, use_cache=use_cache)
+        for path in discover_fec_files(fec_paths)
+    }
+    restated = [r for r in results.values() if "error" not in r and r["n_leases"] > 0]
+    return {
+        "results": results,
+        "portfolio": {
+            key: round(sum(r[key] for r in restated), 2)
+            for key in ["ebitda_uplift", "lease_liability", "right_of_use_asset", "net_debt_change"]
         }
+    }
 
 @tool(args_schema=ExtractIMDataInput)
 def extract_im_data(im_text: str) -> Dict:
@@ -450,16 +602,44 @@ def extract_im_data(im_text: str) -> Dict:
 def normalize_ebitda(
     target: TargetCompany,
     financials: FinancialMetrics,
-    im_text: Optional[str] = None
+    im_text: Optional[str] = None,
+    fec_path: Optional[str] = None,
+    market_manager_cost: Optional[float] = None,
+    add_back_credit_bail: bool = True,
+    encoding: str = "latin-1",
+    separator: str = "|"
 ) -> Dict:
     """
     Normalizes EBITDA by applying adjustments appropriate for the company's
     accounting standard, sector, and geography.
 
+    With fec_path, the adjustments readable in the ledger are computed
+    deterministically from the PCG balances, each with its accounts:
+    - 644/646 owner compensation vs market manager cost x GEOGRAPHY_COST_INDEX
+    - 612 crédit-bail fees added back (IFRS 16 restatement)
+    - 67x/687 exceptional charges and 77x/787 exceptional income neutralized
+    - 6815 operating provisions net of 7815 reversals added back
+    Sonnet 4.5 is then only needed for the residual_items (related-party
+    rent, travel, fees, write-downs, subsidies).
+
     Uses Sonnet 4.5 for complex analysis and judgment calls.
 
     Returns: List of EBITDAAdjustment + normalized EBITDA value.
     """
+    if fec_path:
+        normalized = normalize_fec_ebitda(
+            fec_path,
+            cost_index=GEOGRAPHY_COST_INDEX.get(target.geography, 1.0),
+            market_manager_cost=market_manager_cost,
+            add_back_credit_bail=add_back_credit_bail,
+            encoding=encoding,
+            separator=separator
+        )
+        if "error" not in normalized and normalized["residual_items"]:
+            normalized["instruction"] = "Call Sonnet 4.5 only to judge residual_items and add their adjustments"
+            normalized["model_to_use"] = "sonnet"
+        return {"accounting_standard": target.accounting_standard, **normalized}
+
     accounting_map = ACCOUNTING_MAPPINGS.get(target.accounting_standard)
 
     # Standard adjustments to consider based on accounting system
@@ -500,7 +680,10 @@ def normalize_ebitda(
 @tool(args_schema=ScoreFourPillarsInput)
 def score_four_pillars(
     target: TargetCompany,
-    business_description: str
+    business_description: str,
+    fec_paths: Optional[List[str]] = None,
+    encoding: str = "latin-1",
+    separator: str = "|"
 ) -> FourPillarsScore:
     """
     Scores a target against the 4 operational pillars:
@@ -509,22 +692,40 @@ def score_four_pillars(
     3. Low digitalization / automation opportunity (0-10)
     4. Diversified client base (0-10)
 
-    Uses Sonnet 4.5 for qualitative assessment.
+    With fec_paths, pillar 2 is scored from the invoicing patterns of the
+    FECs (see analyze_recurring_revenue): 10 at 90%+ recurring revenue.
+    Uses Sonnet 4.5 for qualitative assessment of the other pillars.
     """
+    recurring_revenue = 0
+    comments = "Call Sonnet 4.5 to score based on business description"
+    if fec_paths:
+        recurring = recurring_revenue_report(discover_fec_files(fec_paths), encoding=encoding, separator=separator)
+        if "error" in recurring:
+            comments += f"; pillar 2 not scored from FEC: {recurring['error']}"
+        else:
+            recurring_revenue = recurring["score"]
+            comments = (
+                f"Pillar 2 from FEC: {recurring.get('recurring_revenue_pct', 0.0)}% recurring revenue over the last "
+                f"12 months ({recurring.get('recurring_clients', 0)} recurring clients of {recurring['n_clients']}); "
+                "call Sonnet 4.5 to score pillars 1, 3 and 4 based on business description"
+            )
     return FourPillarsScore(
         repetitive_operations=0,
-        recurring_revenue=0,
+        recurring_revenue=recurring_revenue,
         low_digitalization=0,
         diversified_client_base=0,
-        total_score=0,
-        comments="Call Sonnet 4.5 to score based on business description"
+        total_score=recurring_revenue,
+        comments=comments
     )
 
 @tool(args_schema=DetectRedFlagsInput)
 def detect_red_flags(
     target: TargetCompany,
     financials: FinancialMetrics,
-    im_text: Optional[str] = None
+    im_text: Optional[str] = None,
+    fec_path: Optional[str] = None,
+    encoding: str = "latin-1",
+    separator: str = "|"
 ) -> List[RedFlag]:
     """
     Detects potential red flags and deal-breakers:
@@ -535,21 +736,30 @@ def detect_red_flags(
     - Heavy regulation
     - Management issues
 
+    With fec_path, the ledger anomalies of the FEC (see
+    scan_ledger_anomalies) come first, ranked, without an LLM call.
     Uses Sonnet 4.5 for analysis.
     """
-    return [
-        {
-            "instruction": "Call Sonnet 4.5 to analyze for red flags",
-            "model_to_use": "sonnet",
-            "checks": [
-                "Client concentration analysis",
-                "Debt level vs EBITDA",
-                "Market trend (growth/decline)",
-                "Regulatory compliance mentions",
-                "Litigation mentions"
-            ]
-        }
-    ]
+    ledger_flags = []
+    instruction = {
+        "instruction": "Call Sonnet 4.5 to analyze for red flags",
+        "model_to_use": "sonnet",
+        "checks": [
+            "Client concentration analysis",
+            "Debt level vs EBITDA",
+            "Market trend (growth/decline)",
+            "Regulatory compliance mentions",
+            "Litigation mentions"
+        ]
+    }
+    if fec_path:
+        scan = scan_fec_anomalies(fec_path, encoding=encoding, separator=separator)
+        if "error" in scan:
+            # A failed scan is not a red flag: report it with the instruction
+            instruction["fec_scan_error"] = scan
+        else:
+            ledger_flags = scan["red_flags"]
+    return ledger_flags + [instruction]
 
 @tool(args_schema=ValueTargetInput)
 def value_target(
@@ -709,6 +919,14 @@ def get_company_financials(
 
 MBI_TOOLS = [
     read_fec,
+    read_fec_batch,
+    consolidate_group,
+    analyze_account_variance,
+    query_ledger,
+    analyze_receivables,
+    analyze_recurring_revenue,
+    scan_ledger_anomalies,
+    restate_leases,
     extract_im_data,
     normalize_ebitda,
     score_four_pillars,
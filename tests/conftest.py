@@ -0,0 +1,115 @@
+import pytest
+
+FEC_COLUMNS = [
+    "JournalCode", "JournalLib", "EcritureNum", "EcritureDate",
+    "CompteNum", "CompteLib", "CompAuxNum", "CompAuxLib",
+    "PieceRef", "PieceDate", "EcritureLib",
+    "Debit", "Credit", "EcritureLet", "DateLet", "ValidDate", "Montantdevise", "Idevise",
+]
+
+
+def fec_text(lines, separator="|"):
+    """
+    FEC text from line dicts (FEC column -> value); Debit and Credit are
+    euros, missing columns are left empty.
+    """
+    rows = [separator.join(FEC_COLUMNS)]
+    for line in lines:
+        values = dict(line)
+        for column in ("Debit", "Credit"):
+            values[column] = f"{values.get(column, 0):.2f}".replace(".", ",")
+        rows.append(separator.join(str(values.get(column, "")) for column in FEC_COLUMNS))
+    return "\n".join(rows) + "\n"
+
+
+def entry(journal, number, date, *postings):
+    """Lines of one entry from (account, debit, credit[, CompAuxNum, CompAuxLib]) postings."""
+    lines = []
+    for account, debit, credit, *aux in postings:
+        aux_num, aux_lib = (aux + ["", ""])[:2]
+        lines.append({
+            "JournalCode": journal, "EcritureNum": number, "EcritureDate": date, "CompteNum": account,
+            "CompAuxNum": aux_num, "CompAuxLib": aux_lib, "Debit": debit, "Credit": credit,
+        })
+    return lines
+
+
+@pytest.fixture
+def write_fec(tmp_path):
+    """Writes a FEC named `name` in a temporary directory and returns its path."""
+    def write(name, lines, separator="|"):
+        path = tmp_path / name
+        path.write_text(fec_text(lines, separator), encoding="latin-1")
+        return str(path)
+    return write
+
+
+def message(content=None, model="claude-3-5-haiku-20241022", input_tokens=10, output_tokens=5, cache_read=0, cache_creation=0):
+    """API response holding `content` blocks (default: one text block); cache_* are prompt cache input tokens."""
+    from anthropic.types import Message
+    return Message.model_validate({
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": content if content is not None else [{"type": "text", "text": "ok"}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": cache_creation,
+        },
+    })
+
+
+def api_error(status, retry_after=None):
+    """anthropic.APIStatusError of the class the SDK raises for `status`."""
+    import anthropic
+    import httpx
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.anthropic.com"))
+    error_class = {
+        400: anthropic.BadRequestError,
+        429: anthropic.RateLimitError,
+        529: anthropic.OverloadedError,
+    }.get(status, anthropic.InternalServerError)
+    return error_class("test error", response=response, body=None)
+
+
+class FakeClient:
+    """
+    Local stand-in for the Anthropic client: messages.create pops the next
+    scripted outcome (an exception is raised, a Message or a callable of the
+    request returned) and repeats `default` once the script is exhausted.
+    """
+
+    def __init__(self, *outcomes, default=None):
+        self.outcomes = list(outcomes)
+        self.default = default if default is not None else message()
+        self.requests = []
+        self.messages = self
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        outcome = self.outcomes.pop(0) if self.outcomes else self.default
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome(kwargs) if callable(outcome) else outcome
+
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    """dexter.model with fresh rate limiters and circuit breakers, and a response cache in tmp_path."""
+    from dexter import llm_cache, llm_resilience, model
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.setenv("DEXTER_LLM_CACHE_DIR", str(tmp_path / "llm"))
+    monkeypatch.setattr(llm_cache, "_response_cache", None)
+    monkeypatch.setattr(model, "_rate_limiters", {name: model.TokenBucket(6_000) for name in model.RATE_LIMITS_RPM})
+    monkeypatch.setattr(model, "_circuit_breakers", {name: llm_resilience.CircuitBreaker() for name in model.RATE_LIMITS_RPM})
+    # Retries without the real backoff
+    monkeypatch.setattr(llm_resilience, "backoff_delay", lambda retry: 0.01)
+    monkeypatch.setattr(llm_resilience, "BACKOFF_BASE", 0.01)
+    return model
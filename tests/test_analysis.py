@@ -0,0 +1,22 @@
+import pytest
+from conftest import entry
+
+from dexter.fec.analysis import analyze_account_variance, analyze_fec, analyze_payments
+
+
+def test_entry_points_return_error_dicts(tmp_path):
+    missing = str(tmp_path / "missing.txt")
+    error = analyze_payments(missing, side="suppliers")
+    assert error["error"].startswith("Failed to analyze payments: ")
+    assert (error["file_path"], error["side"]) == (missing, "suppliers")
+    error = analyze_account_variance([missing])
+    assert error["error"].startswith("Failed to analyze account variance: ") and error["fec_paths"] == [missing]
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+@pytest.mark.parametrize("lines", [[], entry("OD", "1", "", ("471000", 100, 0), ("512000", 0, 100))], ids=["header_only", "undated"])
+def test_fec_without_dated_entries(write_fec, lines, chunksize):
+    report = analyze_fec(write_fec("fec.txt", lines), chunksize=chunksize, use_cache=False)
+    assert report["success"], report.get("error")
+    assert (report["date_range"]["start"], report["date_range"]["end"]) == (None, None)
+    assert report["daily_balances"] is None
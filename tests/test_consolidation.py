@@ -0,0 +1,87 @@
+from conftest import entry
+
+from dexter.fec.batch import consolidate_fec_batch
+
+
+def alpha_ledger(*extra):
+    return [
+        # Sale to beta: eliminated with beta's purchase
+        *entry("VE", "1", "20230115", ("411000", 1_200, 0, "CBETA", "Beta"), ("706000", 0, 1_000), ("445710", 0, 200)),
+        # Sale to an outside client
+        *entry("VE", "2", "20230120", ("411000", 4_800, 0, "C001", "Client 1"), ("706000", 0, 4_000), ("445710", 0, 800)),
+        # Financial income: below EBITDA
+        *entry("BQ", "3", "20230131", ("512000", 100, 0), ("761000", 0, 100)),
+        *extra,
+    ]
+
+
+def beta_ledger():
+    return [
+        *entry("AC", "1", "20230115", ("607000", 1_000, 0), ("445660", 200, 0), ("401000", 0, 1_200, "FALPHA", "Alpha")),
+        *entry("VE", "2", "20230210", ("411000", 6_000, 0, "C002", "Client 2"), ("706000", 0, 5_000), ("445710", 0, 1_000)),
+    ]
+
+
+def consolidate(write_fec, alpha):
+    paths = [write_fec("alpha_2023.txt", alpha), write_fec("beta_2023.txt", beta_ledger())]
+    return consolidate_fec_batch(paths, max_workers=1, use_cache=False)
+
+
+def test_intercompany_sales_are_eliminated(write_fec):
+    report = consolidate(write_fec, alpha_ledger())
+    assert report["success"] and not report["errors"]
+    assert report["pnl"]["revenue"] == 9_000.0
+    # The financial income is not operating: EBITDA = revenue, no expense left
+    assert report["pnl"]["ebitda"] == 9_000.0
+    assert report["pnl"]["net_result"] == 9_100.0
+    assert report["intercompany"]["eliminated_revenue"] == 1_000.0
+    assert report["intercompany"]["eliminated_expenses"] == 1_000.0
+    assert report["balance_sheet"]["receivables_411"] == 10_800.0
+    assert report["balance_sheet"]["payables_401"] == 0.0
+
+    [pair] = report["intercompany"]["pairs"]
+    assert (pair["seller"], pair["buyer"], pair["sales"], pair["purchases"]) == ("alpha", "beta", 1_000.0, 1_000.0)
+    assert (pair["receivable"], pair["payable"], pair["reconciled"]) == (1_200.0, 1_200.0, True)
+    assert report["intercompany"]["unreconciled"] == []
+    assert report["intercompany"]["mixed_entries"]["count"] == 0
+
+    contributions = {e["entity"]: e for e in report["entities"]}
+    assert contributions["alpha"]["revenue"] == 5_000.0
+    assert contributions["alpha"]["ebitda"] == 5_000.0
+    assert contributions["alpha"]["intercompany_revenue"] == 1_000.0
+
+
+def test_mixed_entry_keeps_its_revenue(write_fec):
+    # Centralised sales journal: one entry for an invoice to beta and one to an outside client
+    mixed = entry(
+        "VE", "4", "20230301",
+        ("411000", 600, 0, "CBETA", "Beta"),
+        ("411000", 1_200, 0, "C003", "Client 3"),
+        ("706000", 0, 1_500),
+        ("445710", 0, 300),
+    )
+    report = consolidate(write_fec, alpha_ledger(*mixed))
+    assert report["pnl"]["revenue"] == 10_500.0
+    assert report["intercompany"]["eliminated_revenue"] == 1_000.0
+
+    section = report["intercompany"]["mixed_entries"]
+    assert section["count"] == 1
+    assert section["pnl_net_debit"] == -1_500.0
+    [listed] = section["entries"]
+    assert listed == {
+        "entity": "alpha",
+        "journal": "VE",
+        "entry": "4",
+        "month": "2023-03",
+        "counterparties": "beta",
+        "intercompany_net_debit": 600.0,
+        "pnl_net_debit": -1_500.0,
+    }
+
+
+def test_worker_processes_give_the_serial_result(write_fec):
+    paths = [write_fec("alpha_2023.txt", alpha_ledger()), write_fec("beta_2023.txt", beta_ledger())]
+    serial = consolidate_fec_batch(paths, max_workers=1, use_cache=False)
+    parallel = consolidate_fec_batch(paths, max_workers=2, use_cache=False)
+    assert parallel["workers"] == 2
+    assert parallel["pnl"] == serial["pnl"] and parallel["intercompany"] == serial["intercompany"]
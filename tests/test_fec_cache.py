@@ -0,0 +1,22 @@
+import os
+
+from conftest import entry
+
+from dexter.fec import cache
+
+
+def test_entry_evicted_after_its_metadata_is_read_is_a_miss(write_fec, tmp_path, monkeypatch):
+    monkeypatch.setenv("DEXTER_FEC_CACHE_DIR", str(tmp_path / "cache"))
+    path = write_fec("ledger.txt", entry("VE", "1", "20230115", ("411000", 120, 0), ("706000", 0, 120)))
+    df, info = cache.load_fec_cached(path)
+    assert not info["hit"]
+    assert cache.load_fec_cached(path)[1]["hit"]
+
+    def evicted(entry_path, *args):
+        raise FileNotFoundError(entry_path)
+
+    monkeypatch.setattr(os, "utime", evicted)
+    assert cache.lookup(info["key"]) is None
+    reloaded, info = cache.load_fec_cached(path)
+    assert not info["hit"]
+    assert reloaded["Debit"].tolist() == df["Debit"].tolist()
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+from conftest import entry
+
+from dexter.fec.analysis import scan_fec_anomalies
+from dexter.fec.forensic import NO_JOURNAL, easter_days, french_holidays
+
+CHECKS = {"benford", "duplicates", "near_duplicates", "non_working_days", "round_amounts", "post_close", "manual_spike"}
+
+
+def working_days(n, start="2023-01-02"):
+    """First `n` French working days from `start`, as YYYYMMDD strings."""
+    days = pd.bdate_range(start, periods=2 * n)
+    holidays = french_holidays(np.array([2023, 2024])).astype("datetime64[D]")
+    days = days[~days.isin(holidays)][:n]
+    return [d.strftime("%Y%m%d") for d in days]
+
+
+def purchase(journal, number, date, account, euros, supplier, valid_date=""):
+    lines = entry(journal, number, date, (account, euros, 0), ("401000", 0, euros, supplier, supplier))
+    for line in lines:
+        line["ValidDate"] = valid_date
+    return lines
+
+
+def ledger():
+    lines = []
+    days = working_days(160)
+    # Benford: 150 purchases whose amounts all start with a 9
+    for i in range(150):
+        lines += purchase("AC", f"A{i}", days[i], "607000", 900 + (i * 7) % 99 + i / 100, f"F{i % 50:03d}")
+    # Round amounts: 20 consulting fees of exactly 1,500 EUR (also the same supplier amount within a week)
+    for i in range(20):
+        lines += purchase("HA", f"H{i}", days[5 * i], "622600", 1_500, "FCONSEIL")
+    # Duplicate entry: same journal, date, accounts, third party, amounts and labels
+    for number in ("D1", "D2"):
+        lines += entry("VE", number, "20230315", ("411000", 1_200, 0, "C001", "Client 1"), ("706000", 0, 1_200))
+    # Validated on a Saturday
+    for i in range(25):
+        lines += purchase("BQ", f"S{i}", days[i], "627000", 50 + i, "FBANQUE", valid_date="20230318")
+    # Dated before the close, validated after it
+    for i in range(3):
+        lines += purchase("AC", f"P{i}", "20231215", "606100", 400 + i, "FENERGIE", valid_date="20240115")
+    # Manual journal: 1,000 EUR a month, 50,000 in June
+    for month in range(1, 12):
+        amount = 50_000 if month == 6 else 1_000
+        lines += entry("OD", f"O{month}", working_days(1, f"2023-{month:02d}-10")[0], ("681100", amount, 0), ("281000", 0, amount))
+    lines += entry("VE", "Z", "20231229", ("411000", 600, 0, "C002", "Client 2"), ("706000", 0, 600))
+    # A line without a journal, validated on a Saturday
+    blank = entry("", "X1", "20230320", ("471000", 75, 0))
+    blank[0]["ValidDate"] = "20230325"
+    return lines + blank
+
+
+def test_every_check_fires(write_fec):
+    report = scan_fec_anomalies(write_fec("fec.txt", ledger()), use_cache=False)
+    assert "error" not in report, report.get("error")
+    assert {f["check"] for f in report["findings"]} == CHECKS
+    assert all(flag["category"] == "Anomalie comptable" for flag in report["red_flags"])
+    # Ranked by severity, then amount at stake
+    ranks = [{"Critical": 0, "High": 1, "Medium": 2, "Low": 3}[f["severity"]] for f in report["findings"]]
+    assert ranks == sorted(ranks)
+
+    checks = report["checks"]
+    assert [row["journal"] for row in checks["benford"]] == ["AC"]
+    assert checks["benford"][0]["mad"] > 0.1
+    assert checks["duplicates"] == {"entries": 1, "amount": 1_200.0}
+    assert [row["account"] for row in checks["round_amounts"]] == ["622600"]
+    assert checks["post_close"]["closing_date"] == "2023-12-29" and checks["post_close"]["entries"] == 3
+    assert checks["manual_journals"]["months"] == 11
+    [spike] = [f for f in report["findings"] if f["check"] == "manual_spike"]
+    assert spike["month"] == "2023-06"
+
+
+def test_lines_without_a_journal(write_fec):
+    report = scan_fec_anomalies(write_fec("fec.txt", ledger()), use_cache=False)
+    by_journal = report["checks"]["non_working_days"]["by_journal"]
+    assert by_journal[NO_JOURNAL] == 1
+    # Not counted under another journal's name
+    assert by_journal["BQ"] == 25 and sum(by_journal.values()) == 26
+
+
+def test_easter():
+    easter = easter_days(np.array([2023, 2024, 2025])).astype("datetime64[D]")
+    assert [str(d) for d in easter] == ["2023-04-09", "2024-03-31", "2025-04-20"]
@@ -0,0 +1,62 @@
+import pytest
+from conftest import entry, fec_text
+
+from dexter.fec import incremental
+from dexter.fec.aggregates import LedgerAggregates
+from dexter.fec.incremental import ingest_incremental
+from dexter.fec.reader import load_fec
+
+JANUARY = entry("VE", "1", "20230110", ("411000", 1_200, 0), ("706000", 0, 1_000), ("445710", 0, 200))
+FEBRUARY = entry("AC", "2", "20230215", ("607000", 500, 0), ("401000", 0, 500))
+MARCH = entry("VE", "3", "20230320", ("411000", 2_400, 0), ("706000", 0, 2_000), ("445710", 0, 400))
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch, tmp_path):
+    monkeypatch.setenv("DEXTER_FEC_STATE_DIR", str(tmp_path / "state"))
+    # A few lines per block: months and quoted fields span several blocks
+    monkeypatch.setattr(incremental, "SCAN_BLOCK_BYTES", 256)
+
+
+def full_balances(path):
+    return LedgerAggregates.from_frame(load_fec(path)).account_balances().sort_index()
+
+
+def test_monthly_close_recomputes_new_and_restated_months(write_fec):
+    ingest_incremental(write_fec("m02.txt", JANUARY + FEBRUARY), ledger_id="acme")
+    # January restated and validated in March, after the previous watermark
+    restated = entry("VE", "1", "20230110", ("411000", 1_080, 0), ("706000", 0, 900), ("445710", 0, 180))
+    for line in restated:
+        line["ValidDate"] = "20230305"
+    path = write_fec("m03.txt", restated + FEBRUARY + MARCH)
+
+    agg, info = ingest_incremental(path, ledger_id="acme")
+    assert info["mode"] == "incremental"
+    assert (info["new_months"], info["restated_months"]) == (["2023-03"], ["2023-01"])
+    assert info["previous_watermark"] == "2023-02-15" and info["watermark"] == "2023-03-20"
+    assert info["late_postings"] == 3
+    assert info["rows_ingested"] == 6
+    assert agg.account_balances().sort_index().equals(full_balances(path))
+
+
+def test_line_order_and_endings_do_not_change_fingerprints(write_fec, tmp_path):
+    ingest_incremental(write_fec("m03.txt", JANUARY + FEBRUARY + MARCH), ledger_id="acme")
+    path = tmp_path / "m03_crlf.txt"
+    header, *lines = fec_text(JANUARY + FEBRUARY + MARCH).splitlines()
+    path.write_bytes("\r\n".join([header, *reversed(lines)]).encode("latin-1") + b"\r\n")
+
+    agg, info = ingest_incremental(str(path), ledger_id="acme")
+    assert info["mode"] == "incremental"
+    assert (info["new_months"], info["restated_months"], info["rows_ingested"]) == ([], [], 0)
+    assert agg.account_balances().sort_index().equals(full_balances(str(path)))
+
+
+def test_quoted_fields(write_fec):
+    ingest_incremental(write_fec("m02.txt", JANUARY + FEBRUARY), ledger_id="acme")
+    quoted = entry("VE", "3", "20230320", ("411000", 2_400, 0), ("706000", 0, 2_000), ("445710", 0, 400))
+    quoted[1]["EcritureLib"] = '"Export | Belgique"'
+    path = write_fec("m03.txt", JANUARY + FEBRUARY + quoted)
+
+    agg, info = ingest_incremental(path, ledger_id="acme")
+    assert (info["new_months"], info["restated_months"], info["rows_ingested"]) == (["2023-03"], [], 3)
+    assert agg.account_balances().sort_index().equals(full_balances(path))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from conftest import entry
+
+from dexter.fec.analysis import restate_fec_leases
+from dexter.fec.leases import annuity_factor
+
+RATE = 0.05
+MONTHLY_RATE = (1 + RATE) ** (1 / 12) - 1
+
+
+def test_annuity_factor():
+    assert annuity_factor(np.array([12]), 0.01)[0] == pytest.approx(11.2550775)
+    assert list(annuity_factor(np.array([0, -3, 12]), 0.0)) == [0.0, 0.0, 12.0]
+
+
+def annuity(months):
+    return annuity_factor(np.array([months]), MONTHLY_RATE)[0]
+
+
+def test_credit_bail_restatement(write_fec):
+    lines = entry("VE", "0", "20230105", ("411000", 1_200, 0, "C001", "Client"), ("706000", 0, 1_200))
+    # Crédit-bail from March: 1,000 a month, ten payments in the ledger
+    for month in range(3, 13):
+        lines += entry("AC", f"L{month}", f"2023{month:02d}28", ("612000", 1_000, 0), ("401000", 0, 1_000, "FLEASE", "Lessor"))
+    # Copier rental below the low-value threshold (1,200 a year): stays expensed
+    for month in range(1, 13):
+        lines += entry("AC", f"C{month}", f"2023{month:02d}15", ("613500", 100, 0), ("401000", 0, 100, "FCOPY", "Copier"))
+
+    report = restate_fec_leases(write_fec("fec.txt", lines), discount_rate=RATE, use_cache=False)
+    assert (report["n_leases"], report["n_restated"], report["n_on_balance_sheet"]) == (2, 1, 1)
+    [lease] = report["leases"]
+    assert (lease["lessor"], lease["monthly_payment"], lease["term_months"], lease["remaining_months"]) == ("FLEASE", 1_000.0, 48, 38)
+    assert not lease["start_assumed"]
+
+    initial = 1_000 * annuity(48)
+    liability = 1_000 * annuity(38)
+    assert report["lease_liability"] == pytest.approx(liability, abs=0.01)
+    assert report["net_debt_change"] == report["lease_liability"]
+    assert report["right_of_use_asset"] == pytest.approx(initial * 38 / 48, abs=0.01)
+    assert report["depreciation"] == pytest.approx(initial * 10 / 48, abs=0.01)
+    # The ten payments repay the liability from its initial value, the rest is interest
+    assert report["interest"] == pytest.approx(10_000 - (initial - liability), abs=0.01)
+    assert report["ebitda_uplift"] == 10_000.0
+    assert report["pretax_result_impact"] == pytest.approx(10_000 - report["depreciation"] - report["interest"], abs=0.02)
+    assert report["liability_schedule"] == pytest.approx(
+        {"2024": 1_000 * annuity(26), "2025": 1_000 * annuity(14), "2026": 1_000 * annuity(2), "2027": 0.0}, abs=0.01
+    )
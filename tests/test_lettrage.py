@@ -0,0 +1,85 @@
+from conftest import entry
+
+from dexter.fec.analysis import analyze_payments
+
+AS_OF = "2023-06-30"
+
+
+def invoice(client, number, date, euros, letter=""):
+    lines = entry("VE", number, date, ("411000", euros, 0, client, f"Client {client}"), ("706000", 0, euros))
+    lines[0]["EcritureLet"] = letter
+    return lines
+
+
+def payment(client, number, date, euros, letter=""):
+    lines = entry("BQ", number, date, ("512000", euros, 0), ("411000", 0, euros, client, f"Client {client}"))
+    lines[1]["EcritureLet"] = letter
+    return lines
+
+
+def ledger():
+    return (
+        # Lettered group: two invoices cleared by one settlement
+        invoice("C1", "V1", "20230110", 600, "AA") + invoice("C1", "V2", "20230120", 400, "AA")
+        + payment("C1", "B1", "20230209", 1_000, "AA")
+        # Exact amount: the 500 invoice is paid, the 800 one stays open past the terms
+        + invoice("C2", "V3", "20230301", 500) + invoice("C2", "V4", "20230305", 800)
+        + payment("C2", "B2", "20230331", 500)
+        # FIFO: 1,300 paid on 2,000 invoiced; the same letter as C1 but unbalanced on C3
+        + invoice("C3", "V5", "20230401", 1_000, "AA") + invoice("C3", "V6", "20230502", 1_000)
+        + payment("C3", "B3", "20230420", 700, "AA") + payment("C3", "B4", "20230515", 600)
+        # Payment booked before its invoice
+        + payment("C4", "B5", "20230601", 300) + invoice("C4", "V7", "20230610", 300)
+        # Settlement without an invoice
+        + payment("C5", "B6", "20230620", 250)
+    )
+
+
+def counterparty(report, client):
+    return next(row for row in report["top_counterparties"] if row["id"] == client)
+
+
+def test_matching_passes(write_fec):
+    report = analyze_payments(write_fec("fec.txt", ledger()), as_of=AS_OF, use_cache=False)
+    assert report["success"], report.get("error")
+    assert report["n_invoices"] == 7
+    assert {k: report["matching"][k] for k in ("lettrage", "montant", "fifo", "open")} == {
+        "lettrage": 2, "montant": 1, "fifo": 2, "open": 2,
+    }
+
+    c1 = counterparty(report, "C1")
+    # Both invoices settled on the group's settlement day: 30 and 20 days
+    assert (c1["avg_delay_days"], c1["open"], c1["oldest_open"]) == (26.0, 0.0, None)
+    c2 = counterparty(report, "C2")
+    assert (c2["avg_delay_days"], c2["open"], c2["overdue"], c2["oldest_open"]) == (30.0, 800.0, 800.0, "2023-03-05")
+    c3 = counterparty(report, "C3")
+    # The first invoice is paid when the running payments reach 1,000
+    assert (c3["avg_delay_days"], c3["open"], c3["overdue"], c3["oldest_open"]) == (44.0, 700.0, 0.0, "2023-05-02")
+
+
+def test_payment_before_invoice(write_fec):
+    report = analyze_payments(write_fec("fec.txt", ledger()), as_of=AS_OF, use_cache=False)
+    c4 = counterparty(report, "C4")
+    # Not an exact-amount pair, allocated by FIFO with a zero delay
+    assert (c4["avg_delay_days"], c4["open"], c4["overdue"]) == (0.0, 0.0, 0.0)
+    assert report["median_payment_delay_days"] == 30.0
+
+
+def test_aging_overdue_and_unapplied(write_fec):
+    report = analyze_payments(write_fec("fec.txt", ledger()), as_of=AS_OF, use_cache=False)
+    assert report["as_of"] == AS_OF
+    assert report["open_total"] == 1_500.0
+    assert report["aging"] == {"0-30": 0.0, "31-60": 700.0, "61-90": 0.0, "91-180": 800.0, "180+": 0.0}
+    assert report["overdue_total"] == 800.0
+    assert report["overdue_pct_of_open"] == 53.33
+    assert report["paid_late_pct"] == 0.0
+    assert report["unapplied_payments"] == 250.0
+    # Weighted by the invoice amounts: 85,000 / 2,800
+    assert report["avg_payment_delay_days"] == 30.4
+
+
+def test_payment_terms(write_fec):
+    report = analyze_payments(write_fec("fec.txt", ledger()), payment_terms_days=30, as_of=AS_OF, use_cache=False)
+    # C3's May invoice is now overdue, and C3's April invoice was paid late
+    assert report["overdue_total"] == 1_500.0
+    assert report["paid_late_pct"] == round(1_000 / 2_800 * 100, 2)
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from dexter import llm_cache
+from dexter.llm_cache import ResponseCache, request_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return clock
+
+
+def response(text):
+    return {"content": [{"type": "text", "text": text}]}
+
+
+def size(text):
+    return len(json.dumps(response(text), ensure_ascii=False).encode("utf-8"))
+
+
+def test_request_key_is_canonical():
+    assert request_key({"model": "m", "max_tokens": 10}) == request_key({"max_tokens": 10, "model": "m"})
+    assert request_key({"model": "m", "max_tokens": 10}) != request_key({"model": "m", "max_tokens": 11})
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.put("a", response("first"))
+    clock.now += 59
+    assert cache.get("a") == response("first")
+    # Reading an entry does not extend its life
+    clock.now += 2
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=3600, max_bytes=2 * size("aaaa"))
+    for key in ("a", "b"):
+        clock.now += 1
+        cache.put(key, response(key * 4))
+    clock.now += 1
+    assert cache.get("a") is not None
+    clock.now += 1
+    cache.put("c", response("cccc"))
+    # b was used least recently
+    assert cache.get("b") is None
+    assert cache.get("a") == response("aaaa") and cache.get("c") == response("cccc")
+    stats = cache.stats()
+    assert (stats["entries"], stats["size_bytes"]) == (2, 2 * size("aaaa"))
+
+
+def test_expired_entries_are_dropped_on_write(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.put("old", response("old"))
+    clock.now += 120
+    cache.put("new", response("new"))
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,147 @@
+import asyncio
+import time
+
+import anthropic
+import pytest
+from conftest import FakeClient, api_error, message
+
+from dexter import llm_resilience
+from dexter.llm_resilience import CircuitBreaker, DeadlineExceededError, LLMUnavailableError, call_with_retries
+
+
+def test_transient_errors_are_retried(llm):
+    before = llm_resilience.retry_stats()
+    client = FakeClient(api_error(429, retry_after="0"), api_error(529), anthropic.APIConnectionError(request=None))
+    reply = llm.call_llm("hello", model_type="haiku", cache=False, client=client)
+    assert reply.content == "ok"
+    assert len(client.requests) == 4
+    after = llm_resilience.retry_stats()
+    assert after["retries"] - before["retries"] == 3
+    assert after["retries_by_reason"]["529"] > before["retries_by_reason"].get("529", 0)
+
+
+def test_bad_request_is_not_retried(llm):
+    client = FakeClient(api_error(400))
+    with pytest.raises(anthropic.BadRequestError):
+        llm.call_llm("hello", model_type="haiku", cache=False, client=client)
+    assert len(client.requests) == 1
+
+
+def test_retries_stop_at_max_retries(llm):
+    client = FakeClient(default=api_error(500))
+    with pytest.raises(anthropic.InternalServerError):
+        llm.call_llm("hello", model_type="haiku", cache=False, client=client)
+    assert len(client.requests) == llm_resilience.MAX_RETRIES + 1
+
+
+def test_slow_api_call_times_out_at_the_deadline(llm):
+    class Slow:
+        def __init__(self):
+            self.messages = self
+
+        async def create(self, **kwargs):
+            await asyncio.sleep(5)
+
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError) as raised:
+        llm.call_llm("hello", model_type="haiku", cache=False, client=Slow(), deadline=0.3)
+    assert not isinstance(raised.value, DeadlineExceededError)
+    assert time.monotonic() - started < 2
+
+
+def test_rate_limit_wait_does_not_open_the_circuit(llm):
+    # 60 rpm: 5 requests at once, then one per second
+    llm._rate_limiters["haiku"] = llm.TokenBucket(60)
+    client = FakeClient()
+
+    async def burst():
+        calls = [llm.acall_llm(f"prompt {i}", model_type="haiku", cache=False, client=client, deadline=2) for i in range(20)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(burst())
+    late = [r for r in results if isinstance(r, BaseException)]
+    assert all(isinstance(r, DeadlineExceededError) for r in late)
+    assert 6 <= len(client.requests) <= 7 and len(late) == 20 - len(client.requests)
+    breaker = llm._circuit_breakers["haiku"]
+    assert breaker.failures == 0 and breaker.opened_at is None
+    # The provider is healthy: the next call goes through (its token was not lost to the refused ones)
+    assert llm.call_llm("again", model_type="haiku", cache=False, client=client, deadline=5).content == "ok"
+
+
+async def failing():
+    raise api_error(529)
+
+
+async def succeeding():
+    await asyncio.sleep(0.05)
+    return "ok"
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(anthropic.APIStatusError):
+                await call_with_retries(failing, breaker, "haiku", max_retries=0)
+        with pytest.raises(LLMUnavailableError) as raised:
+            await call_with_retries(succeeding, breaker, "haiku")
+        assert raised.value.retry_in > 50
+
+    asyncio.run(run())
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+
+    async def run():
+        with pytest.raises(anthropic.APIStatusError):
+            await call_with_retries(failing, breaker, "haiku", max_retries=0)
+        await asyncio.sleep(0.06)
+        results = await asyncio.gather(
+            *(call_with_retries(succeeding, breaker, "haiku") for _ in range(5)), return_exceptions=True
+        )
+        assert results.count("ok") == 1
+        assert sum(isinstance(r, LLMUnavailableError) for r in results) == 4
+        # The probe succeeded: closed again
+        assert await asyncio.gather(*(call_with_retries(succeeding, breaker, "haiku") for _ in range(5))) == ["ok"] * 5
+
+    asyncio.run(run())
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+
+    async def run():
+        with pytest.raises(anthropic.APIStatusError):
+            await call_with_retries(failing, breaker, "haiku", max_retries=0)
+        await asyncio.sleep(0.06)
+        with pytest.raises(anthropic.APIStatusError):
+            await call_with_retries(failing, breaker, "haiku", max_retries=0)
+        with pytest.raises(LLMUnavailableError):
+            await call_with_retries(succeeding, breaker, "haiku")
+
+    asyncio.run(run())
+
+
+def test_probe_ending_without_an_answer_frees_the_half_open_slot():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+
+    async def out_of_time(end):
+        raise DeadlineExceededError("queued")
+
+    async def run():
+        with pytest.raises(anthropic.APIStatusError):
+            await call_with_retries(failing, breaker, "haiku", max_retries=0)
+        await asyncio.sleep(0.06)
+        with pytest.raises(DeadlineExceededError):
+            await call_with_retries(succeeding, breaker, "haiku", wait_turn=out_of_time)
+        assert await call_with_retries(succeeding, breaker, "haiku") == "ok"
+
+    asyncio.run(run())
+
+
+def test_retry_after_header():
+    assert llm_resilience.retry_after(api_error(429, retry_after="7")) == 7.0
+    assert llm_resilience.retry_after(api_error(429)) is None
+    assert llm_resilience.retry_after(message()) is None
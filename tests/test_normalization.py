@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from dexter.fec.accounts import AccountIndex
+from dexter.fec.normalization import normalize_ebitda_from_ledger, reported_ebitda
+
+
+def account_index(balances):
+    """AccountIndex from {account: (debit, credit)} in euros."""
+    return AccountIndex(pd.DataFrame(
+        [(round(debit * 100), round(credit * 100)) for debit, credit in balances.values()],
+        index=pd.Index(list(balances), name="CompteNum"),
+        columns=["Debit", "Credit"],
+    ))
+
+
+def test_reported_ebitda_removes_financial_income():
+    index = account_index({"706000": (0, 100_000), "641000": (50_000, 0), "761000": (0, 10_000)})
+    ebitda, bridge = reported_ebitda(index)
+    assert ebitda == 50_000_00
+    assert [line["amount"] for line in bridge] == [60_000.0, -10_000.0]
+
+
+def test_reported_ebitda_bridge():
+    index = account_index({
+        "706000": (0, 200_000),
+        "641000": (80_000, 0),
+        "661100": (4_000, 0),     # interest, added back
+        "686000": (1_000, 0),     # financial provisions, added back
+        "764000": (0, 2_000),     # financial income, removed
+        "786000": (0, 500),       # financial reversals, removed
+        "695000": (15_000, 0),    # corporate tax, added back
+        "681100": (20_000, 0),    # depreciation, added back
+        "681500": (3_000, 0),     # operating provisions stay in EBITDA
+    })
+    ebitda, bridge = reported_ebitda(index)
+    assert ebitda == (200_000 - 80_000 - 3_000) * 100
+    assert bridge[0]["amount"] == 200_000 + 2_500 - 80_000 - 4_000 - 1_000 - 15_000 - 20_000 - 3_000
+    assert {line["accounts"]: line["amount"] for line in bridge[1:]} == {
+        "66": 4_000.0, "686": 1_000.0, "76": -2_000.0, "786": -500.0, "69": 15_000.0, "6811-6812": 20_000.0,
+    }
+
+
+def test_normalized_ebitda_adjustments():
+    index = account_index({
+        "706000": (0, 1_000_000),
+        "641000": (400_000, 0),
+        "644000": (150_000, 0),   # owner, 40k above the market cost
+        "612000": (24_000, 0),    # crédit-bail, added back
+        "671000": (5_000, 0),     # exceptional charge, added back
+        "771000": (0, 2_000),     # exceptional income, removed
+        "681500": (6_000, 0),     # provisions net of reversals, added back
+        "781500": (0, 1_000),
+        "761000": (0, 3_000),     # below EBITDA
+    })
+    report = normalize_ebitda_from_ledger(index, cost_index=1.0, market_manager_cost=110_000)
+    assert report["ebitda_reported"] == 1_000_000 + 2_000 + 1_000 - 400_000 - 150_000 - 24_000 - 5_000 - 6_000
+    amounts = {(a["category"], a["amount"]) for a in report["adjustments"]}
+    assert amounts == {
+        ("Rémunération dirigeant", 40_000.0),
+        ("Loyers", 24_000.0),
+        ("Non-récurrent", 5_000.0),
+        ("Non-récurrent", -2_000.0),
+        ("Provisions", 5_000.0),
+    }
+    assert report["total_adjustments"] == 72_000.0
+    assert report["ebitda_normalized"] == report["ebitda_reported"] + 72_000.0
+    assert report["ebitda_normalized_margin_pct"] == pytest.approx(report["ebitda_normalized"] / 10_000, abs=0.01)
+    assert len(report["audit_trail"]) == len(report["adjustments"])
+
+
+def test_leases_can_stay_in_ebitda():
+    index = account_index({"706000": (0, 100_000), "612000": (12_000, 0)})
+    report = normalize_ebitda_from_ledger(index, add_back_credit_bail=False)
+    assert all(a["category"] != "Loyers" for a in report["adjustments"])
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from dexter.fec.overlap import MAX_BLOCK_SIZE, CounterpartyIndex, match_names, normalize_name
+
+
+def profiles(*rows):
+    """Profiles from (side, id, label, spend in euros, invoices) rows."""
+    frame = pd.DataFrame(rows, columns=["side", "id", "label", "spend", "n_invoices"])
+    return frame.assign(spend=frame["spend"] * 100)
+
+
+def test_normalize_name():
+    assert normalize_name("Sté Dupont & Fils SARL") == "DUPONT FILS"
+    assert normalize_name("Société Générale d'Électricité") == "GENERALE ELECTRICITE"
+    assert normalize_name("SAS") == ""
+
+
+def test_accents_and_legal_forms():
+    index = CounterpartyIndex()
+    index.add("A", profiles(("suppliers", "F001", "Transports Dupont SARL", 12_000, 10)))
+    index.add("B", profiles(("suppliers", "401DUP", "TRANSPORT DUPONT", 6_000, 4), ("suppliers", "401MAR", "Martin", 500, 1)))
+    index.add("C", profiles(("suppliers", "F9", "Électricité Générale de l'Ouest", 800, 2)))
+    index.add("D", profiles(("suppliers", "F9", "ELECTRICITE GENERALE OUEST SA", 900, 3)))
+    clusters = index.clusters()
+    assert clusters[0] == clusters[1]
+    assert clusters[3] == clusters[4]
+    assert len(set(clusters)) == 3
+
+    report = index.overlap("suppliers")
+    assert (report["n_companies"], report["n_counterparties"], report["n_shared"]) == (4, 3, 2)
+    [dupont, _] = report["shared"]
+    assert dupont["name"] == "Transports Dupont SARL"
+    assert dupont["combined_spend"] == 18_000.0
+    assert dupont["by_company"]["B"] == {"spend": 6_000.0, "n_invoices": 4, "average_invoice": 1_500.0}
+
+
+def test_common_tokens_are_not_blocking_keys():
+    def names(n):
+        # Every name contains "BOULANGERIE PATISSERIE", whose two tokens are its only shared ones
+        return pd.Series(["BOULANGERIE PATISSERIE"] + [f"BOULANGERIE PATISSERIE N{i:03d}" for i in range(n - 1)])
+
+    assert len(set(match_names(names(10)))) == 1
+    # Tokens in more than MAX_BLOCK_SIZE names link none of them
+    clusters = match_names(names(MAX_BLOCK_SIZE + 10))
+    assert np.array_equal(clusters, np.arange(MAX_BLOCK_SIZE + 10))
+
+
+def test_siren_only_match():
+    index = CounterpartyIndex()
+    index.add("A", profiles(("suppliers", "552120222", "Alpha Conseil", 3_000, 3)))
+    # The SIREN at the head of a SIRET, with no name in common
+    index.add("B", profiles(("suppliers", "55212022200015", "Omega Services", 1_000, 1)))
+    index.add("C", profiles(("suppliers", "552120223", "Beta Conseil", 1_000, 1)))
+    clusters = index.clusters()
+    assert clusters[0] == clusters[1]
+    assert clusters[2] != clusters[0]
+
+
+def test_suppliers_and_clients_are_never_merged():
+    index = CounterpartyIndex()
+    index.add("A", profiles(("suppliers", "552120222", "Dupont SA", 2_000, 2), ("clients", "C1", "Durand", 700, 1)))
+    index.add("B", profiles(("clients", "552120222", "Dupont SA", 5_000, 5), ("clients", "C7", "DURAND SARL", 300, 1)))
+    clusters = index.clusters()
+    assert clusters[0] != clusters[2]
+    assert clusters[1] == clusters[3]
+    assert index.overlap("suppliers")["n_shared"] == 0
+    assert [row["name"] for row in index.overlap("clients")["shared"]] == ["Durand"]
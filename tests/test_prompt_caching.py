@@ -0,0 +1,47 @@
+from conftest import FakeClient, message
+from langchain_core.tools import tool
+
+from dexter.model import CACHE_CONTROL
+
+
+@tool
+def read_fec(fec_path: str) -> str:
+    """Reads a FEC."""
+    return fec_path
+
+
+@tool
+def scan_fec(fec_path: str) -> str:
+    """Scans a FEC for red flags."""
+    return fec_path
+
+
+def test_static_prefix_is_marked_for_caching(llm):
+    client = FakeClient()
+    llm.call_llm("hello", system_prompt="You are an analyst.", tools=[read_fec, scan_fec], cache=False, client=client)
+    [request] = client.requests
+    assert request["system"] == [{"type": "text", "text": "You are an analyst.", "cache_control": CACHE_CONTROL}]
+    # One breakpoint on the last tool caches every definition before it
+    assert [t.get("cache_control") for t in request["tools"]] == [None, CACHE_CONTROL]
+
+
+def test_prompt_cache_can_be_turned_off(llm):
+    client = FakeClient()
+    llm.call_llm("hello", system_prompt="You are an analyst.", tools=[read_fec], cache=False, prompt_cache=False, client=client)
+    [request] = client.requests
+    assert request["system"] == "You are an analyst."
+    assert "cache_control" not in request["tools"][0]
+
+
+def test_cache_tokens_are_reported(llm):
+    before = llm.llm_usage_stats()
+    client = FakeClient(message(input_tokens=20, cache_creation=3_000), message(input_tokens=20, cache_read=3_000))
+    first = llm.call_llm("first", cache=False, client=client)
+    second = llm.call_llm("second", cache=False, client=client)
+    assert first.usage_metadata["input_tokens"] == 3_020
+    assert first.usage_metadata["input_token_details"] == {"cache_read": 0, "cache_creation": 3_000}
+    assert second.usage_metadata["input_token_details"] == {"cache_read": 3_000, "cache_creation": 0}
+    after = llm.llm_usage_stats()
+    assert after["cache_read_input_tokens"] - before["cache_read_input_tokens"] == 3_000
+    assert after["cache_creation_input_tokens"] - before["cache_creation_input_tokens"] == 3_000
+    assert after["input_tokens"] - before["input_tokens"] == 40
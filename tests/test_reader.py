@@ -0,0 +1,13 @@
+import pandas as pd
+
+from dexter.fec.reader import parse_amount_cents
+
+
+def test_parse_amount_cents():
+    values = pd.Series(["1234,56", "-12,5", "+3", "1 234.56", "1.234,56", " -7,00", "0,005", "", None])
+    assert parse_amount_cents(values).tolist() == [123456, -1250, 300, 123456, 123456, -700, 1, 0, 0]
+
+
+def test_unparseable_amounts_are_zero():
+    values = pd.Series(["12-3", "1,2-", "--5", "-1-", "12a", "-", ","])
+    assert parse_amount_cents(values).tolist() == [0] * len(values)
@@ -0,0 +1,67 @@
+import numpy as np
+from conftest import entry
+
+from dexter.fec.analysis import analyze_recurring_revenue
+from dexter.fec.recurring import periodicity, recurring_revenue_score
+
+
+def invoice(client, date, euros):
+    return entry("VE", f"{client}{date}", date, ("411000", euros, 0, client, f"Client {client}"), ("706000", 0, euros))
+
+
+def fiscal_year(year):
+    lines = []
+    # Monthly contract since January 2022
+    for month in range(1, 13):
+        lines += invoice("M", f"{year}{month:02d}05", 1_000)
+    if year == 2023:
+        # Quarterly contract signed in 2023, and a one-off project
+        for month in (1, 4, 7, 10):
+            lines += invoice("Q", f"{year}{month:02d}15", 3_000)
+        lines += invoice("O", "20230520", 8_000)
+    return lines
+
+
+def test_periodicity():
+    matrix = np.array([
+        [5, 5, 5, 5, 5, 5, 5],
+        [9, 0, 0, 9, 0, 0, 9],
+        [0, 0, 7, 0, 0, 0, 0],
+    ])
+    assert periodicity(matrix).tolist() == [0, 1, -1]
+
+
+def test_recurring_report(write_fec):
+    paths = [write_fec(f"fec{year}.txt", fiscal_year(year)) for year in (2022, 2023)]
+    report = analyze_recurring_revenue(paths, use_cache=False)
+    assert report["success"], report.get("error")
+    assert report["period"] == {"start": "2022-01", "end": "2023-12", "n_months": 24}
+    assert report["n_clients"] == 3
+
+    # Last twelve months: 12,000 monthly + 12,000 quarterly out of 32,000
+    assert report["invoiced_12m"] == 32_000.0
+    assert report["recurring_revenue_pct"] == 75.0
+    assert report["recurring_clients"] == 2
+    assert report["by_periodicity"] == {
+        "monthly": {"clients": 1, "revenue_12m": 12_000.0, "share_pct": 37.5},
+        "quarterly": {"clients": 1, "revenue_12m": 12_000.0, "share_pct": 37.5},
+        "annual": {"clients": 0, "revenue_12m": 0.0, "share_pct": 0.0},
+    }
+    assert [(c["id"], c["periodicity"]) for c in report["top_recurring_clients"]] == [("M", "monthly"), ("Q", "quarterly")]
+
+    assert report["client_retention_pct"] == {"2023": 100.0}
+    assert report["cohorts"] == [
+        {
+            "cohort": 2022, "left_censored": True, "clients": 1, "revenue": 12_000.0,
+            "client_retention_pct": {"2023": 100.0}, "revenue_retention_pct": {"2023": 100.0},
+        },
+        {
+            "cohort": 2023, "left_censored": False, "clients": 2, "revenue": 20_000.0,
+            "client_retention_pct": {}, "revenue_retention_pct": {},
+        },
+    ]
+    assert report["score"] == recurring_revenue_score(75.0) == 8
+
+
+def test_recurring_revenue_score():
+    assert [recurring_revenue_score(pct) for pct in (0.0, 49.9, 50.0, 89.9, 90.0, 100.0)] == [0, 5, 5, 9, 10, 10]
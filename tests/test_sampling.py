@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+from conftest import entry
+
+from dexter.fec.sampling import SAMPLING_COLUMNS, SampleDesign, estimate_ratio, estimate_total, read_sample, sample_report
+
+
+def design(stratum, slots, drawn):
+    return SampleDesign(np.array(stratum), np.array(slots), np.array(drawn), bytes_read=0, file_bytes=0)
+
+
+def test_stratified_total_and_variance():
+    # Stratum 0: 2 blocks of 4 drawn, mean 2, within variance 2; stratum 1: 2 of 3, no spread
+    total, variance = estimate_total([1, 3, 2, 2], design([0, 0, 1, 1], [4, 3], [2, 2]))
+    assert total == 4 * 2 + 3 * 2
+    assert variance == pytest.approx(4 ** 2 * (1 - 2 / 4) * 2 / 2)
+
+
+def test_census_has_no_variance():
+    assert estimate_total([5, 7, 1], design([0, 0, 1], [2, 1], [2, 1])) == (13.0, 0.0)
+
+
+def test_ratio_estimate():
+    sample = design([0, 0, 1, 1], [4, 3], [2, 2])
+    # Same ratio in every block: no variance
+    assert estimate_ratio(np.array([2, 6, 4, 4]), np.array([1, 3, 2, 2]), sample) == (2.0, 0.0)
+    ratio, variance = estimate_ratio(np.array([2, 3, 4, 4]), np.array([1, 3, 2, 2]), sample)
+    assert ratio == pytest.approx((4 * 2.5 + 3 * 4) / (4 * 2 + 3 * 2)) and variance > 0
+
+
+@pytest.fixture
+def ledger(write_fec):
+    rng = np.random.default_rng(7)
+    lines = []
+    for i, amount in enumerate(rng.integers(100, 2_000, size=3_000)):
+        client = f"C{i % 40:03d}"
+        lines += entry("VE", str(i), f"2023{i % 12 + 1:02d}15", ("411000", int(amount), 0, client, client), ("706000", 0, int(amount)))
+    revenue = sum(line["Credit"] for line in lines)
+    return write_fec("fec.txt", lines), revenue, len(lines)
+
+
+def test_blocks_covering_the_file_read_every_line_once(ledger):
+    path, revenue, n_lines = ledger
+    # Two slots per stratum: every slot is drawn, line boundaries fall inside the blocks
+    df, block, sample = read_sample(path, sample_bytes=os.path.getsize(path), columns=SAMPLING_COLUMNS)
+    assert (sample.drawn == sample.slots).all()
+    assert len(df) == n_lines
+    report = sample_report(df, block, sample)
+    assert report["financials"]["total_revenue"] == {"estimate": revenue, "ci_low": revenue, "ci_high": revenue}
+    assert report["sample"]["total_entries_estimate"] == n_lines
+
+
+def test_sample_interval_covers_the_exact_total(ledger):
+    path, revenue, n_lines = ledger
+    df, block, sample = read_sample(path, sample_bytes=os.path.getsize(path) // 8, columns=SAMPLING_COLUMNS)
+    assert len(df) < n_lines / 4 and set(df["CompteNum"].astype(str)) == {"411000", "706000"}
+    report = sample_report(df, block, sample)
+    interval = report["financials"]["total_revenue"]
+    assert interval["ci_low"] < revenue < interval["ci_high"]
+    assert interval["ci_high"] - interval["ci_low"] < 0.2 * revenue
+    margin = report["financials"]["ebitda_margin_pct"]
+    assert margin["estimate"] == 100.0 and margin["ci_low"] == margin["ci_high"]
@@ -0,0 +1,73 @@
+import pytest
+from conftest import FakeClient, message
+
+from dexter.model import StructuredOutputError, output_tool
+from dexter.schemas import TaskList
+
+VALID = {"tasks": [{"id": 1, "description": "Read the FEC", "done": False}]}
+INVALID = {"tasks": [{"id": "first", "description": "Read the FEC"}]}
+
+
+def tool_call(tool_input, name="TaskList"):
+    return message([{"type": "tool_use", "id": "toolu_test", "name": name, "input": tool_input}])
+
+
+def structured(llm):
+    return dict(llm.llm_usage_stats()["structured_outputs"])
+
+
+def test_forced_tool_call(llm):
+    client = FakeClient(tool_call(VALID))
+    before = structured(llm)
+    result = llm.call_llm("plan", output_schema=TaskList, client=client)
+    assert result == TaskList.model_validate(VALID)
+    [request] = client.requests
+    assert request["tool_choice"] == {"type": "tool", "name": "TaskList"}
+    assert [t["name"] for t in request["tools"]] == ["TaskList"]
+    assert structured(llm)["valid_first_try"] == before["valid_first_try"] + 1
+
+
+def test_output_tool_schema_is_built_once():
+    assert output_tool(TaskList) is output_tool(TaskList)
+
+
+def test_invalid_output_gets_one_repair_request(llm):
+    client = FakeClient(tool_call(INVALID), tool_call(VALID))
+    before = structured(llm)
+    assert llm.call_llm("plan", output_schema=TaskList, client=client) == TaskList.model_validate(VALID)
+    first, repair = client.requests
+    # The repair request carries the input received and the errors, not the original prompt
+    content = repair["messages"][0]["content"]
+    assert "tasks.0.id" in content and '"first"' in content and "plan" not in content
+    assert repair["system"] == first["system"] and repair["tools"] == first["tools"]
+    after = structured(llm)
+    assert after["repaired"] == before["repaired"] + 1
+    assert after["wasted_calls"] == before["wasted_calls"] + 1
+
+
+def test_output_still_invalid_after_repair(llm):
+    client = FakeClient(tool_call(INVALID), tool_call({"steps": []}))
+    before = structured(llm)
+    with pytest.raises(StructuredOutputError):
+        llm.call_llm("plan", output_schema=TaskList, client=client)
+    assert len(client.requests) == 1 + llm.STRUCTURED_REPAIR_ATTEMPTS
+    assert structured(llm)["failed"] == before["failed"] + 1
+
+
+def test_invalid_outputs_are_not_cached(llm):
+    with pytest.raises(StructuredOutputError):
+        llm.call_llm("plan", output_schema=TaskList, client=FakeClient(default=tool_call(INVALID)))
+    # Same request, the model now answers correctly: it is asked again
+    client = FakeClient(tool_call(VALID))
+    assert llm.call_llm("plan", output_schema=TaskList, client=client) == TaskList.model_validate(VALID)
+    assert len(client.requests) == 1
+    # The valid output is cached
+    replay = FakeClient()
+    assert llm.call_llm("plan", output_schema=TaskList, client=replay) == TaskList.model_validate(VALID)
+    assert replay.requests == []
+
+
+def test_missing_tool_call(llm):
+    client = FakeClient(message(), tool_call(VALID))
+    assert llm.call_llm("plan", output_schema=TaskList, client=client) == TaskList.model_validate(VALID)
+    assert "no call to the TaskList tool" in client.requests[1]["messages"][0]["content"]
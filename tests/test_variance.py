@@ -0,0 +1,60 @@
+from conftest import entry
+
+from dexter.fec.analysis import analyze_account_variance
+from dexter.fec.reader import load_fec
+from dexter.fec.variance import MAX_FISCAL_MONTHS, VARIANCE_COLUMNS, variance_cube
+
+
+def fiscal_year(year, sales, rent, other, interest):
+    """July-June fiscal year ending in `year`."""
+    other_account, other_amount, other_date = other
+    return [
+        *entry("VE", "1", f"{year - 1}0715", ("512000", sales, 0), ("706000", 0, sales)),
+        *entry("AC", "2", f"{year - 1}0801", ("613200", rent, 0), ("512000", 0, rent)),
+        *entry("AC", "3", other_date, (other_account, other_amount, 0), ("512000", 0, other_amount)),
+        *entry("BQ", "4", f"{year}0630", ("512000", interest, 0), ("761000", 0, interest)),
+    ]
+
+
+def ledgers(write_fec):
+    return [
+        # Listed out of order: the report sorts the years by period
+        write_fec("acme_fy2023.txt", fiscal_year(2023, 12_000, 1_500, ("622600", 300, "20221001"), 200)),
+        write_fec("acme_fy2022.txt", fiscal_year(2022, 10_000, 1_000, ("625100", 500, "20210901"), 100)),
+    ]
+
+
+def test_cube_aligns_fiscal_months(write_fec):
+    frames = [load_fec(path, columns=VARIANCE_COLUMNS) for path in ledgers(write_fec)]
+    cube, lines, accounts, periods = variance_cube(frames)
+    assert cube.shape == (2, 6, MAX_FISCAL_MONTHS)
+    assert list(accounts) == ["512000", "613200", "622600", "625100", "706000", "761000"]
+    assert periods.tolist() == [[(2022 - 1970) * 12 + 6, (2023 - 1970) * 12 + 5], [(2021 - 1970) * 12 + 6, (2022 - 1970) * 12 + 5]]
+    # July sales in fiscal month 0, August rent in month 1 of both years
+    sales, rent = list(accounts).index("706000"), list(accounts).index("613200")
+    assert cube[:, sales, 0].tolist() == [-1_200_000, -1_000_000]
+    assert cube[:, rent, 1].tolist() == [150_000, 100_000]
+    assert (cube.sum(axis=(1, 2)) == 0).all()
+    assert lines.tolist() == [[4, 1, 1, 0, 1, 1], [4, 1, 0, 1, 1, 1]]
+
+
+def test_variance_report(write_fec):
+    report = analyze_account_variance(ledgers(write_fec), use_cache=False)
+    assert report["success"]
+    assert [(y["fiscal_year"], y["start"], y["end"], y["ebitda"]) for y in report["years"]] == [
+        ("2022", "2021-07", "2022-06", 8_500.0), ("2023", "2022-07", "2023-06", 10_200.0),
+    ]
+    assert report["years"][1]["revenue_change_pct"] == 20.0
+    assert report["ebitda_change"] == 1_700.0
+    assert report["ebitda_bridge_by_class"] == {"70": 2_000.0, "61": -500.0, "62": 200.0}
+
+    movers = report["top_movers_pnl"]
+    assert [m["account"] for m in movers] == ["706000", "613200", "625100", "622600", "761000"]
+    assert movers[0]["ebitda_contribution"] == 2_000.0 and movers[0]["ebitda_contribution_pct"] == 117.6
+    assert movers[0]["monthly_change"] == [-2_000.0] + [0.0] * 11
+    assert (movers[2]["status"], movers[3]["status"]) == ("disappeared", "new")
+    assert movers[4]["ebitda_contribution"] is None
+    [bank] = report["top_movers_balance_sheet"]
+    assert (bank["account"], bank["change"]) == ("512000", 1_800.0)
+    assert report["new_accounts"] == [{"account": "622600", "net_debit": 300.0}]
+    assert report["disappeared_accounts"] == [{"account": "625100", "net_debit": 500.0}]